@@ -4,10 +4,16 @@ import sqlite3
 import pyodbc
 import logging
 import os
-import psutil
 from datetime import datetime
 from typing import List, Optional
 
+from rowStream import RowStreamWriter
+from concurrencyController import AdaptiveLimiter
+from sqliteStaging import StagingWriter, DAILYFILE_COLUMNS
+from accessSinks import AccessTarget, make_sink
+from searchService import SearchService, SearchCache, SEARCH_CACHE_PATH, stage_search
+from sqliteMirror import SQLiteMirror, MIRROR_PATH
+
 # ---------------- Logging ----------------
 logging.basicConfig(
     level=logging.INFO,
@@ -16,6 +22,46 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+# ---------------- Token index ----------------
+TOKEN_TABLE = "dailyfiledto_filtered_tokens"
+
+
+def build_token_index(conn, table: str = "dailyfiledto_filtered", token_table: str = TOKEN_TABLE):
+    """
+    (Re)builds the (value, row_id) token table of every column of the staging table, one
+    INSERT ... SELECT per column. value is CAST(col AS TEXT), exactly what the any-field match compares.
+    """
+    cur = conn.cursor()
+    cur.execute(f"PRAGMA table_info({table})")
+    columns = [row[1] for row in cur.fetchall()]
+
+    cur.execute(f"DROP TABLE IF EXISTS {token_table}")
+    cur.execute(f"""
+        CREATE TABLE {token_table} (
+            value TEXT NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (value, row_id)
+        ) WITHOUT ROWID
+    """)
+    for col in columns:
+        cur.execute(f'INSERT OR IGNORE INTO {token_table} (value, row_id) '
+                    f'SELECT CAST("{col}" AS TEXT), rowid FROM {table} WHERE "{col}" IS NOT NULL')
+    conn.commit()
+    cur.execute(f"SELECT COUNT(*) FROM {token_table}")
+    token_count = cur.fetchone()[0]
+    cur.close()
+    logger.info(f"SQLite: token index built ({token_count} tokens over {len(columns)} columns)")
+    return token_count
+
+
+def token_index_exists(conn, token_table: str = TOKEN_TABLE) -> bool:
+    cur = conn.cursor()
+    cur.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (token_table,))
+    exists = cur.fetchone() is not None
+    cur.close()
+    return exists
+
+
 # ---------------- Config ----------------
 class DatabaseConfig:
     """Database configuration settings"""
@@ -35,17 +81,27 @@ class AsyncMySQLToSQLite:
 
     def __init__(self, config: DatabaseConfig, batch_size: int = 500,
                  start_date: Optional[str] = None, end_date: Optional[str] = None,
-                 sqlite_path: str = "dailyfiledto_filtered.sqlite"):
+                 sqlite_path: str = "dailyfiledto_filtered.sqlite",
+                 mirror_path: Optional[str] = MIRROR_PATH,
+                 search_cache_path: Optional[str] = SEARCH_CACHE_PATH,
+                 access_strategy: str = 'executemany'):
         self.config = config
         self.batch_size = batch_size
         self.start_date = start_date
         self.end_date = end_date
         self.sqlite_path = sqlite_path
-        self.all_results = []
+        self.total_records = 0
+        # Persistent local copy of DailyFileDTO; None queries MySQL directly for every run
+        self.mirror = SQLiteMirror(mirror_path) if mirror_path else None
+        # Per-biller results kept between runs (LRU, dropped when a day changes); None always queries MySQL
+        self.search_cache = SearchCache(search_cache_path) if search_cache_path else None
+        # accessSinks strategy of the Access export ('executemany', 'fast_executemany', 'spreadsheet', 'dao')
+        self.access_strategy = access_strategy
 
         cpu_cores = os.cpu_count() or 4
+        # Pool size and ceiling of the adaptive limit; the limit itself follows MySQL latency during the run
         self.max_concurrency = max(4, min(2 * cpu_cores, 32))
-        logger.info(f"Adaptive concurrency = {self.max_concurrency}")
+        logger.info(f"Max concurrency = {self.max_concurrency}")
 
     # ---------------- Connections ----------------
     def get_access_connection(self):
@@ -68,49 +124,7 @@ class AsyncMySQLToSQLite:
         )
         return pool
 
-    # ---------------- Access (for export only) ----------------
-    def clear_access_table(self):
-        conn = self.get_access_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM dailyfiledto_filtered")
-            conn.commit()
-            logger.info("Cleared Access table dailyfiledto_filtered")
-        finally:
-            cursor.close()
-            conn.close()
-
     # ---------------- Async MySQL Search ----------------
-    async def search_batch(self, pool, batch, batch_id):
-        """Async search for a batch of biller names"""
-        results = []
-        placeholders = ",".join(["%s"] * len(batch))
-        date_filter = ""
-        params = list(batch)
-
-        if self.start_date and self.end_date:
-            date_filter = " AND fdate BETWEEN %s AND %s"
-            params.extend([self.start_date, self.end_date])
-
-        query = f"""
-            SELECT Cust, `Index`, BillerName, InvoiceNum, InvAmount, AmountPaid,
-                   PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
-                   DedFeeSubPost, InternalCode, Comments, ContractNum, fdate
-            FROM DailyFileDTO
-            WHERE Cust IN ({placeholders}) {date_filter}
-        """
-
-        try:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(query, params)
-                    rows = await cur.fetchall()
-                    results.extend(rows)
-                    logger.info(f"Batch {batch_id}: Found {len(rows)} records.")
-        except Exception as e:
-            logger.error(f"MySQL batch {batch_id} error: {e}")
-        return results
-
     async def execute_search_async(self, biller_names: List[str]):
         """Run async MySQL searches concurrently with adaptive control"""
         logger.info("Starting async MySQL search...")
@@ -118,102 +132,49 @@ class AsyncMySQLToSQLite:
         concurrency = self.max_concurrency
         pool = await self.get_mysql_pool(concurrency)
 
-        # Simple load check
-        load = psutil.cpu_percent(interval=1)
-        if load > 80:
-            concurrency = max(4, concurrency // 2)
-            logger.warning(f"High CPU load {load}%, reducing concurrency to {concurrency}")
-        elif load < 40:
-            concurrency = min(concurrency + 4, self.max_concurrency)
-            logger.info(f"Low CPU load {load}%, increasing concurrency to {concurrency}")
-
-        sem = asyncio.Semaphore(concurrency)
-        tasks = []
-
-        async def limited_batch_search(batch, batch_id):
-            async with sem:
-                return await self.search_batch(pool, batch, batch_id)
-
-        for i in range(0, len(biller_names), self.batch_size):
-            batch = biller_names[i:i + self.batch_size]
-            batch_id = (i // self.batch_size) + 1
-            tasks.append(asyncio.create_task(limited_batch_search(batch, batch_id)))
-
-        all_batches = await asyncio.gather(*tasks)
-        pool.close()
-        await pool.wait_closed()
-
-        for batch_results in all_batches:
-            self.all_results.extend(batch_results)
-
-        logger.info(f"Async search complete. Total records: {len(self.all_results)}")
-
-    # ---------------- SQLite Writer ----------------
-    def write_to_sqlite(self):
-        """Insert all results into SQLite (safe, fast, cleared before each run)"""
-        if not self.all_results:
-            logger.warning("No results to insert into SQLite.")
+        # AIMD: in-flight queries follow observed latency and errors instead of a client CPU sample
+        limiter = AdaptiveLimiter(concurrency, name="Biller search")
+
+        if self.mirror is not None and self.start_date and self.end_date:
+            # Only new or changed days come from MySQL; the search itself runs on the mirror
+            try:
+                await self.mirror.sync(pool, self.start_date, self.end_date, limiter=limiter)
+            finally:
+                pool.close()
+                await pool.wait_closed()
+            self.total_records = self.copy_from_mirror(biller_names)
+            logger.info(f"Mirror search complete. Total records: {self.total_records}")
             return
 
-        total_records = len(self.all_results)
-        os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
-
-        logger.info(f"Writing {total_records} records to SQLite database {self.sqlite_path}")
+        # Cached billers stream straight from the search cache; the rest are queried as planned
+        # (biller batch x month) tiles and staged by one writer thread while the queries run
+        service = SearchService(pool, cache=self.search_cache, limiter=limiter, key_batch_size=self.batch_size)
+        writer = RowStreamWriter(self.staging_sink())
+        writer.start()
 
-        conn = sqlite3.connect(self.sqlite_path, timeout=30)
-        cur = conn.cursor()
-
-        # Create table if not exists
-        create_sql = """
-        CREATE TABLE IF NOT EXISTS dailyfiledto_filtered (
-            Cust TEXT,
-            [Index] INTEGER,
-            BillerName TEXT,
-            InvoiceNum TEXT,
-            InvAmount REAL,
-            AmountPaid REAL,
-            PayDate TEXT,
-            OpFee REAL,
-            PostPaidShare REAL,
-            SubBillerName TEXT,
-            SubBillerShare REAL,
-            DedFeeSubPost REAL,
-            InternalCode TEXT,
-            Comments TEXT,
-            ContractNum TEXT,
-            fdate TEXT
-        )
-        """
-        cur.execute(create_sql)
-        conn.commit()
-
-        # Clear the table before inserting
         try:
-            cur.execute("DELETE FROM dailyfiledto_filtered")
-            conn.commit()
-            logger.info("Cleared SQLite table dailyfiledto_filtered before inserting new records.")
-        except Exception as e:
-            logger.warning(f"Could not clear SQLite table (ignored): {e}")
-
-        insert_sql = """
-        INSERT INTO dailyfiledto_filtered
-        (Cust, [Index], BillerName, InvoiceNum, InvAmount, AmountPaid,
-         PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
-         DedFeeSubPost, InternalCode, Comments, ContractNum, fdate)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+            await stage_search(service, 'biller', biller_names, writer, self.start_date, self.end_date)
+        finally:
+            pool.close()
+            await pool.wait_closed()
+            self.total_records = await asyncio.to_thread(writer.finish)
+            logger.info(limiter.summary())
 
-        inserted = 0
-        batch_size = max(200, self.batch_size)
-        for i in range(0, total_records, batch_size):
-            batch = self.all_results[i:i + batch_size]
-            cur.executemany(insert_sql, batch)
-            conn.commit()
-            inserted += len(batch)
-            logger.info(f"SQLite: Inserted {inserted}/{total_records}")
+        logger.info(f"Async search complete. Total records: {self.total_records}")
 
-        conn.close()
-        logger.info("✅ SQLite insert complete.")
+    # ---------------- SQLite Writer ----------------
+    def copy_from_mirror(self, biller_names: List[str]) -> int:
+        """Reloads the staging table from the mirror"""
+        writer = self.staging_sink()
+        with writer:
+            writer.add_loaded(self.mirror.copy_matches(writer.conn, writer.table, biller_names,
+                                                       self.start_date, self.end_date))
+        return writer.rows_written
+
+    def staging_sink(self) -> StagingWriter:
+        """SQLite staging table (cleared each run, bulk-load profile) that the search results are written to"""
+        return StagingWriter(self.sqlite_path, "dailyfiledto_filtered", profile='bulk',
+                             drop_tables=(TOKEN_TABLE,), after_load=build_token_index)
 
     # ---------------- Export SQLite -> Access ----------------
     def export_to_access(self):
@@ -241,35 +202,25 @@ class AsyncMySQLToSQLite:
 
         logger.info(f"Fetched {len(invoice_nums)} invoice numbers from Access.InvoiceNumSrch")
 
-        # ---------------- Discover SQLite table structure ----------------
+        # ---------------- Search Matches Across All Columns ----------------
         conn_sqlite = sqlite3.connect(self.sqlite_path)
+        if not token_index_exists(conn_sqlite):
+            build_token_index(conn_sqlite)  # staging file written before the token index existed
         cur_sqlite = conn_sqlite.cursor()
-        cur_sqlite.execute("PRAGMA table_info(dailyfiledto_filtered)")
-        columns = [row[1] for row in cur_sqlite.fetchall()]
-        # Quote each column safely for SQLite (handles reserved words like Index)
-        quoted_columns = [f'"{col}"' for col in columns]
-        logger.info(f"SQLite columns detected: {columns}")
 
-        # ---------------- Search Matches Across All Columns ----------------
-        matched_rows = []
-        chunk_size = 300  # for SQLite parameter limit safety
-        total_invoices = len(invoice_nums)
-
-        logger.info("Searching SQLite for any matches across all columns...")
-        for i in range(0, total_invoices, chunk_size):
-            chunk = invoice_nums[i:i + chunk_size]
-
-            # Build WHERE clause for this chunk
-            placeholders = ",".join("?" * len(chunk))
-            conditions = [f"CAST({col} AS TEXT) IN ({placeholders})" for col in quoted_columns]
-            query = f"SELECT * FROM dailyfiledto_filtered WHERE {' OR '.join(conditions)}"
-
-            # Parameters repeated for each column in OR set
-            params = chunk * len(columns)
-            cur_sqlite.execute(query, params)
-            rows = cur_sqlite.fetchall()
-            matched_rows.extend(rows)
-            logger.info(f"Chunk {i // chunk_size + 1}: Found {len(rows)} matching rows")
+        # One indexed join: search keys -> token table -> rowids; each matching row once, in table order
+        logger.info("Searching SQLite for any matches across all columns (token index)...")
+        cur_sqlite.execute("CREATE TEMP TABLE IF NOT EXISTS search_keys (value TEXT PRIMARY KEY)")
+        cur_sqlite.execute("DELETE FROM search_keys")
+        cur_sqlite.executemany("INSERT OR IGNORE INTO search_keys (value) VALUES (?)",
+                               ((num,) for num in invoice_nums))
+        cur_sqlite.execute(f"""
+            SELECT f.* FROM dailyfiledto_filtered f
+            WHERE f.rowid IN (SELECT t.row_id FROM search_keys s JOIN {TOKEN_TABLE} t ON t.value = s.value)
+            ORDER BY f.rowid
+        """)
+        matched_rows = cur_sqlite.fetchall()
+        cur_sqlite.execute("DELETE FROM search_keys")
 
         if not matched_rows:
             logger.warning("No matching records found in SQLite — nothing to export.")
@@ -279,33 +230,11 @@ class AsyncMySQLToSQLite:
         logger.info(f"Total matched records to export: {len(matched_rows)}")
 
         # ---------------- Export to Access ----------------
-        self.clear_access_table()
-        conn_access_dest = self.get_access_connection()
-        cur_access_dest = conn_access_dest.cursor()
-
-        insert_query = """
-            INSERT INTO dailyfiledto_filtered 
-            (Cust, [Index], BillerName, InvoiceNum, InvAmount, AmountPaid, 
-             PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare, 
-             DedFeeSubPost, InternalCode, Comments, ContractNum, fdate)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
-        total = len(matched_rows)
-        batch_size = 50
-        inserted = 0
         logger.info("Starting export to Access (any-field matches)...")
-
-        for i in range(0, total, batch_size):
-            batch = matched_rows[i:i + batch_size]
-            cur_access_dest.executemany(insert_query, batch)
-            conn_access_dest.commit()
-            inserted += len(batch)
-            logger.info(f"Access export: {inserted}/{total} inserted")
-
-        cur_access_dest.close()
-        conn_access_dest.close()
         conn_sqlite.close()
+        sink = make_sink(self.access_strategy, AccessTarget(self.config.access_db_path),
+                         "dailyfiledto_filtered", DAILYFILE_COLUMNS)
+        sink.write_all(matched_rows)
         logger.info("✅ Filtered export to Access (any-field match) complete.")
 
     # ---------------- Main Run ----------------
@@ -321,12 +250,9 @@ class AsyncMySQLToSQLite:
             logger.warning("No biller names found in Access table BillerSrch.")
             return
 
-        # Run async MySQL search
+        # Run async MySQL search, streaming the rows into SQLite (cleared first, token index built after the load)
         await self.execute_search_async(names)
 
-        # Write to SQLite (cleared first)
-        self.write_to_sqlite()
-
         elapsed = (datetime.now() - start).total_seconds()
         logger.info(f"Process completed successfully in {elapsed:.2f}s")
 
@@ -4,14 +4,16 @@ import sqlite3
 import pyodbc
 import logging
 import os
-import psutil
-import pandas as pd
-import tempfile
-import win32com.client
-import time
 from datetime import datetime
 from typing import List, Optional
 
+from rowStream import RowStreamWriter
+from concurrencyController import AdaptiveLimiter
+from sqliteStaging import StagingWriter, DAILYFILE_COLUMNS
+from accessSinks import AccessTarget, make_sink
+from searchService import SearchService, SearchCache, SEARCH_CACHE_PATH, stage_search
+from sqliteMirror import SQLiteMirror, MIRROR_PATH
+
 # ---------------- Logging ----------------
 logging.basicConfig(
     level=logging.INFO,
@@ -32,17 +34,27 @@ class DatabaseConfig:
 class AsyncMySQLToSQLite:
     def __init__(self, config: DatabaseConfig, batch_size: int = 500,
                  start_date: Optional[str] = None, end_date: Optional[str] = None,
-                 sqlite_path: str = "hyperpay_filtered.sqlite"):
+                 sqlite_path: str = "hyperpay_filtered.sqlite",
+                 mirror_path: Optional[str] = MIRROR_PATH,
+                 search_cache_path: Optional[str] = SEARCH_CACHE_PATH,
+                 access_strategy: str = 'spreadsheet'):
         self.config = config
         self.batch_size = batch_size
         self.start_date = start_date
         self.end_date = end_date
         self.sqlite_path = sqlite_path
-        self.all_results = []
+        self.total_records = 0
+        # Persistent local copy of DailyFileDTO; None queries MySQL directly for every run
+        self.mirror = SQLiteMirror(mirror_path) if mirror_path else None
+        # Per-biller results kept between runs (LRU, dropped when a day changes); None always queries MySQL
+        self.search_cache = SearchCache(search_cache_path) if search_cache_path else None
+        # accessSinks strategy of the Access export ('spreadsheet', 'executemany', 'fast_executemany', 'dao')
+        self.access_strategy = access_strategy
 
         cpu_cores = os.cpu_count() or 4
+        # Pool size and ceiling of the adaptive limit; the limit itself follows MySQL latency during the run
         self.max_concurrency = max(4, min(2 * cpu_cores, 32))
-        logger.info(f"Adaptive concurrency = {self.max_concurrency}")
+        logger.info(f"Max concurrency = {self.max_concurrency}")
 
     def get_access_connection(self):
         conn_str = (
@@ -64,203 +76,79 @@ class AsyncMySQLToSQLite:
         )
         return pool
 
-    def clear_access_table(self):
-        conn = self.get_access_connection()
-        cursor = conn.cursor()
-        try:
-            cursor.execute("DELETE FROM Hyperpay_filtered")
-            conn.commit()
-            logger.info("Cleared Access table Hyperpay_filtered")
-        finally:
-            cursor.close()
-            conn.close()
-
-    async def search_batch(self, pool, batch, batch_id):
-        results = []
-        placeholders = ",".join(["%s"] * len(batch))
-        date_filter = ""
-        params = list(batch)
-
-        if self.start_date and self.end_date:
-            date_filter = " AND fdate BETWEEN %s AND %s"
-            params.extend([self.start_date, self.end_date])
-
-        query = f"""
-            SELECT Cust, `Index`, BillerName, InvoiceNum, InvAmount, AmountPaid,
-                   PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
-                   DedFeeSubPost, InternalCode, Comments, ContractNum, fdate
-            FROM DailyFileDTO
-            WHERE Cust IN ({placeholders}) {date_filter}
-        """
-
-        try:
-            async with pool.acquire() as conn:
-                async with conn.cursor() as cur:
-                    await cur.execute(query, params)
-                    rows = await cur.fetchall()
-                    results.extend(rows)
-                    logger.info(f"Batch {batch_id}: Found {len(rows)} records.")
-        except Exception as e:
-            logger.error(f"MySQL batch {batch_id} error: {e}")
-        return results
-
     async def execute_search_async(self, biller_names: List[str]):
         logger.info("Starting async MySQL search...")
 
         concurrency = self.max_concurrency
         pool = await self.get_mysql_pool(concurrency)
 
-        load = psutil.cpu_percent(interval=1)
-        if load > 80:
-            concurrency = max(4, concurrency // 2)
-            logger.warning(f"High CPU load {load}%, reducing concurrency to {concurrency}")
-        elif load < 40:
-            concurrency = min(concurrency + 4, self.max_concurrency)
-            logger.info(f"Low CPU load {load}%, increasing concurrency to {concurrency}")
-
-        sem = asyncio.Semaphore(concurrency)
-        tasks = []
-
-        async def limited_batch_search(batch, batch_id):
-            async with sem:
-                return await self.search_batch(pool, batch, batch_id)
-
-        for i in range(0, len(biller_names), self.batch_size):
-            batch = biller_names[i:i + self.batch_size]
-            batch_id = (i // self.batch_size) + 1
-            tasks.append(asyncio.create_task(limited_batch_search(batch, batch_id)))
-
-        all_batches = await asyncio.gather(*tasks)
-        pool.close()
-        await pool.wait_closed()
+        # AIMD: in-flight queries follow observed latency and errors instead of a client CPU sample
+        limiter = AdaptiveLimiter(concurrency, name="Hyperpay search")
 
-        for batch_results in all_batches:
-            self.all_results.extend(batch_results)
-
-        logger.info(f"Async search complete. Total records: {len(self.all_results)}")
-
-    def write_to_sqlite(self):
-        if not self.all_results:
-            logger.warning("No results to insert into SQLite.")
+        if self.mirror is not None and self.start_date and self.end_date:
+            # Only new or changed days come from MySQL; the search itself runs on the mirror
+            try:
+                await self.mirror.sync(pool, self.start_date, self.end_date, limiter=limiter)
+            finally:
+                pool.close()
+                await pool.wait_closed()
+            self.total_records = self.copy_from_mirror(biller_names)
+            logger.info(f"Mirror search complete. Total records: {self.total_records}")
             return
 
-        total_records = len(self.all_results)
-        os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
-
-        logger.info(f"Writing {total_records} records to SQLite database {self.sqlite_path}")
-
-        conn = sqlite3.connect(self.sqlite_path, timeout=30)
-        cur = conn.cursor()
-
-        create_sql = """
-        CREATE TABLE IF NOT EXISTS Hyperpay_filtered (
-            Cust TEXT,
-            [Index] INTEGER,
-            BillerName TEXT,
-            InvoiceNum TEXT,
-            InvAmount REAL,
-            AmountPaid REAL,
-            PayDate TEXT,
-            OpFee REAL,
-            PostPaidShare REAL,
-            SubBillerName TEXT,
-            SubBillerShare REAL,
-            DedFeeSubPost REAL,
-            InternalCode TEXT,
-            Comments TEXT,
-            ContractNum TEXT,
-            fdate TEXT
-        )
-        """
-        cur.execute(create_sql)
-        conn.commit()
+        # Cached billers stream straight from the search cache; the rest are queried as planned
+        # (biller batch x month) tiles and staged by one writer thread while the queries run
+        service = SearchService(pool, cache=self.search_cache, limiter=limiter, key_batch_size=self.batch_size)
+        writer = RowStreamWriter(self.staging_sink())
+        writer.start()
 
         try:
-            cur.execute("DELETE FROM Hyperpay_filtered")
-            conn.commit()
-            logger.info("Cleared SQLite table Hyperpay_filtered before inserting new records.")
-        except Exception as e:
-            logger.warning(f"Could not clear SQLite table (ignored): {e}")
+            await stage_search(service, 'biller', biller_names, writer, self.start_date, self.end_date)
+        finally:
+            pool.close()
+            await pool.wait_closed()
+            self.total_records = await asyncio.to_thread(writer.finish)
+            logger.info(limiter.summary())
 
-        insert_sql = """
-        INSERT INTO Hyperpay_filtered
-        (Cust, [Index], BillerName, InvoiceNum, InvAmount, AmountPaid,
-         PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
-         DedFeeSubPost, InternalCode, Comments, ContractNum, fdate)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
+        logger.info(f"Async search complete. Total records: {self.total_records}")
 
-        inserted = 0
-        batch_size = max(200, self.batch_size)
-        for i in range(0, total_records, batch_size):
-            batch = self.all_results[i:i + batch_size]
-            cur.executemany(insert_sql, batch)
-            conn.commit()
-            inserted += len(batch)
-            logger.info(f"SQLite: Inserted {inserted}/{total_records}")
+    def copy_from_mirror(self, biller_names: List[str]) -> int:
+        """Reloads the staging table from the mirror"""
+        writer = self.staging_sink()
+        with writer:
+            writer.add_loaded(self.mirror.copy_matches(writer.conn, writer.table, biller_names,
+                                                       self.start_date, self.end_date))
+        return writer.rows_written
 
-        conn.close()
-        logger.info("✅ SQLite insert complete.")
+    def staging_sink(self) -> StagingWriter:
+        """SQLite staging table (cleared each run, bulk-load profile) that the search results are written to"""
+        return StagingWriter(self.sqlite_path, "Hyperpay_filtered", profile='bulk')
 
     def export_to_access(self):
-        logger.info("Starting Unicode-safe ultra-fast export: SQLite → Excel → Access")
+        logger.info(f"Starting Unicode-safe export: SQLite → Access ({self.access_strategy})")
 
         if not os.path.exists(self.sqlite_path):
             logger.error(f"SQLite file not found: {self.sqlite_path}")
             return
 
         conn_sqlite = sqlite3.connect(self.sqlite_path)
-        df = pd.read_sql_query("SELECT * FROM Hyperpay_filtered", conn_sqlite)
-        conn_sqlite.close()
-        total_records = len(df)
-        logger.info(f"Total records to export: {total_records}")
+        try:
+            rows = conn_sqlite.execute("SELECT * FROM Hyperpay_filtered ORDER BY rowid").fetchall()
+        finally:
+            conn_sqlite.close()
+        logger.info(f"Total records to export: {len(rows)}")
 
-        if total_records == 0:
+        if not rows:
             logger.warning("No records found to export.")
             return
 
-        temp_xlsx = os.path.join(tempfile.gettempdir(), "hyperpay_export.xlsx")
-        logger.info(f"Exporting SQLite data to Excel: {temp_xlsx}")
-        df.to_excel(temp_xlsx, index=False)
-
-        self.clear_access_table()
-
-        time.sleep(2)  # allow ODBC to release lock
-
-        logger.info("Importing Excel into Access via TransferSpreadsheet...")
+        sink = make_sink(self.access_strategy, AccessTarget(self.config.access_db_path),
+                         "Hyperpay_filtered", DAILYFILE_COLUMNS)
         try:
-            access_app = win32com.client.Dispatch("Access.Application")
-
-            for attempt in range(3):
-                try:
-                    access_app.OpenCurrentDatabase(self.config.access_db_path, False)
-                    access_app.Visible = False  # 👈 set visibility AFTER opening
-                    break
-                except Exception as e:
-                    logger.warning(f"Access still locked (attempt {attempt+1}/3). Retrying in 2s...")
-                    time.sleep(2)
-            else:
-                raise Exception("Failed to open Access database after 3 attempts.")
-
-            access_app.DoCmd.TransferSpreadsheet(
-                TransferType=0,
-                SpreadsheetType=10,
-                TableName="Hyperpay_filtered",
-                FileName=temp_xlsx,
-                HasFieldNames=True
-            )
-
-            access_app.CloseCurrentDatabase()
-            access_app.Quit()
-            logger.info(f"✅ Ultra-fast Excel import complete ({total_records} records).")
-
+            sink.write_all(rows)
+            logger.info(f"✅ Access export complete ({sink.rows_written} records).")
         except Exception as e:
-            logger.error(f"TransferSpreadsheet import failed: {e}")
-        finally:
-            try:
-                os.remove(temp_xlsx)
-            except:
-                pass
+            logger.error(f"Access export ({self.access_strategy}) failed: {e}")
 
     async def run(self):
         start = datetime.now()
@@ -274,7 +162,6 @@ class AsyncMySQLToSQLite:
             return
 
         await self.execute_search_async(names)
-        self.write_to_sqlite()
 
         elapsed = (datetime.now() - start).total_seconds()
         logger.info(f"Process completed successfully in {elapsed:.2f}s")
@@ -5,6 +5,15 @@ from typing import List
 import logging
 from datetime import datetime
 
+from invoiceKeyIndex import InvoiceKeyIndex, IncompleteKeyIndex, KEY_INDEX_PATH, SEARCH_FIELDS
+from sqliteStaging import DAILYFILE_COLUMNS
+from accessSinks import AccessTarget, make_sink
+
+SEARCH_COLUMNS = """Cust, `Index`, BillerName, InvoiceNum, InvAmount,
+                               AmountPaid, PayDate, OpFee, PostPaidShare, SubBillerName,
+                               SubBillerShare, DedFeeSubPost, InternalCode, Comments,
+                               ContractNum, fdate"""
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -28,15 +37,19 @@ class AccessDatabaseSearchFilter:
     """Multi-threaded search and filter for Access database"""
 
     def __init__(self, config: DatabaseConfig, num_search_threads: int = 5,
-                 num_insert_threads: int = 3, batch_size: int = 100):
+                 batch_size: int = 100, use_key_index: bool = True, key_index_path: str = KEY_INDEX_PATH,
+                 access_strategy: str = 'executemany'):
         self.config = config
         self.num_search_threads = num_search_threads
-        self.num_insert_threads = num_insert_threads
         self.batch_size = batch_size
         self.search_queue = Queue()
-        self.insert_queue = Queue()
         self.results_lock = threading.Lock()
         self.all_results = []
+        # Resolve identifiers to RowHash locally; MySQL then only fetches the matched rows by RowHash
+        self.use_key_index = use_key_index
+        self.key_index_path = key_index_path
+        # accessSinks strategy of the insert; one writer, since Access serializes writers on the file lock
+        self.access_strategy = access_strategy
 
     def get_access_connection(self):
         """Create connection to Access database"""
@@ -92,6 +105,34 @@ class AccessDatabaseSearchFilter:
             cursor.close()
             conn.close()
 
+    def resolve_row_hashes(self, invoice_numbers: List[str]) -> List[int]:
+        """Refreshes the local key index (changed days only) and maps the invoice numbers to RowHash values"""
+        key_index = InvoiceKeyIndex(self.key_index_path)
+        conn = self.get_mysql_connection()
+        try:
+            key_index.refresh(conn, table='DailyFileDTO')
+            return key_index.lookup(invoice_numbers, SEARCH_FIELDS)
+        finally:
+            conn.close()
+            key_index.close()
+
+    def build_search_query(self, sub_batch: list):
+        """Query and parameters for one sub-batch of RowHash values (or raw invoice numbers)"""
+        placeholders = ','.join(['?' for _ in sub_batch])
+        if self.use_key_index:
+            query = f"SELECT {SEARCH_COLUMNS} FROM DailyFileDTO WHERE RowHash IN ({placeholders})"
+            return query, list(sub_batch)
+
+        # Query the actual MySQL table name (not the Access linked name)
+        # You may need to adjust the table name if it's different in MySQL
+        query = f"""
+            SELECT {SEARCH_COLUMNS}
+            FROM DailyFileDTO
+            WHERE InvoiceNum IN ({placeholders}) 
+               OR ContractNum IN ({placeholders})
+        """
+        return query, sub_batch + sub_batch
+
     def search_worker(self, thread_id: int):
         """Worker thread for searching records - Direct MySQL connection"""
         logger.info(f"Search worker {thread_id} started")
@@ -117,26 +158,12 @@ class AccessDatabaseSearchFilter:
                 break
 
             try:
-                # Process in smaller sub-batches
-                sub_batch_size = 50
+                # Process in smaller sub-batches (RowHash IN (...) is a single index range scan)
+                sub_batch_size = 500 if self.use_key_index else 50
 
                 for i in range(0, len(batch), sub_batch_size):
                     sub_batch = batch[i:i + sub_batch_size]
-                    placeholders = ','.join(['?' for _ in sub_batch])
-
-                    # Query the actual MySQL table name (not the Access linked name)
-                    # You may need to adjust the table name if it's different in MySQL
-                    query = f"""
-                        SELECT Cust, `Index`, BillerName, InvoiceNum, InvAmount, 
-                               AmountPaid, PayDate, OpFee, PostPaidShare, SubBillerName, 
-                               SubBillerShare, DedFeeSubPost, InternalCode, Comments, 
-                               ContractNum, fdate
-                        FROM DailyFileDTO
-                        WHERE InvoiceNum IN ({placeholders}) 
-                           OR ContractNum IN ({placeholders})
-                    """
-
-                    params = sub_batch + sub_batch
+                    query, params = self.build_search_query(sub_batch)
                     cursor.execute(query, params)
                     results = cursor.fetchall()
 
@@ -155,46 +182,14 @@ class AccessDatabaseSearchFilter:
         conn.close()
         logger.info(f"Search worker {thread_id} finished")
 
-    def insert_worker(self, thread_id: int):
-        """Worker thread for inserting records into Access"""
-        logger.info(f"Insert worker {thread_id} started")
-        conn = self.get_access_connection()
-        cursor = conn.cursor()
-
-        insert_query = """
-            INSERT INTO dailyfiledto_filtered 
-            (Cust, [Index], BillerName, InvoiceNum, InvAmount, AmountPaid, 
-             PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare, 
-             DedFeeSubPost, InternalCode, Comments, ContractNum, fdate)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """
-
-        while True:
-            batch = self.insert_queue.get()
-            if batch is None:  # Poison pill
-                break
-
-            try:
-                cursor.executemany(insert_query, batch)
-                conn.commit()
-                logger.info(f"Thread {thread_id}: Inserted {len(batch)} records")
-            except Exception as e:
-                logger.error(f"Thread {thread_id} insert error: {e}")
-                conn.rollback()
-            finally:
-                self.insert_queue.task_done()
-
-        cursor.close()
-        conn.close()
-        logger.info(f"Insert worker {thread_id} finished")
-
-    def execute_search(self, invoice_numbers: List[str]):
-        """Execute multi-threaded search"""
+    def execute_search(self, search_values: list):
+        """Execute multi-threaded search over RowHash values (or raw invoice numbers without the key index)"""
         logger.info("Starting multi-threaded search...")
 
-        # Split invoice numbers into batches
-        for i in range(0, len(invoice_numbers), self.batch_size):
-            batch = invoice_numbers[i:i + self.batch_size]
+        # Split search values into batches
+        batch_size = self.batch_size * 10 if self.use_key_index else self.batch_size
+        for i in range(0, len(search_values), batch_size):
+            batch = search_values[i:i + batch_size]
             self.search_queue.put(batch)
 
         # Start search worker threads
@@ -216,34 +211,15 @@ class AccessDatabaseSearchFilter:
         logger.info(f"Search complete. Total records found: {len(self.all_results)}")
 
     def execute_insert(self):
-        """Execute multi-threaded insert"""
+        """Insert the results into Access through one bulk sink (the table was cleared before the search)"""
         if not self.all_results:
             logger.warning("No results to insert")
             return
 
-        logger.info("Starting multi-threaded insert...")
-
-        # Split results into batches for insertion
-        for i in range(0, len(self.all_results), self.batch_size):
-            batch = self.all_results[i:i + self.batch_size]
-            self.insert_queue.put(batch)
-
-        # Start insert worker threads
-        insert_threads = []
-        for i in range(self.num_insert_threads):
-            t = threading.Thread(target=self.insert_worker, args=(i,),
-                                 name=f"InsertWorker-{i}")
-            t.start()
-            insert_threads.append(t)
-
-        # Add poison pills to stop workers
-        for _ in range(self.num_insert_threads):
-            self.insert_queue.put(None)
-
-        # Wait for all insert operations to complete
-        for t in insert_threads:
-            t.join()
-
+        logger.info(f"Starting insert ({self.access_strategy})...")
+        sink = make_sink(self.access_strategy, AccessTarget(self.config.access_db_path),
+                         "dailyfiledto_filtered", DAILYFILE_COLUMNS, clear=False)
+        sink.write_all(self.all_results)
         logger.info("Insert complete")
 
     def run(self):
@@ -264,10 +240,23 @@ class AccessDatabaseSearchFilter:
             # Step 2: Clear the filtered table
             self.clear_filtered_table()
 
-            # Step 3: Execute multi-threaded search (directly on MySQL)
-            self.execute_search(invoice_numbers)
-
-            # Step 4: Execute multi-threaded insert (into Access)
+            # Step 3: Resolve invoice numbers through the local key index, then fetch the rows from MySQL
+            if self.use_key_index:
+                try:
+                    row_hashes = self.resolve_row_hashes(invoice_numbers)
+                except IncompleteKeyIndex as e:
+                    # Rows without a RowHash can't be fetched by RowHash; search the raw columns instead
+                    logger.warning(f"Key index incomplete, searching InvoiceNum/ContractNum directly: {e}")
+                    self.use_key_index = False
+            if self.use_key_index:
+                if not row_hashes:
+                    logger.warning("No DailyFileDTO rows carry these invoice numbers")
+                    return
+                self.execute_search(row_hashes)
+            else:
+                self.execute_search(invoice_numbers)
+
+            # Step 4: Bulk insert into Access
             self.execute_insert()
 
             elapsed = (datetime.now() - start_time).total_seconds()
@@ -301,7 +290,6 @@ def main():
     search_filter = AccessDatabaseSearchFilter(
         config=config,
         num_search_threads=5,  # Threads for MySQL queries
-        num_insert_threads=3,  # Threads for Access inserts
         batch_size=100  # Records per batch
     )
 
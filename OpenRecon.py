@@ -1,4 +1,6 @@
 import os
+import sys
+import traceback
 import pandas as pd
 import config
 import ProcessRecon
@@ -20,6 +22,7 @@ from win32com.client import Dispatch
 from mysql.connector import Error
 import concurrent.futures
 from threading import Lock
+from xlsxStreamReader import read_sheet
 
 # Configuration
 INVOICE_BASE = config.config.invoice_base
@@ -528,7 +531,7 @@ def change_pivot_data_source_optimized(workbook, sheet_name, pivot_table_name, n
 
 
 def OpenReconFiles():
-    """Main optimized function"""
+    """Main optimized function. Returns False when the recon could not run or a biller failed"""
     excel_app = Dispatch("Excel.Application")
     excel_app.DisplayAlerts = False
 
@@ -551,15 +554,15 @@ def OpenReconFiles():
         connection_pool = get_mysql_connection_pool()
         if not connection_pool:
             print("Failed to create connection pool")
-            return
+            return False
 
         # Read customer data
         try:
-            customers_df = pd.read_excel(customers_file)
+            customers_df = read_sheet(customers_file)
             print(f"Processing {len(customers_df)} customers")
         except Exception as e:
             print(f"Error reading customer list: {e}")
-            return
+            return False
 
         # Fetch all data at once
         print("Fetching all biller data...")
@@ -581,6 +584,7 @@ def OpenReconFiles():
             }
 
             processed_workbooks = []
+            failed_billers = []
             for future in concurrent.futures.as_completed(future_to_biller):
                 biller_name = future_to_biller[future]
                 try:
@@ -589,10 +593,16 @@ def OpenReconFiles():
                         processed_workbooks.append(wb)
                 except Exception as exc:
                     print(f"Biller {biller_name} generated an exception: {exc}")
+                    failed_billers.append(biller_name)
 
         # Process biller summary
         process_biller_summary_optimized(path_year, path_month_full, path_month_abbr, path_day)
 
+        if failed_billers:
+            print(f"❌ Recon failed for {len(failed_billers)} billers: {', '.join(failed_billers)}")
+            return False
+        return True
+
     finally:
         # Re-enable Excel features
         excel_app.ScreenUpdating = True
@@ -755,10 +765,17 @@ def measure_execution_time(func):
 
 @measure_execution_time
 def main():
-    OpenReconFiles()
+    try:
+        success = OpenReconFiles()
+    except Exception as e:
+        print(f"💥 Recon failed: {e}")
+        traceback.print_exc()
+        sys.exit(1)  # lets the pipeline watcher mark the day failed and retry it
     for wb in xw.apps.active.books:
         if not wb.name.lower().endswith("personal.xlsb"):
             wb.app.api.Windows(wb.name).Activate()
+    if not success:
+        sys.exit(1)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,11 @@ import pyodbc
 import logging
 import os
 from datetime import datetime
+from typing import Optional
+
+from sqliteMirror import SQLiteMirror, MIRROR_PATH, MIRROR_TABLE, day_bound
+from sqliteStaging import StagingWriter
+from accessSinks import AccessTarget, make_sink
 
 
 logging.basicConfig(
@@ -14,6 +19,9 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 
+SUMMARY_COLUMNS = [("fdate", "TEXT"), ("Cust", "TEXT"), ("OpFee", "REAL"), ("InvoiceCount", "INTEGER")]
+
+
 class DatabaseConfig:
     def __init__(self, access_db_path: str, mysql_host: str, mysql_port: int,
                  mysql_db: str, mysql_user: str, mysql_password: str):
@@ -30,12 +38,18 @@ class MonthlySummaryPipeline:
 
     def __init__(self, config: DatabaseConfig,
                  start_date: str, end_date: str,
-                 sqlite_path: str = "monthly_summary.sqlite"):
+                 sqlite_path: str = "monthly_summary.sqlite",
+                 mirror_path: Optional[str] = MIRROR_PATH,
+                 access_strategy: str = 'executemany'):
         self.config = config
         self.start_date = start_date
         self.end_date = end_date
         self.sqlite_path = sqlite_path
         self.summary_data = []
+        # Persistent local copy of DailyFileDTO; None runs the GROUP BY queries on MySQL
+        self.mirror = SQLiteMirror(mirror_path) if mirror_path else None
+        # accessSinks strategy of the Access export ('executemany', 'fast_executemany', 'spreadsheet', 'dao')
+        self.access_strategy = access_strategy
 
     # ---------------- Connections ----------------
     def get_access_connection(self):
@@ -113,23 +127,32 @@ class MonthlySummaryPipeline:
             logger.error(f"MySQL query failed for biller '{biller_name}': {e}")
             return {}
 
+    def summarize_from_mirror(self, billers):
+        """Same per-biller {fdate: (Cust, OpFee, InvoiceCount)} maps as fetch_mysql_summary, from the mirror"""
+        conn = self.mirror.connect()
+        try:
+            SQLiteMirror.load_search_names(conn, billers)
+            rows = conn.execute(f"""
+                SELECT m.fdate, s.name, SUM(m.OpFee), COUNT(m.InvoiceNum)
+                FROM {MIRROR_TABLE} m
+                JOIN search_names s ON s.name = TRIM(m.Cust)
+                WHERE m.fdate BETWEEN ? AND ?
+                GROUP BY m.fdate, s.name
+            """, (day_bound(self.start_date), day_bound(self.end_date))).fetchall()
+        finally:
+            conn.close()
+
+        by_name = {}
+        for fdate, name, opfee, invoice_count in rows:
+            by_name.setdefault(name.casefold(), {})[datetime.fromisoformat(fdate)] = (name, opfee, invoice_count)
+        logger.info(f"Mirror summary: {len(rows)} (fdate, biller) groups")
+        return [by_name.get(str(biller).strip().casefold(), {}) for biller in billers]
+
     # ---------------- SQLite Stage ----------------
     def init_sqlite(self):
         """Create SQLite table (and clear data if exists)"""
-        conn = sqlite3.connect(self.sqlite_path)
-        cur = conn.cursor()
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS monthly_summary (
-                fdate TEXT,
-                Cust TEXT,
-                OpFee REAL,
-                InvoiceCount INTEGER
-            )
-        """)
-        conn.commit()
-        cur.execute("DELETE FROM monthly_summary")
-        conn.commit()
-        conn.close()
+        with StagingWriter(self.sqlite_path, "monthly_summary", SUMMARY_COLUMNS):
+            pass
         logger.info("SQLite.monthly_summary table initialized and cleared.")
 
     def write_to_sqlite(self, all_rows):
@@ -137,15 +160,7 @@ class MonthlySummaryPipeline:
         if not all_rows:
             logger.warning("No rows to write into SQLite.")
             return
-        conn = sqlite3.connect(self.sqlite_path)
-        cur = conn.cursor()
-        insert_sql = """
-            INSERT INTO monthly_summary (fdate, Cust, OpFee, InvoiceCount)
-            VALUES (?, ?, ?, ?)
-        """
-        cur.executemany(insert_sql, all_rows)
-        conn.commit()
-        conn.close()
+        StagingWriter(self.sqlite_path, "monthly_summary", SUMMARY_COLUMNS, clear=False).write_all(all_rows)
         logger.info(f"Inserted {len(all_rows)} total rows into SQLite.monthly_summary.")
 
     # ---------------- Export to Access ----------------
@@ -185,22 +200,12 @@ class MonthlySummaryPipeline:
         except Exception:
             logger.info("Access table WalletUsage already exists, continuing...")
 
-        cur_access.execute("DELETE FROM WalletUsage")
-        conn_access.commit()
-        logger.info("Cleared old records from Access.WalletUsage")
-
-        insert_query = """
-            INSERT INTO WalletUsage (fdate, Cust, OpFee, InvoiceCount)
-            VALUES (?, ?, ?, ?)
-        """
-
-        batch_size = 100
-        for i in range(0, len(rows), batch_size):
-            batch = rows[i:i + batch_size]
-            cur_access.executemany(insert_query, batch)
-            conn_access.commit()
         cur_access.close()
         conn_access.close()
+
+        sink = make_sink(self.access_strategy, AccessTarget(self.config.access_db_path),
+                         "WalletUsage", SUMMARY_COLUMNS)
+        sink.write_all(rows)
         logger.info(f"✅ Export complete — inserted {len(rows)} rows into WalletUsage")
 
     # ---------------- Full Run ----------------
@@ -219,13 +224,20 @@ class MonthlySummaryPipeline:
 
         pool = await self.get_mysql_pool()
         try:
-            # Run all biller queries in parallel
-            tasks = [self.fetch_mysql_summary(pool, biller) for biller in billers]
-            results = await asyncio.gather(*tasks)
+            if self.mirror is not None:
+                # Only new or changed days come from MySQL; the GROUP BY runs on the mirror
+                await self.mirror.sync(pool, self.start_date, self.end_date)
+            else:
+                # Run all biller queries in parallel
+                tasks = [self.fetch_mysql_summary(pool, biller) for biller in billers]
+                results = await asyncio.gather(*tasks)
         finally:
             pool.close()
             await pool.wait_closed()
 
+        if self.mirror is not None:
+            results = self.summarize_from_mirror(billers)
+
         # Combine all results and fill missing dates
         merged_rows = []
         for biller, data in zip(billers, results):
@@ -3,6 +3,11 @@ import mysql.connector
 from mysql.connector import Error
 from datetime import datetime
 
+import pandas as pd
+
+from rowFingerprint import (row_fingerprints, flag_duplicates, fetch_known_hashes, ensure_hash_column,
+                            backfill_hashes)
+
 
 class AccessToMySQLImporter:
     def __init__(self):
@@ -27,6 +32,9 @@ class AccessToMySQLImporter:
             'SubBillerShare', 'DedFeeSubPost', 'InternalCode', 'Comments',
             'ContractNum', 'fdate'
         ]
+        self.hash_column = 'RowHash'
+        self.hash_lookup_batch = 1000  # RowHash values per IN (...) lookup
+        self.backfill_fetch_size = 20000  # Rows without RowHash read (and hashed) per round trip
 
     def connect_access(self):
         """Establish connection to MS Access database"""
@@ -71,20 +79,35 @@ class AccessToMySQLImporter:
             InternalCode VARCHAR(255),
             Comments VARCHAR(255),
             ContractNum VARCHAR(255),
-            fdate TIMESTAMP(6)
+            fdate TIMESTAMP(6),
+            RowHash BIGINT UNSIGNED,
+            KEY idx_rowhash (RowHash),
+            KEY idx_fdate (fdate)
         ) ENGINE=InnoDB
         """
 
         try:
             cursor = mysql_conn.cursor()
             cursor.execute(create_table_query)
+
             mysql_conn.commit()
+
+            # Tables created before RowHash existed get the column and its index once
+            if ensure_hash_column(mysql_conn, self.mysql_target_table, self.hash_column):
+                print(f"✓ Added {self.hash_column} column to '{self.mysql_target_table}'")
             print(f"✓ Table '{self.mysql_target_table}' ready")
             cursor.close()
         except Error as e:
             print(f"✗ Error creating table: {e}")
             raise
 
+    def backfill_row_hashes(self, mysql_conn):
+        """Gives rows imported before RowHash existed their RowHash (see rowFingerprint.backfill_hashes)"""
+        updated = backfill_hashes(mysql_conn, self.mysql_target_table, self.connect_mysql,
+                                  hash_column=self.hash_column, fetch_size=self.backfill_fetch_size)
+        if updated:
+            print(f"✓ Backfilled {self.hash_column} for {updated} rows")
+
     def fetch_access_data(self, access_conn):
         """Fetch all data from MS Access table"""
         try:
@@ -100,13 +123,39 @@ class AccessToMySQLImporter:
             print(f"✗ Error fetching data from Access: {e}")
             raise
 
-    def insert_mysql(self, mysql_conn, rows):
+    def fingerprint_rows(self, mysql_conn, rows):
+        """
+        Computes the RowHash of every row and flags exact duplicates, both within this import
+        and against rows already imported on earlier runs.
+
+        Returns:
+            RowHash values (Python ints) in row order
+        """
+        df = pd.DataFrame.from_records([tuple(row) for row in rows], columns=self.columns)
+        hashes = row_fingerprints(df)
+        known = fetch_known_hashes(mysql_conn, self.mysql_target_table, hashes,
+                                   batch_size=self.hash_lookup_batch, hash_column=self.hash_column)
+        within, already = flag_duplicates(hashes, known)
+
+        if within.any():
+            print(f"⚠ {int(within.sum())} rows repeat another row of this import exactly")
+        if already.any():
+            dates = ', '.join(sorted({str(d)[:10] for d in df.loc[already, 'fdate'].dropna()})) or '-'
+            print(f"⚠ {int(already.sum())} rows were already imported "
+                  f"(RowHash match; fdate in this batch: {dates})")
+        if not within.any() and not already.any():
+            print("✓ No duplicate rows")
+
+        return [int(h) for h in hashes]
+
+    def insert_mysql(self, mysql_conn, rows, row_hashes=None):
         """Insert data in MySQL (INSERT only, no updates)"""
         cursor = mysql_conn.cursor()
 
         # Prepare simple INSERT query
-        columns_str = ', '.join([f'`{col}`' for col in self.columns])
-        placeholders = ', '.join(['%s'] * len(self.columns))
+        insert_columns = self.columns + ([self.hash_column] if row_hashes is not None else [])
+        columns_str = ', '.join([f'`{col}`' for col in insert_columns])
+        placeholders = ', '.join(['%s'] * len(insert_columns))
 
         insert_query = f"""
         INSERT INTO {self.mysql_target_table} ({columns_str})
@@ -116,10 +165,12 @@ class AccessToMySQLImporter:
         success_count = 0
         error_count = 0
 
-        for row in rows:
+        for row_idx, row in enumerate(rows):
             try:
                 # Convert row to list and handle None values
                 row_data = [cell if cell is not None else None for cell in row]
+                if row_hashes is not None:
+                    row_data.append(row_hashes[row_idx])
                 cursor.execute(insert_query, row_data)
                 success_count += 1
             except Error as e:
@@ -150,6 +201,7 @@ class AccessToMySQLImporter:
 
             # Create table if needed
             self.create_table_if_not_exists(mysql_conn)
+            self.backfill_row_hashes(mysql_conn)
 
             # Fetch data from Access
             rows = self.fetch_access_data(access_conn)
@@ -158,8 +210,11 @@ class AccessToMySQLImporter:
                 print("⚠ No data to import")
                 return
 
+            # Fingerprint rows and flag duplicates
+            row_hashes = self.fingerprint_rows(mysql_conn, rows)
+
             # Insert data in MySQL
-            self.insert_mysql(mysql_conn, rows)
+            self.insert_mysql(mysql_conn, rows, row_hashes)
 
             print("\n✓ Import completed successfully!")
 
@@ -8,6 +8,9 @@ from pathlib import Path
 import tempfile
 import shutil
 import config
+from xlsxStreamReader import read_sheet
+from textSanitize import sanitize_frame
+from dailyFileLoader import DAILY_COLUMN_MAPPING
 
 m_day = config.config.curr_day
 m_month = config.config.curr_month
@@ -34,29 +37,7 @@ class RobustExcelToAccessTransfer:
         self.connection = None
 
         # Column mapping from Excel to Access Database (Updated based on actual Excel columns)
-        self.column_mapping = {
-            'Cust': 'Cust',
-            'Index': 'Index',  # Changed back to 'Index' - the actual Access field name
-            'اسم المفوتر': 'BillerName',
-            'رقم الفاتورة/الدفعة': 'InvoiceNum',  # Updated: actual Excel column name
-            'قيمة الفاتورة': 'InvAmount',
-            'المبلغ المدفوع': 'AmountPaid',
-            'تاريخ الدفع': 'PayDate',
-            'رسوم العمليات': 'OpFee',
-            'حصة المفوتر': 'PostPaidShare',
-            'المفوتر الفرعي': 'SubBillerName',
-            'حصة المفوتر الفرعي': 'SubBillerShare',
-            'خصم رسوم الحوالة من حصة المفوتر الفرعي': 'DedFeeSubPost',
-            'الكود الداخلي': 'InternalCode',
-            'ملاحظات': 'Comments',
-            'ترحيل حصة المفوتر': 'TransferPostpaidShare',
-            'تاريخ الترحيل': 'PostDate',
-            'المنتجات': 'Products',
-            'رقم الحزمة': 'BatchID',
-            'IBAN المفوتر الفرعي': 'SubBillerIBAN',  # Updated: actual Excel column name
-            'رقم العقد': 'ContractNum',
-            'fdate': 'fdate'
-        }
+        self.column_mapping = dict(DAILY_COLUMN_MAPPING)
 
     def connect_to_access(self):
         """Create ODBC connection to MS Access database"""
@@ -117,13 +98,16 @@ class RobustExcelToAccessTransfer:
             }
 
             # Read the Excel file from DailyFileDTO sheet
-            df = pd.read_excel(
+            df = read_sheet(
                 self.excel_file_path,
                 sheet_name='DailyFileDTO',
                 dtype=dtype_dict,
                 keep_default_na=False  # Prevent pandas from converting strings to NaN
             )
 
+            # Clean text once here; the insert steps below take string columns as they are
+            df, _ = sanitize_frame(df)
+
             logger.info(f"📊 Loaded {len(df)} rows and {len(df.columns)} columns from DailyFileDTO sheet")
             logger.info(f"🔤 Columns found: {list(df.columns)}")
 
@@ -0,0 +1,437 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import logging
+from decimal import Decimal
+
+from sqliteStaging import create_table_sql
+from xlsxStreamWriter import SheetStyle, XlsxStreamWriter
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+EXECUTEMANY_BATCH_SIZE = 1000  # Rows per executemany() call
+# Access keeps a lock per changed page until commit and fails past MaxLocksPerFile (9500 by default),
+# so one transaction per export is not an option; commit every few thousand rows instead of every batch
+ACCESS_COMMIT_EVERY = 5000
+DAO_MAX_LOCKS = 500000  # dbMaxLocksPerFile for the DAO session (engine option, not the registry)
+DB_MAX_LOCKS_PER_FILE = 62
+DB_OPEN_TABLE = 1
+DB_APPEND_ONLY = 8
+
+
+def field_name(column):
+    """Plain field name of a column as written in SQL ('[Index]' -> 'Index')."""
+    return column.strip('[]')
+
+
+# ---------------- Targets ----------------
+class AccessTarget:
+    """The real .accdb: pyodbc for SQL, Access/DAO automation (Windows only) for the COM strategies."""
+
+    def __init__(self, access_db_path: str):
+        self.access_db_path = access_db_path
+
+    def connect(self):
+        import pyodbc
+        conn_str = (
+            r"Driver={Microsoft Access Driver (*.mdb, *.accdb)};"
+            f"DBQ={self.access_db_path};"
+        )
+        return pyodbc.connect(conn_str)
+
+    def open_dao(self):
+        """(engine, database) of a DAO session with a raised lock limit."""
+        import win32com.client
+        engine = win32com.client.Dispatch("DAO.DBEngine.120")
+        engine.SetOption(DB_MAX_LOCKS_PER_FILE, DAO_MAX_LOCKS)
+        return engine, engine.OpenDatabase(self.access_db_path)
+
+    def transfer_spreadsheet(self, table: str, xlsx_path: str):
+        """Imports an .xlsx into table with DoCmd.TransferSpreadsheet (headers must match the field names)."""
+        import win32com.client
+        access_app = win32com.client.Dispatch("Access.Application")
+        try:
+            for attempt in range(3):
+                try:
+                    access_app.OpenCurrentDatabase(self.access_db_path, False)
+                    access_app.Visible = False  # set visibility AFTER opening
+                    break
+                except Exception:
+                    logger.warning(f"Access still locked (attempt {attempt + 1}/3). Retrying in 2s...")
+                    time.sleep(2)
+            else:
+                raise Exception("Failed to open Access database after 3 attempts.")
+
+            access_app.DoCmd.TransferSpreadsheet(
+                TransferType=0,
+                SpreadsheetType=10,
+                TableName=table,
+                FileName=xlsx_path,
+                HasFieldNames=True
+            )
+            access_app.CloseCurrentDatabase()
+        finally:
+            access_app.Quit()
+
+
+class SQLiteStandIn:
+    """
+    SQLite file standing in for the .accdb, so every strategy except DAO can be run, timed and
+    checked on Linux. Tables are created on connect from the sink's (name, type) columns.
+    """
+
+    def __init__(self, sqlite_path: str, tables=None):
+        self.sqlite_path = sqlite_path
+        self.tables = dict(tables or {})  # {table: [(name, SQL type), ...]}
+
+    def connect(self):
+        conn = sqlite3.connect(self.sqlite_path, timeout=30)
+        for table, columns in self.tables.items():
+            conn.execute(create_table_sql(table, columns))
+        conn.commit()
+        return conn
+
+    def open_dao(self):
+        raise NotImplementedError("The DAO strategy needs Access; it has no SQLite stand-in")
+
+    def transfer_spreadsheet(self, table: str, xlsx_path: str):
+        """
+        Reads the workbook back like TransferSpreadsheet would and appends it by field name. This checks
+        what the workbook carries (Unicode, types, NULLs); openpyxl reads far slower than Access imports,
+        so the spreadsheet timing on the stand-in is not representative.
+        """
+        import pandas as pd
+        df = pd.read_excel(xlsx_path, dtype=object)
+        df = df.astype(object).where(df.notna(), None)
+        columns = ", ".join(f"[{col}]" for col in df.columns)
+        conn = self.connect()
+        try:
+            conn.executemany(f"INSERT INTO {table} ({columns}) VALUES ({', '.join('?' * len(df.columns))})",
+                             df.itertuples(index=False, name=None))
+            conn.commit()
+        finally:
+            conn.close()
+
+
+# ---------------- Sinks ----------------
+class AccessSink:
+    """
+    Loads rows into one Access table. Subclasses are the bulk strategies; all of them are used as
+
+        with make_sink(strategy, target, table, columns) as sink:
+            sink.write(rows)
+
+    and log rows/s on close, so strategies can be compared on the same rows.
+
+    Args:
+        target: AccessTarget or SQLiteStandIn
+        table: Target table (must exist in Access; created in the stand-in)
+        columns: [(name, SQL type), ...] in row order
+        clear: Delete the table's rows on open
+    """
+
+    strategy = None
+
+    def __init__(self, target, table: str, columns, clear: bool = True):
+        self.target = target
+        self.table = table
+        self.columns = list(columns)
+        self.clear = clear
+        self.rows_written = 0
+        self.started_at = None
+        if isinstance(target, SQLiteStandIn):
+            target.tables.setdefault(table, self.columns)
+
+    def open(self):
+        self.started_at = time.time()
+        self.rows_written = 0
+        if self.clear:
+            conn = self.target.connect()
+            try:
+                conn.execute(f"DELETE FROM {self.table}")
+                conn.commit()
+            finally:
+                conn.close()
+            logger.info(f"Cleared Access table {self.table}")
+        return self
+
+    def write(self, rows):
+        raise NotImplementedError
+
+    def close(self, success: bool = True):
+        if success:
+            elapsed = time.time() - self.started_at
+            logger.info(f"Access {self.table}: {self.rows_written} rows in {elapsed:.2f}s "
+                        f"({self.rows_written / max(elapsed, 1e-9):.0f} rows/s, {self.strategy})")
+
+    def write_all(self, rows):
+        """Opens, loads every row and closes in one call. Returns the number of rows written."""
+        with self:
+            self.write(rows)
+        return self.rows_written
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(success=exc_type is None)
+        return False
+
+
+class ExecuteManySink(AccessSink):
+    """
+    Parameterized INSERT through pyodbc executemany, committed every commit_every rows.
+    fast=True turns on pyodbc's fast_executemany (parameter arrays); the Access driver accepts it
+    for short text and numbers, but check long text (Memo) fields before making it a default.
+    """
+
+    strategy = 'executemany'
+
+    def __init__(self, target, table: str, columns, clear: bool = True, batch_size: int = EXECUTEMANY_BATCH_SIZE,
+                 commit_every: int = ACCESS_COMMIT_EVERY, fast: bool = False):
+        super().__init__(target, table, columns, clear)
+        self.batch_size = batch_size
+        self.commit_every = commit_every
+        self.fast = fast
+        if fast:
+            self.strategy = 'fast_executemany'
+        column_list = ", ".join(name for name, _ in self.columns)
+        self.insert_sql = f"INSERT INTO {table} ({column_list}) VALUES ({', '.join('?' * len(self.columns))})"
+        self.conn = None
+        self.cursor = None
+        self.pending = 0
+
+    def open(self):
+        super().open()
+        self.conn = self.target.connect()
+        self.cursor = self.conn.cursor()
+        if self.fast and hasattr(self.cursor, 'fast_executemany'):
+            self.cursor.fast_executemany = True
+        self.pending = 0
+        return self
+
+    def write(self, rows):
+        rows = list(rows)
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            self.cursor.executemany(self.insert_sql, batch)
+            self.rows_written += len(batch)
+            self.pending += len(batch)
+            if self.commit_every and self.pending >= self.commit_every:
+                self.conn.commit()
+                self.pending = 0
+
+    def close(self, success: bool = True):
+        if self.conn is None:
+            return
+        try:
+            if success:
+                self.conn.commit()
+            else:
+                self.conn.rollback()
+        finally:
+            self.cursor.close()
+            self.conn.close()
+            self.conn = None
+        super().close(success)
+
+
+class SpreadsheetSink(AccessSink):
+    """
+    Streams the rows into a temporary .xlsx and imports it in one TransferSpreadsheet call on close.
+    Unicode-safe and fast for large exports, but needs Access installed (and holds no ODBC lock
+    while Access imports).
+    """
+
+    strategy = 'spreadsheet'
+
+    def __init__(self, target, table: str, columns, clear: bool = True, xlsx_path: str = None):
+        super().__init__(target, table, columns, clear)
+        self.xlsx_path = xlsx_path or os.path.join(tempfile.gettempdir(), f"{table}_export.xlsx")
+        self.writer = None
+        self.sheet = None
+        self.next_row = 1
+
+    def open(self):
+        super().open()
+        style = SheetStyle([field_name(name) for name, _ in self.columns])
+        self.writer = XlsxStreamWriter(self.xlsx_path)
+        self.sheet, self.next_row = self.writer.add_sheet(self.table[:31], style)
+        return self
+
+    def write(self, rows):
+        start = self.next_row
+        self.next_row = self.writer.write_rows(self.sheet, rows, start)
+        self.rows_written += self.next_row - start
+
+    def close(self, success: bool = True):
+        if self.writer is None:
+            return
+        writer, self.writer = self.writer, None
+        if not success:
+            writer.abort()
+            return
+        writer.close()
+        try:
+            if self.rows_written:
+                self.target.transfer_spreadsheet(self.table, self.xlsx_path)
+        finally:
+            try:
+                os.remove(self.xlsx_path)
+            except OSError:
+                pass
+        super().close(success)
+
+
+class DaoSink(AccessSink):
+    """
+    Appends through a DAO table-type recordset (AddNew/Update) inside DAO transactions: no SQL
+    parsing per row and no ODBC layer. Windows with the Access database engine only.
+    """
+
+    strategy = 'dao'
+
+    def __init__(self, target, table: str, columns, clear: bool = True, commit_every: int = ACCESS_COMMIT_EVERY):
+        super().__init__(target, table, columns, clear)
+        self.commit_every = commit_every
+        self.fields = [field_name(name) for name, _ in self.columns]
+        self.engine = None
+        self.workspace = None
+        self.db = None
+        self.recordset = None
+        self.pending = 0
+
+    def open(self):
+        self.started_at = time.time()
+        self.rows_written = 0
+        self.engine, self.db = self.target.open_dao()
+        if self.clear:
+            self.db.Execute(f"DELETE FROM {self.table}")
+            logger.info(f"Cleared Access table {self.table}")
+        self.workspace = self.engine.Workspaces(0)
+        self.workspace.BeginTrans()
+        self.recordset = self.db.OpenRecordset(self.table, DB_OPEN_TABLE, DB_APPEND_ONLY)
+        self.pending = 0
+        return self
+
+    def write(self, rows):
+        recordset = self.recordset
+        for row in rows:
+            recordset.AddNew()
+            for name, value in zip(self.fields, row):
+                if value is not None:
+                    recordset.Fields(name).Value = float(value) if isinstance(value, Decimal) else value
+            recordset.Update()
+            self.rows_written += 1
+            self.pending += 1
+            if self.commit_every and self.pending >= self.commit_every:
+                self.workspace.CommitTrans()
+                self.workspace.BeginTrans()
+                self.pending = 0
+
+    def close(self, success: bool = True):
+        if self.db is None:
+            return
+        try:
+            self.recordset.Close()
+            if success:
+                self.workspace.CommitTrans()
+            else:
+                self.workspace.Rollback()
+        finally:
+            self.db.Close()
+            self.db = self.engine = self.workspace = self.recordset = None
+        super().close(success)
+
+
+SINKS = {
+    'executemany': ExecuteManySink,
+    'fast_executemany': lambda *args, **kwargs: ExecuteManySink(*args, fast=True, **kwargs),
+    'spreadsheet': SpreadsheetSink,
+    'dao': DaoSink,
+}
+
+
+def make_sink(strategy: str, target, table: str, columns, **options) -> AccessSink:
+    """Builds the sink of a strategy name (a key of SINKS)."""
+    if strategy not in SINKS:
+        raise ValueError(f"Unknown Access sink strategy {strategy!r}; expected one of {', '.join(SINKS)}")
+    return SINKS[strategy](target, table, columns, **options)
+
+
+# ---------------- Benchmark ----------------
+def benchmark(target, table: str, columns, rows, strategies=None):
+    """
+    Loads the same rows with each strategy (clearing the table each time) and checks the row count.
+
+    Returns:
+        {strategy: rows/s}, or {strategy: error text} for strategies that failed
+    """
+    results = {}
+    for strategy in strategies or SINKS:
+        sink = make_sink(strategy, target, table, columns)
+        try:
+            started = time.time()
+            sink.write_all(rows)
+            elapsed = time.time() - started
+            conn = target.connect()
+            try:
+                loaded = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            finally:
+                conn.close()
+            if loaded != len(rows):
+                raise RuntimeError(f"{loaded} rows in {table}, expected {len(rows)}")
+            results[strategy] = len(rows) / max(elapsed, 1e-9)
+        except Exception as e:
+            results[strategy] = f"failed: {e}"
+            logger.warning(f"Strategy {strategy} failed: {e}")
+
+    for strategy, result in results.items():
+        logger.info(f"{strategy:>18}: {result if isinstance(result, str) else f'{result:.0f} rows/s'}")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Access export strategies on a staged SQLite table")
+    parser.add_argument('source', help="Staging SQLite file (e.g. dailyfiledto_filtered.sqlite)")
+    parser.add_argument('table', help="Table to export (same name in the source and the target)")
+    parser.add_argument('--access', metavar='ACCDB', help="Target .accdb (default: a SQLite stand-in)")
+    parser.add_argument('--standin', default=os.path.join(tempfile.gettempdir(), "access_standin.sqlite"),
+                        help="Stand-in SQLite file used without --access")
+    parser.add_argument('--strategy', action='append', choices=list(SINKS), help="Strategy to time (repeatable)")
+    parser.add_argument('--limit', type=int, help="Rows to export")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.source)
+    try:
+        columns = [(f"[{name}]", sql_type or "TEXT")
+                   for _, name, sql_type, *_ in conn.execute(f"PRAGMA table_info({args.table})")]
+        query = f"SELECT * FROM {args.table} ORDER BY rowid" + (f" LIMIT {args.limit}" if args.limit else "")
+        rows = conn.execute(query).fetchall()
+    finally:
+        conn.close()
+    if not columns:
+        logger.error(f"No table {args.table} in {args.source}")
+        return 1
+
+    strategies = args.strategy
+    if args.access:
+        target = AccessTarget(args.access)
+    else:
+        target = SQLiteStandIn(args.standin)
+        strategies = strategies or [s for s in SINKS if s != 'dao']
+    logger.info(f"Benchmarking {len(rows)} rows of {args.table} into {args.access or args.standin}")
+    results = benchmark(target, args.table, columns, rows, strategies)
+    return 0 if any(not isinstance(result, str) for result in results.values()) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,8 @@ from datetime import datetime
 import numpy as np
 import re
 
+from xlsxStreamReader import read_sheet
+
 # ⚠️ MODIFIED REGEX FOR EXPLICIT INCLUSION OF \t, \n, \r ⚠️
 # This regex matches all control characters (C0, including the requested \t, \n, \r) and DEL (\x7F).
 NON_PRINTABLE_REGEX = re.compile(r'[\t\n\r\x00-\x08\x0B\x0C\x0E-\x1F\x7F]')
@@ -51,31 +53,17 @@ def fetch_excel_data(file_path, sheet_name):
     """Reads data up to the first blank row. ONLY coerces the Key column to string."""
     print(f"Loading data from: {file_path} - Sheet: '{sheet_name}'...")
     try:
-        # 1. Quick Read to find the end of clean data
-        temp_df = pd.read_excel(file_path, sheet_name=sheet_name, header=0, usecols=[KEY_COLUMN_HEADER])
-        last_clean_row_index = temp_df[temp_df[KEY_COLUMN_HEADER].isna()].index.min()
-
-        num_rows_to_read = len(temp_df) if pd.isna(last_clean_row_index) else last_clean_row_index
-
-        if KEY_COLUMN_HEADER not in temp_df.columns:
+        # 1. Single streaming pass that stops at the first blank Key (end of clean data)
+        try:
+            df = read_sheet(file_path, sheet_name=sheet_name, stop_at_blank=KEY_COLUMN_HEADER)
+        except KeyError:
             raise KeyError(f"Key column '{KEY_COLUMN_HEADER}' not found in file: {os.path.basename(file_path)}")
 
-        numeric_dtypes = {col: float for col in NUMERIC_COLUMNS_LIST if col in temp_df.columns}
-
-        # 2. Final Read with Row Count Limit and Type Enforcement
-        df = pd.read_excel(
-            file_path,
-            sheet_name=sheet_name,
-            dtype=numeric_dtypes,
-            header=0,
-            nrows=num_rows_to_read
-        )
-
-        # 3. Handle Key Column for MERGE (Convert to string but DO NOT strip whitespace)
+        # 2. Handle Key Column for MERGE (Convert to string but DO NOT strip whitespace)
         # This preserves all whitespace in the key for strict comparison.
         df[KEY_COLUMN_HEADER] = df[KEY_COLUMN_HEADER].astype(str).fillna('NO_ID_FOUND')
 
-        # 4. Keep All other Columns STRICTLY ORIGINAL
+        # 3. Keep All other Columns STRICTLY ORIGINAL
 
         print(f"Successfully loaded {len(df)} transactional rows from {os.path.basename(file_path)}.")
         return df
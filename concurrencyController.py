@@ -0,0 +1,170 @@
+import asyncio
+import time
+import logging
+import statistics
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+LATENCY_TOLERANCE = 2.0  # Window median above baseline x this -> the server is queueing, back off
+ERROR_THRESHOLD = 0.1  # Share of failed queries in a window that triggers a back-off
+LATENCY_BACKOFF = 0.75  # Multiplicative decrease on high latency
+ERROR_BACKOFF = 0.5  # Multiplicative decrease on errors
+SAMPLE_MIN_ROWS = 1000  # Small results count as this many rows, so empty queries don't look slow
+BASELINE_DRIFT = 0.05  # How fast the baseline follows latency upwards at min_limit (it drops immediately)
+GRADIENT_TOLERANCE = 1.25  # Window median above the previous window's x this ...
+THROUGHPUT_GAIN = 1.1  # ... without throughput rising by this factor -> the added queries only queue
+
+
+class AdaptiveLimiter:
+    """
+    AIMD limit on in-flight MySQL queries. Every completed query records its latency per 1k rows
+    returned (or an error); after a window of `limit` completions the limit is cut multiplicatively
+    when errors exceed ERROR_THRESHOLD, when the median latency climbs past LATENCY_TOLERANCE x the
+    best seen, or when it rose from the previous window without a matching rise in throughput.
+    Otherwise it grows: doubling from min_limit (slow start, so the baseline is measured unloaded)
+    until the first cut, by one after that. Every decision is logged.
+
+    Usage:
+        limiter = AdaptiveLimiter(max_limit=32)
+        found = await limiter.run(stream_query(pool, query, params, writer))
+
+    Args:
+        max_limit: Ceiling (the MySQL pool size)
+        min_limit: Floor
+        initial: Starting limit (default: min_limit)
+        name: Label for the log lines
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 2, initial: int = None, name: str = "MySQL"):
+        self.max_limit = max(1, max_limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        start = initial if initial is not None else self.min_limit
+        self.limit = float(max(self.min_limit, min(start, self.max_limit)))
+        self.name = name
+
+        self.in_flight = 0
+        self.slow_start = True
+        self.baseline = None  # seconds per 1k rows under light load
+        self.previous = None  # (median latency, rows per second) of the last window
+        self.samples = []
+        self.errors = 0
+        self.window_rows = 0
+        self.window_start = time.perf_counter()
+        self.completed = 0
+        self.failed = 0
+        self.peak = int(self.limit)
+        self._cond = None  # created on first use, inside the running loop
+
+    @property
+    def current(self) -> int:
+        return int(self.limit)
+
+    def _condition(self):
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        return self._cond
+
+    async def acquire(self):
+        cond = self._condition()
+        async with cond:
+            await cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        cond = self._condition()
+        async with cond:
+            self.in_flight -= 1
+            cond.notify_all()
+
+    async def run(self, coro):
+        """
+        Awaits coro inside a slot and records the outcome. An int result is taken as the number of
+        rows the query returned. Exceptions are recorded and re-raised.
+        """
+        try:
+            await self.acquire()
+        except BaseException:
+            coro.close()  # cancelled while waiting: the query never started
+            raise
+        started = time.perf_counter()
+        try:
+            result = await coro
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.record(time.perf_counter() - started, error=True)
+            raise
+        else:
+            rows = result if isinstance(result, int) else 0
+            self.record(time.perf_counter() - started, rows=rows)
+            return result
+        finally:
+            # Also wakes the waiters a raised limit lets through
+            await self.release()
+
+    # ---------------- AIMD ----------------
+    def record(self, elapsed: float, rows: int = 0, error: bool = False):
+        if error:
+            self.errors += 1
+            self.failed += 1
+        else:
+            self.samples.append(elapsed * 1000 / max(rows, SAMPLE_MIN_ROWS))
+            self.window_rows += max(rows, SAMPLE_MIN_ROWS)
+            self.completed += 1
+        if len(self.samples) + self.errors >= max(int(self.limit), self.min_limit):
+            self._adjust()
+
+    def _adjust(self):
+        total = len(self.samples) + self.errors
+        error_rate = self.errors / total
+        latency = statistics.median(self.samples) if self.samples else None
+        now = time.perf_counter()
+        throughput = self.window_rows / max(now - self.window_start, 1e-6)
+        previous = int(self.limit)
+
+        if error_rate > ERROR_THRESHOLD:
+            self.limit = max(self.min_limit, self.limit * ERROR_BACKOFF)
+            self.slow_start = False
+            logger.warning(f"🔻 {self.name} concurrency {previous} -> {int(self.limit)}: "
+                           f"{self.errors}/{total} queries failed")
+        elif latency is not None and self.baseline is not None and latency > self.baseline * LATENCY_TOLERANCE:
+            self.limit = max(self.min_limit, self.limit * LATENCY_BACKOFF)
+            self.slow_start = False
+            logger.info(f"🔻 {self.name} concurrency {previous} -> {int(self.limit)}: latency "
+                        f"{latency * 1000:.1f} ms/1k rows vs baseline {self.baseline * 1000:.1f}")
+        elif (latency is not None and self.previous is not None
+              and latency > self.previous[0] * GRADIENT_TOLERANCE and throughput < self.previous[1] * THROUGHPUT_GAIN):
+            self.limit = max(self.min_limit, self.limit * LATENCY_BACKOFF)
+            self.slow_start = False
+            logger.info(f"🔻 {self.name} concurrency {previous} -> {int(self.limit)}: latency "
+                        f"{self.previous[0] * 1000:.1f} -> {latency * 1000:.1f} ms/1k rows, throughput "
+                        f"{self.previous[1]:.0f} -> {throughput:.0f} rows/s")
+        else:
+            grown = self.limit * 2 if self.slow_start else self.limit + 1
+            self.limit = min(self.max_limit, grown)
+            if int(self.limit) != previous:
+                logger.info(f"🔺 {self.name} concurrency {previous} -> {int(self.limit)}"
+                            f"{' (slow start)' if self.slow_start else ''}: latency "
+                            f"{'n/a' if latency is None else f'{latency * 1000:.1f} ms/1k rows'}")
+
+        if latency is not None:
+            if self.baseline is None or latency < self.baseline:
+                self.baseline = latency
+            elif previous <= self.min_limit:
+                # Only an unloaded window may raise the baseline, or queueing would raise it bit by bit
+                self.baseline += (latency - self.baseline) * BASELINE_DRIFT
+            self.previous = (latency, throughput)
+        self.peak = max(self.peak, int(self.limit))
+        self.samples = []
+        self.errors = 0
+        self.window_rows = 0
+        self.window_start = now
+
+    def summary(self) -> str:
+        return (f"{self.name} concurrency: ended at {int(self.limit)} (peak {self.peak}, max {self.max_limit}), "
+                f"{self.completed} queries ok, {self.failed} failed")
@@ -1,3 +1,7 @@
+import os
+from datetime import datetime
+
+
 class AppConfig:
     def __init__(self):
 
@@ -6,6 +10,12 @@ class AppConfig:
         self.curr_month = 11
         self.curr_year = 2025
 
+        # The pipeline watcher passes the day it detected to each step it starts (YYYY-MM-DD)
+        run_date = os.environ.get("AZM_RUN_DATE")
+        if run_date:
+            run_date = datetime.strptime(run_date, "%Y-%m-%d")
+            self.curr_day, self.curr_month, self.curr_year = run_date.day, run_date.month, run_date.year
+
         #For Email sender
         self.curr_day_Email = 4
         self.curr_month_Email = 11
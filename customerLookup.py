@@ -0,0 +1,256 @@
+import os
+import heapq
+import time
+from collections import defaultdict
+import hashlib
+import logging
+
+import pandas as pd
+
+from dailyIngest import INGEST_CACHE_DIR
+from xlsxStreamReader import read_sheet
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Bump when normalize_arabic_series changes so persisted indexes are rebuilt
+LOOKUP_INDEX_VERSION = 2
+
+MASTER_COLUMNS = ['Arabic', 'Name', 'Index', 'Type', 'Transf Type']
+LOOKUP_FIELDS = ['Cust', 'Index', 'BillerType', 'TransType']
+
+SUGGESTION_COUNT = 3
+SUGGESTION_MIN_SCORE = 0.3  # Dice similarity of the trigram sets
+
+TATWEEL = '\u0640'
+# Harakat, superscript alef and Quranic marks
+DIACRITICS_PATTERN = r'[\u0610-\u061A\u064B-\u065F\u0670\u06D6-\u06ED]'
+# Zero-width joiners/marks and the Arabic letter mark that sneak in from copy/paste
+INVISIBLE_PATTERN = r'[\u200B-\u200F\u061C\u2066-\u2069\uFEFF]'
+ALEF_PATTERN = r'[\u0622\u0623\u0625\u0671]'  # آ أ إ ٱ -> ا
+WHITESPACE_PATTERN = r'\s+'
+
+LETTER_FOLDS = str.maketrans({
+    '\u0624': '\u0648',  # ؤ -> و
+    '\u0626': '\u064A',  # ئ -> ي
+    '\u0649': '\u064A',  # ى -> ي
+    '\u0629': '\u0647',  # ة -> ه
+})
+
+# In-process cache: {(path, mtime_ns, size): CustomerLookup}
+_memory_cache = {}
+
+
+def normalize_arabic_series(series):
+    """
+    Normalized Arabic matching key for a whole column: NFKC, no tatweel, diacritics or invisible
+    marks, alef/hamza/yaa/taa-marbuta forms folded, whitespace collapsed. NaN stays NaN.
+    """
+    text = series.astype('object').where(series.notna(), None)
+    text = text.str.normalize('NFKC')
+    text = text.str.replace(TATWEEL, '', regex=False)
+    text = text.str.replace(DIACRITICS_PATTERN, '', regex=True)
+    text = text.str.replace(INVISIBLE_PATTERN, '', regex=True)
+    text = text.str.replace(ALEF_PATTERN, '\u0627', regex=True)
+    text = text.str.translate(LETTER_FOLDS)
+    text = text.str.replace(WHITESPACE_PATTERN, ' ', regex=True).str.strip()
+    return text.where(text != '', None)
+
+
+def normalize_arabic(name):
+    """normalize_arabic_series() for a single name."""
+    return normalize_arabic_series(pd.Series([name], dtype=object)).iloc[0]
+
+
+def trigrams(text):
+    """Character trigrams of a normalized name, padded so short names and word edges count."""
+    padded = f"  {text.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    """
+    Inverted index from character trigram to the master names containing it. A query only
+    touches the names that share at least one trigram with it, instead of scoring every name.
+    """
+
+    def __init__(self, names, payloads):
+        self.names = list(names)
+        self.payloads = list(payloads)
+        self.sizes = []
+        self.postings = defaultdict(list)
+        for doc_id, name in enumerate(self.names):
+            grams = trigrams(name)
+            self.sizes.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(doc_id)
+        self.postings = dict(self.postings)
+
+    def search(self, text, k=SUGGESTION_COUNT, min_score=SUGGESTION_MIN_SCORE):
+        """Returns up to k (score, name, payload) with the best Dice similarity, best first."""
+        grams = trigrams(text)
+        if not grams:
+            return []
+        shared = defaultdict(int)
+        for gram in grams:
+            for doc_id in self.postings.get(gram, ()):
+                shared[doc_id] += 1
+
+        scored = ((2.0 * count / (len(grams) + self.sizes[doc_id]), doc_id) for doc_id, count in shared.items())
+        best = heapq.nlargest(k, (item for item in scored if item[0] >= min_score))
+        return [(round(score, 3), self.names[doc_id], self.payloads[doc_id]) for score, doc_id in best]
+
+
+class CustomerLookup:
+    """
+    CustomerNamesLookUp indexed by normalized Arabic biller name.
+    Built once per master-file version (path, mtime, size) and persisted next to the ingest cache.
+    """
+
+    def __init__(self, source_path, source_mtime, source_size, entries, collisions=0, suggestions=None):
+        self.source_path = source_path
+        self.source_mtime = source_mtime
+        self.source_size = source_size
+        self.entries = entries  # {normalized name: (Cust, Index, BillerType, TransType)}
+        self.collisions = collisions
+        self.suggestions = suggestions  # TrigramIndex over the Arabic and English master names
+
+    @classmethod
+    def from_master(cls, master_df, source_path=None, source_mtime=None, source_size=None):
+        """Builds the index from a CustomerNamesLookUp frame (first row wins for a normalized name)."""
+        keys = normalize_arabic_series(master_df['Arabic'])
+        fields = master_df[['Name', 'Index', 'Type', 'Transf Type']].astype(object)
+        fields = fields.where(fields.notna(), None)
+
+        entries = {}
+        collisions = 0
+        for key, values in zip(keys.tolist(), fields.itertuples(index=False, name=None)):
+            if key is None:
+                continue
+            existing = entries.get(key)
+            if existing is None:
+                entries[key] = values
+            elif existing != values:
+                collisions += 1
+
+        if collisions:
+            logger.warning(f"⚠️ {collisions} CustomerNamesLookUp rows normalize to an already mapped name "
+                           f"with different values; the first row is used")
+
+        # Suggestion index: each master row under its normalized Arabic name and its English name
+        names, payloads = [], []
+        english = normalize_arabic_series(master_df['Name'].astype(object).where(master_df['Name'].notna(), None))
+        for arabic_key, english_key, arabic, values in zip(keys.tolist(), english.tolist(),
+                                                           master_df['Arabic'].tolist(),
+                                                           fields.itertuples(index=False, name=None)):
+            for name in {arabic_key, english_key} - {None}:
+                names.append(name)
+                payloads.append((arabic, values[0], values[1]))
+
+        return cls(source_path, source_mtime, source_size, entries, collisions, TrigramIndex(names, payloads))
+
+    def map_names(self, names):
+        """
+        Maps biller names to (Cust, Index, BillerType, TransType) with one dictionary pass over the
+        unique normalized names. Returns a frame aligned with `names`; unmapped names get NaN.
+        """
+        names = pd.Series(names)
+        keys = normalize_arabic_series(names)
+        unique_keys = keys.dropna().unique()
+        found = {key: self.entries[key] for key in unique_keys if key in self.entries}
+
+        mapped = keys.map(found)
+        rows = [value if isinstance(value, tuple) else (None,) * len(LOOKUP_FIELDS) for value in mapped.tolist()]
+        result = pd.DataFrame(rows, columns=LOOKUP_FIELDS, index=names.index)
+        return result.infer_objects()
+
+    def unmapped(self, names):
+        """Distinct names (as written) that have no entry after normalization."""
+        names = pd.Series(names).dropna()
+        keys = normalize_arabic_series(names)
+        missing = ~keys.isin(self.entries.keys())
+        return names[missing].drop_duplicates().tolist()
+
+    def suggest(self, names, k=SUGGESTION_COUNT, min_score=SUGGESTION_MIN_SCORE):
+        """
+        Top-k CustomerNamesLookUp candidates for each name.
+
+        Returns:
+            {name: [(score, master Arabic name, Cust, Index), ...]} best first
+        """
+        if self.suggestions is None:
+            return {}
+        names = list(names)
+        keys = normalize_arabic_series(pd.Series(names, dtype=object)).tolist()
+        result = {}
+        for name, key in zip(names, keys):
+            if key is None:
+                continue
+            result[name] = [(score, arabic, cust, index)
+                            for score, _, (arabic, cust, index) in self.suggestions.search(key, k, min_score)]
+        return result
+
+    def to_cache(self):
+        return {
+            'version': LOOKUP_INDEX_VERSION,
+            'source_mtime': self.source_mtime,
+            'source_size': self.source_size,
+            'entries': self.entries,
+            'collisions': self.collisions,
+            'suggestions': self.suggestions,
+        }
+
+    @classmethod
+    def from_cache(cls, source_path, payload):
+        return cls(source_path, payload['source_mtime'], payload['source_size'], payload['entries'],
+                   payload.get('collisions', 0), payload.get('suggestions'))
+
+
+def _index_path(master_file_path, cache_dir):
+    path_key = hashlib.sha1(os.path.abspath(master_file_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir, f"lookup_{path_key}.pkl")
+
+
+def load_customer_lookup(master_file_path, cache_dir=INGEST_CACHE_DIR):
+    """
+    Returns the CustomerLookup for CustomerNamesLookUp.xlsx, reading the workbook only when its
+    mtime or size changed since the persisted index was built.
+
+    Args:
+        master_file_path: Path to CustomerNamesLookUp.xlsx
+        cache_dir: Folder for the persisted index (None keeps it in memory only)
+    """
+    start_time = time.time()
+    stat = os.stat(master_file_path)
+    version_key = (os.path.abspath(master_file_path), stat.st_mtime_ns, stat.st_size)
+
+    lookup = _memory_cache.get(version_key)
+    if lookup is not None:
+        return lookup
+
+    index_path = _index_path(master_file_path, cache_dir) if cache_dir else None
+    if index_path and os.path.exists(index_path):
+        try:
+            payload = pd.read_pickle(index_path)
+            if (payload.get('version') == LOOKUP_INDEX_VERSION and payload['source_mtime'] == stat.st_mtime_ns
+                    and payload['source_size'] == stat.st_size):
+                lookup = CustomerLookup.from_cache(master_file_path, payload)
+                logger.info(f"⚡ Customer lookup: loaded {len(lookup.entries)} names from index "
+                            f"in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            logger.warning(f"Could not load customer lookup index {index_path} (rebuilding): {e}")
+
+    if lookup is None:
+        master_df = read_sheet(master_file_path, usecols=MASTER_COLUMNS)
+        lookup = CustomerLookup.from_master(master_df, master_file_path, stat.st_mtime_ns, stat.st_size)
+        if index_path:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                pd.to_pickle(lookup.to_cache(), index_path)
+            except Exception as e:
+                logger.warning(f"Could not write customer lookup index: {e}")
+        logger.info(f"✅ Customer lookup: indexed {len(lookup.entries)} names in {time.time() - start_time:.2f}s")
+
+    _memory_cache[version_key] = lookup
+    return lookup
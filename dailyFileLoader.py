@@ -0,0 +1,330 @@
+import os
+import sys
+import time
+import sqlite3
+import logging
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import mysql.connector
+from mysql.connector import Error
+
+import config
+from xlsxStreamReader import read_sheet
+from textSanitize import sanitize_frame
+from rowFingerprint import (row_fingerprints, flag_duplicates, fetch_known_hashes, signed_hashes, ensure_hash_column,
+                            backfill_hashes)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+m_day = config.config.curr_day
+m_month = config.config.curr_month
+m_year = config.config.curr_year
+m_date = datetime(m_year, m_month, m_day)
+path_month_abbr = m_date.strftime("%b")
+path_day = m_date.strftime("%d")
+
+DAILY_SHEET_NAME = 'DailyFileDTO'
+
+# Column mapping from the DailyFileDTO sheet headers to the Temp / dailyfiledto field names
+DAILY_COLUMN_MAPPING = {
+    'Cust': 'Cust',
+    'Index': 'Index',  # Changed back to 'Index' - the actual Access field name
+    'اسم المفوتر': 'BillerName',
+    'رقم الفاتورة/الدفعة': 'InvoiceNum',  # Updated: actual Excel column name
+    'قيمة الفاتورة': 'InvAmount',
+    'المبلغ المدفوع': 'AmountPaid',
+    'تاريخ الدفع': 'PayDate',
+    'رسوم العمليات': 'OpFee',
+    'حصة المفوتر': 'PostPaidShare',
+    'المفوتر الفرعي': 'SubBillerName',
+    'حصة المفوتر الفرعي': 'SubBillerShare',
+    'خصم رسوم الحوالة من حصة المفوتر الفرعي': 'DedFeeSubPost',
+    'الكود الداخلي': 'InternalCode',
+    'ملاحظات': 'Comments',
+    'ترحيل حصة المفوتر': 'TransferPostpaidShare',
+    'تاريخ الترحيل': 'PostDate',
+    'المنتجات': 'Products',
+    'رقم الحزمة': 'BatchID',
+    'IBAN المفوتر الفرعي': 'SubBillerIBAN',  # Updated: actual Excel column name
+    'رقم العقد': 'ContractNum',
+    'fdate': 'fdate'
+}
+
+# dailyfiledto layout (what TempForImportMySql -> XStoMySqlTransfer used to deliver) plus RowHash
+DAILYFILEDTO_COLUMNS = [
+    'Cust', 'Index', 'BillerName', 'InvoiceNum', 'InvAmount',
+    'AmountPaid', 'PayDate', 'OpFee', 'PostPaidShare', 'SubBillerName',
+    'SubBillerShare', 'DedFeeSubPost', 'InternalCode', 'Comments',
+    'ContractNum', 'fdate'
+]
+HASH_COLUMN = 'RowHash'
+
+AMOUNT_COLUMNS = ['InvAmount', 'AmountPaid', 'OpFee', 'PostPaidShare', 'SubBillerShare']
+FLOAT_COLUMNS = ['Index']
+DATETIME_COLUMNS = ['fdate']
+# Everything else is VARCHAR; the ID columns are read as text so leading zeros survive
+TEXT_READ_COLUMNS = ['Cust', 'اسم المفوتر', 'رقم الفاتورة/الدفعة', 'المفوتر الفرعي',
+                     'خصم رسوم الحوالة من حصة المفوتر الفرعي', 'الكود الداخلي', 'ملاحظات', 'رقم العقد']
+
+MYSQL_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    Cust VARCHAR(255),
+    `Index` DOUBLE,
+    BillerName VARCHAR(255),
+    InvoiceNum VARCHAR(255),
+    InvAmount DOUBLE,
+    AmountPaid DOUBLE,
+    PayDate VARCHAR(255),
+    OpFee DOUBLE,
+    PostPaidShare DOUBLE,
+    SubBillerName VARCHAR(255),
+    SubBillerShare DOUBLE,
+    DedFeeSubPost VARCHAR(255),
+    InternalCode VARCHAR(255),
+    Comments VARCHAR(255),
+    ContractNum VARCHAR(255),
+    fdate TIMESTAMP(6),
+    RowHash BIGINT UNSIGNED,
+    KEY idx_rowhash (RowHash),
+    KEY idx_fdate (fdate)
+) ENGINE=InnoDB
+"""
+
+SQLITE_CREATE_TABLE = """
+CREATE TABLE IF NOT EXISTS {table} (
+    Cust TEXT, `Index` REAL, BillerName TEXT, InvoiceNum TEXT, InvAmount REAL, AmountPaid REAL,
+    PayDate TEXT, OpFee REAL, PostPaidShare REAL, SubBillerName TEXT, SubBillerShare REAL,
+    DedFeeSubPost TEXT, InternalCode TEXT, Comments TEXT, ContractNum TEXT, fdate TEXT,
+    RowHash INTEGER  -- signed_hashes(): SQLite has no unsigned 64-bit integer
+)
+"""
+
+
+def map_daily_frame(df):
+    """
+    Renames the DailyFileDTO headers to dailyfiledto fields and types every column at once:
+    amounts and Index as floats (blank amounts as 0, like the Temp import), fdate as datetime,
+    everything else as trimmed text with None for blanks. Adds RowHash.
+
+    Returns:
+        DataFrame with DAILYFILEDTO_COLUMNS + RowHash
+    """
+    mapped = df.rename(columns=DAILY_COLUMN_MAPPING)
+    out = pd.DataFrame(index=df.index)
+    for col in DAILYFILEDTO_COLUMNS:
+        series = mapped[col] if col in mapped.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        if col in AMOUNT_COLUMNS or col in FLOAT_COLUMNS:
+            if series.dtype == object or pd.api.types.is_string_dtype(series):
+                series = series.astype(str).str.replace(',', '', regex=False)
+            series = pd.to_numeric(series, errors='coerce')
+            out[col] = series.fillna(0.0) if col in AMOUNT_COLUMNS else series
+        elif col in DATETIME_COLUMNS:
+            out[col] = pd.to_datetime(series, errors='coerce')
+        else:
+            if pd.api.types.is_datetime64_any_dtype(series):
+                series = series.dt.strftime('%Y-%m-%d %H:%M:%S')
+            text = series.astype(object).where(series.notna(), None)
+            is_value = text.notna()
+            text[is_value] = text[is_value].astype(str).str.strip()
+            out[col] = text.where(text != '', None)
+
+    out[HASH_COLUMN] = row_fingerprints(out)
+    return out
+
+
+def frame_to_rows(df):
+    """DB-API parameter rows: NaN/NaT as None, numpy scalars as plain Python values."""
+    columns = []
+    for col in df.columns:
+        series = df[col]
+        if col == HASH_COLUMN:
+            columns.append([int(h) for h in series])
+        elif pd.api.types.is_datetime64_any_dtype(series):
+            columns.append([value.to_pydatetime() if pd.notna(value) else None for value in series])
+        else:
+            columns.append(series.astype(object).where(series.notna(), None).tolist())
+    return list(zip(*columns))
+
+
+class DailyFileLoader:
+    """
+    Loads the DailyFileDTO sheet straight into dailyfiledto in one pass, instead of
+    Excel -> Access Temp -> TempForImportMySql -> MySQL.
+
+    Args:
+        excel_file_path: Path to the daily file
+        mysql_config: mysql.connector settings; ignored when sqlite_path is given
+        sqlite_path: Load into this SQLite file instead (a local stand-in for testing)
+        table: Target table name
+        batch_size: Rows per multi-row INSERT
+    """
+
+    def __init__(self, excel_file_path, mysql_config=None, sqlite_path=None, table='dailyfiledto',
+                 batch_size=1000):
+        self.excel_file_path = os.path.abspath(excel_file_path)
+        self.mysql_config = mysql_config or {
+            'host': 'localhost',
+            'user': 'root',
+            'password': 'root',
+            'database': 'azm',
+            'port': 3306
+        }
+        self.sqlite_path = sqlite_path
+        self.table = table
+        self.batch_size = batch_size
+        self.connection = None
+
+    @property
+    def placeholder(self):
+        return '?' if self.sqlite_path else '%s'
+
+    def connect(self):
+        if self.sqlite_path:
+            self.connection = sqlite3.connect(self.sqlite_path)
+            logger.info(f"✅ Connected to SQLite stand-in: {self.sqlite_path}")
+        else:
+            self.connection = mysql.connector.connect(**self.mysql_config)
+            logger.info("✅ Connected to MySQL database")
+        return self.connection
+
+    def create_table_if_not_exists(self):
+        cursor = self.connection.cursor()
+        ddl = SQLITE_CREATE_TABLE if self.sqlite_path else MYSQL_CREATE_TABLE
+        cursor.execute(ddl.format(table=self.table))
+        if self.sqlite_path:
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_rowhash ON {self.table} ({HASH_COLUMN})")
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_fdate ON {self.table} (fdate)")
+        self.connection.commit()
+        cursor.close()
+        if not self.sqlite_path:
+            # The production table predates RowHash: add the column, then hash the older rows once
+            ensure_hash_column(self.connection, self.table, HASH_COLUMN)
+            backfill_hashes(self.connection, self.table, lambda: mysql.connector.connect(**self.mysql_config),
+                            hash_column=HASH_COLUMN)
+
+    def read_daily_frame(self):
+        """Reads and sanitizes the DailyFileDTO sheet, then maps and types it for dailyfiledto."""
+        logger.info(f"📖 Reading {DAILY_SHEET_NAME} from: {self.excel_file_path}")
+        df = read_sheet(self.excel_file_path, DAILY_SHEET_NAME,
+                        dtype={col: str for col in TEXT_READ_COLUMNS})
+        df = df[df['اسم المفوتر'].notna()] if 'اسم المفوتر' in df.columns else df
+        df, _ = sanitize_frame(df)
+        mapped = map_daily_frame(df)
+        logger.info(f"📊 Mapped {len(mapped)} rows to {len(DAILYFILEDTO_COLUMNS)} dailyfiledto columns")
+        return mapped
+
+    def flag_duplicates(self, mapped):
+        """Logs rows that repeat within the file or were already loaded (RowHash)."""
+        hashes = mapped[HASH_COLUMN]
+        known = fetch_known_hashes(self.connection, self.table, hashes, placeholder=self.placeholder,
+                                   signed=bool(self.sqlite_path))
+        within, already = flag_duplicates(hashes, known)
+        if within.any():
+            logger.warning(f"⚠️ {int(within.sum())} rows repeat another row of this file exactly")
+        if already.any():
+            logger.warning(f"⚠️ {int(already.sum())} rows were already loaded (RowHash match)")
+        return within, already
+
+    def delete_day(self, fdates):
+        """Removes rows of the given fdate values so a re-run replaces the day instead of adding to it."""
+        cursor = self.connection.cursor()
+        for fdate in fdates:
+            # Half-open range on the bare column, so the fdate index can serve it
+            next_day = fdate + pd.Timedelta(days=1)
+            cursor.execute(f"DELETE FROM {self.table} WHERE fdate >= {self.placeholder} AND fdate < {self.placeholder}",
+                           (fdate.strftime('%Y-%m-%d 00:00:00'), next_day.strftime('%Y-%m-%d 00:00:00')))
+            logger.info(f"🗑️ Removed {cursor.rowcount} existing rows for {fdate:%Y-%m-%d}")
+        cursor.close()
+
+    def insert_rows(self, mapped):
+        """Multi-row INSERTs of batch_size rows each. Returns the number of rows inserted."""
+        columns = DAILYFILEDTO_COLUMNS + [HASH_COLUMN]
+        column_list = ', '.join(f"`{col}`" for col in columns)
+        row_placeholders = '(' + ', '.join([self.placeholder] * len(columns)) + ')'
+
+        frame = mapped[columns]
+        if self.sqlite_path:
+            # SQLite integers are signed 64-bit
+            frame = frame.assign(**{HASH_COLUMN: signed_hashes(frame[HASH_COLUMN])})
+
+        cursor = self.connection.cursor()
+        rows = frame_to_rows(frame)
+        inserted = 0
+        for start in range(0, len(rows), self.batch_size):
+            batch = rows[start:start + self.batch_size]
+            values = ', '.join([row_placeholders] * len(batch))
+            params = [value for row in batch for value in row]
+            cursor.execute(f"INSERT INTO {self.table} ({column_list}) VALUES {values}", params)
+            inserted += len(batch)
+        cursor.close()
+        return inserted
+
+    def load(self, replace_day=False):
+        """
+        Reads, types and loads the daily file in one transaction.
+
+        Args:
+            replace_day: Delete the file's fdate rows first (for re-runs of the same day)
+
+        Returns:
+            Number of rows loaded (0 on failure)
+        """
+        start_time = time.time()
+        try:
+            mapped = self.read_daily_frame()
+            if mapped.empty:
+                logger.warning("⚠️ No rows to load")
+                return 0
+
+            self.connect()
+            self.create_table_if_not_exists()
+
+            if replace_day:
+                self.delete_day(sorted(mapped['fdate'].dropna().dt.normalize().unique()))
+            else:
+                self.flag_duplicates(mapped)
+
+            inserted = self.insert_rows(mapped)
+            self.connection.commit()
+
+            total_time = time.time() - start_time
+            logger.info(f"🎉 Loaded {inserted} rows into {self.table} in {total_time:.2f}s "
+                        f"({inserted / max(total_time, 1e-9):.0f} rows/s)")
+            return inserted
+
+        except (Error, sqlite3.Error) as e:
+            logger.error(f"❌ Database error while loading: {e}")
+            if self.connection:
+                self.connection.rollback()
+            return 0
+        except Exception as e:
+            logger.error(f"❌ Error loading daily file: {e}")
+            if self.connection:
+                self.connection.rollback()
+            return 0
+        finally:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+
+def main():
+    """Main execution function"""
+    daily_file_path = config.config.dailyfile_base
+    daily_file_name = config.config.dailyfile_name
+    excel_file = rf"{daily_file_path}\{m_year}\{path_month_abbr}\{path_day}\{daily_file_name}"
+
+    if not os.path.exists(excel_file):
+        logger.error(f"Excel file not found: {excel_file}")
+        return 1
+
+    loader = DailyFileLoader(excel_file)
+    return 0 if loader.load(replace_day=True) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
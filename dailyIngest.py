@@ -0,0 +1,419 @@
+import os
+import re
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import zipfile
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+from xlsxStreamReader import read_sheet, sheet_part, sheet_names
+from textSanitize import sanitize_frame
+from rowFingerprint import row_fingerprints
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+INGEST_CACHE_DIR = os.path.join(tempfile.gettempdir(), "azm_ingest_cache")
+INGEST_CACHE_KEEP = 10  # Cached days kept on disk
+
+# Bump when the cached layout changes so old pickles are re-parsed
+INGEST_CACHE_VERSION = 3
+
+# Bump when the detection rules change so saved schemas are re-detected
+COLUMN_SCHEMA_VERSION = 1
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+CELL_COL_REGEX = re.compile(r'^([A-Z]+)')
+
+DEFAULT_COLUMN_WIDTH = 13.0
+
+# Sheet prep writes in front of the data; never the daily data itself
+HELPER_SHEET_NAME = 'Helper'
+
+# In-process cache so every stage of one run shares the same parse
+_memory_cache = {}
+
+
+def file_hash(file_path, chunk_size=1 << 20):
+    """SHA-1 of the file contents, used as the ingest cache key."""
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def column_letter(col_idx):
+    """Converts a 1-indexed column number to its letter (1 -> A, 27 -> AA)."""
+    letters = ''
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+def column_index(letters):
+    """Converts a column letter to its 1-indexed number (A -> 1, AA -> 27)."""
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - 64)
+    return col
+
+
+# --------------------------------------------------------------------------------------
+# --- Layout (header font, column widths) straight from the xlsx parts ---
+# --------------------------------------------------------------------------------------
+
+def _bold_styles(zf):
+    """Returns the set of cellXfs indexes whose font is bold."""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    root = ET.fromstring(zf.read('xl/styles.xml'))
+
+    bold_fonts = set()
+    fonts = root.find(f"{NS_MAIN}fonts")
+    if fonts is not None:
+        for font_id, font in enumerate(fonts.findall(f"{NS_MAIN}font")):
+            bold = font.find(f"{NS_MAIN}b")
+            if bold is not None and bold.get('val', '1') not in ('0', 'false'):
+                bold_fonts.add(font_id)
+
+    bold_xfs = set()
+    cell_xfs = root.find(f"{NS_MAIN}cellXfs")
+    if cell_xfs is not None:
+        for xf_id, xf in enumerate(cell_xfs.findall(f"{NS_MAIN}xf")):
+            if int(xf.get('fontId', '0')) in bold_fonts:
+                bold_xfs.add(xf_id)
+    return bold_xfs
+
+
+def data_sheet_name(file_path):
+    """The daily data sheet: the first sheet that is not the Helper sheet."""
+    names = sheet_names(file_path)
+    return next((name for name in names if name != HELPER_SHEET_NAME), names[0])
+
+
+def is_restructured(file_path):
+    """
+    True once prep has rewritten the daily file (Helper sheet written, 'Cust' heading column A).
+    Restructuring such a file again would shift its columns a second time.
+    """
+    if HELPER_SHEET_NAME not in sheet_names(file_path):
+        return False
+    header = read_sheet(file_path, data_sheet_name(file_path), nrows=0, dtype=object).columns
+    return len(header) > 0 and str(header[0]).strip() == 'Cust'
+
+
+def read_sheet_layout(file_path, num_columns, sheet_name=None):
+    """
+    Reads the header bold flags and column widths of a sheet (the first one by default)
+    without loading the workbook.
+
+    Returns:
+        (sheet name, {col_idx: header is bold}, {column letter: width})
+    """
+    with zipfile.ZipFile(file_path) as zf:
+        sheet_name, part = sheet_part(zf, sheet_name)
+        bold_xfs = _bold_styles(zf)
+
+        header_bold = {col_idx: False for col_idx in range(1, num_columns + 1)}
+        column_widths = {}
+
+        for _, elem in ET.iterparse(zf.open(part), events=('end',)):
+            if elem.tag == f"{NS_MAIN}col":
+                width = float(elem.get('width', DEFAULT_COLUMN_WIDTH))
+                first = int(elem.get('min'))
+                last = min(int(elem.get('max')), num_columns)
+                for col_idx in range(first, last + 1):
+                    column_widths[column_letter(col_idx)] = width
+            elif elem.tag == f"{NS_MAIN}row":
+                for cell in elem.iter(f"{NS_MAIN}c"):
+                    col_idx = column_index(CELL_COL_REGEX.match(cell.get('r')).group(1))
+                    if col_idx in header_bold:
+                        header_bold[col_idx] = int(cell.get('s', '0')) in bold_xfs
+                break  # Only the header row is needed
+
+    return sheet_name, header_bold, column_widths
+
+
+# --------------------------------------------------------------------------------------
+# --- Column typing ---
+# --------------------------------------------------------------------------------------
+
+def detect_column_types(df, leading_zeros_detector):
+    """
+    Decides string and amount columns from the first 50 rows, the same rules
+    smart_read_excel_with_string_preservation used on its 50-row pre-read.
+
+    Returns:
+        (string column names, numeric column names)
+    """
+    column_names = df.columns.tolist()
+    sample = df.head(50).infer_objects()
+
+    # Position-based detection (D, M, T columns)
+    position_based_columns = [column_names[pos] for pos in (3, 12, 19) if len(column_names) > pos]
+
+    # Name-based detection
+    name_based_columns = ['InvoiceNum', 'InternalCode', 'ContractNum']
+
+    # Pattern-based detection
+    pattern_based_columns = [col for col in sample.columns if leading_zeros_detector(sample[col])]
+
+    string_columns = [col for col in column_names
+                      if col in set(position_based_columns + name_based_columns + pattern_based_columns)]
+
+    # Amount columns (E, F, H, I, K)
+    numeric_columns = [column_names[pos] for pos in (4, 5, 7, 8, 10) if len(column_names) > pos]
+
+    return string_columns, numeric_columns
+
+
+# --------------------------------------------------------------------------------------
+# --- Ingest ---
+# --------------------------------------------------------------------------------------
+
+class DailyIngest:
+    """
+    The AllCustomersDailyFile parsed once into typed columns, plus the formatting every later
+    prep stage needs (header bold flags, column widths) and the Helper table (one row per biller)
+    when it was built in the same pass. Stages receive this object instead of re-reading the workbook.
+    """
+
+    def __init__(self, source_path, source_hash, sheet_name, df, string_columns, numeric_columns,
+                 header_bold, column_widths, helper_df=None, text_changes=None):
+        self.source_path = source_path
+        self.source_hash = source_hash
+        self.sheet_name = sheet_name
+        self.df = df
+        self.string_columns = string_columns
+        self.numeric_columns = numeric_columns
+        self.header_bold = header_bold
+        self.column_widths = column_widths
+        self.helper_df = helper_df
+        self.text_changes = text_changes or {}  # {column: values changed by text sanitation}
+
+    @property
+    def row_hashes(self):
+        """RowHash of every daily row (see rowFingerprint), computed on first use."""
+        if getattr(self, '_row_hashes', None) is None:
+            self._row_hashes = row_fingerprints(self.df)
+        return self._row_hashes
+
+    def to_cache(self):
+        return {
+            'version': INGEST_CACHE_VERSION,
+            'source_hash': self.source_hash,
+            'sheet_name': self.sheet_name,
+            'df': self.df,
+            'string_columns': self.string_columns,
+            'numeric_columns': self.numeric_columns,
+            'header_bold': self.header_bold,
+            'column_widths': self.column_widths,
+            'helper_df': self.helper_df,
+            'text_changes': self.text_changes,
+        }
+
+    @classmethod
+    def from_cache(cls, source_path, payload):
+        return cls(source_path, payload['source_hash'], payload['sheet_name'], payload['df'],
+                   payload['string_columns'], payload['numeric_columns'],
+                   payload['header_bold'], payload['column_widths'], payload.get('helper_df'),
+                   payload.get('text_changes'))
+
+
+def header_signature(columns):
+    """Stable key for a header row: the schema is reused for as long as the headers are identical."""
+    digest = hashlib.sha1(f"v{COLUMN_SCHEMA_VERSION}".encode('utf-8'))
+    for col in columns:
+        digest.update(b'\x1f' + str(col).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def _schema_path(columns, cache_dir):
+    return os.path.join(cache_dir, f"schema_{header_signature(columns)}.json")
+
+
+def load_column_schema(columns, cache_dir=INGEST_CACHE_DIR):
+    """
+    Returns the (string columns, numeric columns) saved for this exact header row, or None
+    if the headers have not been seen before.
+    """
+    if not cache_dir:
+        return None
+    schema_path = _schema_path(columns, cache_dir)
+    if not os.path.exists(schema_path):
+        return None
+    try:
+        with open(schema_path, 'r', encoding='utf-8') as f:
+            schema = json.load(f)
+        if schema.get('columns') != [str(col) for col in columns]:
+            return None
+        return schema['string_columns'], schema['numeric_columns']
+    except Exception as e:
+        logger.warning(f"Could not load column schema {schema_path} (re-detecting): {e}")
+        return None
+
+
+def save_column_schema(columns, string_columns, numeric_columns, cache_dir=INGEST_CACHE_DIR):
+    """Saves the detected column types under the header signature."""
+    if not cache_dir:
+        return
+    schema = {
+        'version': COLUMN_SCHEMA_VERSION,
+        'columns': [str(col) for col in columns],
+        'string_columns': list(string_columns),
+        'numeric_columns': list(numeric_columns),
+        'detected_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+    }
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        schema_path = _schema_path(columns, cache_dir)
+        with open(f"{schema_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(schema, f, ensure_ascii=False, indent=2)
+        os.replace(f"{schema_path}.tmp", schema_path)
+    except Exception as e:
+        logger.warning(f"Could not save column schema: {e}")
+
+
+def resolve_column_types(df, leading_zeros_detector, cache_dir=INGEST_CACHE_DIR):
+    """
+    Column types for the frame's header row: the saved schema when the headers match one,
+    otherwise detect_column_types() once and save the result.
+
+    Returns:
+        (string column names, numeric column names)
+    """
+    columns = df.columns.tolist()
+    schema = load_column_schema(columns, cache_dir)
+    if schema is not None:
+        logger.info("⚡ Reusing saved column schema (headers unchanged)")
+        return schema
+
+    logger.info("🔍 New header row: detecting column types...")
+    string_columns, numeric_columns = detect_column_types(df, leading_zeros_detector)
+    save_column_schema(columns, string_columns, numeric_columns, cache_dir)
+    return string_columns, numeric_columns
+
+
+def type_daily_frame(raw_df, leading_zeros_detector, cache_dir=INGEST_CACHE_DIR):
+    """
+    Types a frame read with dtype=object: string columns become str (keeping leading zeros),
+    every other column gets the dtype pandas would infer. Text is then sanitized once here, so
+    later stages can treat string columns as clean.
+
+    Returns:
+        (typed DataFrame, string column names, numeric column names, {column: values sanitized})
+    """
+    string_columns, numeric_columns = resolve_column_types(raw_df, leading_zeros_detector, cache_dir)
+
+    df = raw_df.copy()
+    other_columns = [col for col in df.columns if col not in string_columns]
+    if other_columns:
+        df[other_columns] = df[other_columns].infer_objects()
+    for col in string_columns:
+        df[col] = df[col].where(df[col].isna(), df[col].astype(str))
+
+    df, text_changes = sanitize_frame(df)
+
+    logger.info(f"🔤 Detected string columns: {string_columns}")
+    logger.info(f"🔢 Detected numeric columns: {numeric_columns}")
+
+    return df, string_columns, numeric_columns, text_changes
+
+
+def parse_daily_file(file_path, source_hash, leading_zeros_detector, cache_dir=INGEST_CACHE_DIR):
+    """Parses the data sheet of the daily file exactly once and types its columns."""
+    logger.info("📖 Ingest: parsing daily file once...")
+    sheet_name = data_sheet_name(file_path)
+
+    # dtype=object keeps every cell as read so string columns keep their leading zeros
+    raw_df = read_sheet(file_path, sheet_name, dtype=object)
+
+    df, string_columns, numeric_columns, text_changes = type_daily_frame(raw_df, leading_zeros_detector, cache_dir)
+    sheet_name, header_bold, column_widths = read_sheet_layout(file_path, len(df.columns), sheet_name)
+
+    helper_df = None
+    if HELPER_SHEET_NAME in sheet_names(file_path):
+        helper_df = read_sheet(file_path, HELPER_SHEET_NAME)
+
+    return DailyIngest(file_path, source_hash, sheet_name, df, string_columns, numeric_columns,
+                       header_bold, column_widths, helper_df, text_changes)
+
+
+def _write_cache(ingest, cache_dir):
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        pd.to_pickle(ingest.to_cache(), os.path.join(cache_dir, f"{ingest.source_hash}.pkl"))
+        _prune_cache(cache_dir)
+    except Exception as e:
+        logger.warning(f"Could not write ingest cache for {ingest.source_path}: {e}")
+
+
+def _prune_cache(cache_dir):
+    entries = sorted(
+        (os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.endswith('.pkl')),
+        key=os.path.getmtime, reverse=True)
+    for stale in entries[INGEST_CACHE_KEEP:]:
+        try:
+            os.remove(stale)
+        except OSError:
+            pass
+
+
+def load_daily_ingest(file_path, leading_zeros_detector, cache_dir=INGEST_CACHE_DIR):
+    """
+    Returns the DailyIngest for a daily file, parsing it only if no cache exists for its contents.
+
+    Args:
+        file_path: Path to AllCustomersDailyFile_DD.xlsx
+        leading_zeros_detector: Function(series) -> bool used for pattern-based string detection
+        cache_dir: Folder for the persisted cache and column schemas (None keeps both in memory only)
+    """
+    start_time = time.time()
+    source_hash = file_hash(file_path)
+
+    ingest = _memory_cache.get(source_hash)
+    if ingest is not None:
+        logger.info("⚡ Ingest: reusing in-memory parse")
+        return ingest
+
+    cache_path = os.path.join(cache_dir, f"{source_hash}.pkl") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        try:
+            payload = pd.read_pickle(cache_path)
+            if payload.get('version') == INGEST_CACHE_VERSION:
+                ingest = DailyIngest.from_cache(file_path, payload)
+                logger.info(f"⚡ Ingest: loaded cached parse in {time.time() - start_time:.2f}s")
+        except Exception as e:
+            logger.warning(f"Could not load ingest cache {cache_path} (re-parsing): {e}")
+
+    if ingest is None:
+        ingest = parse_daily_file(file_path, source_hash, leading_zeros_detector, cache_dir)
+        if cache_dir:
+            _write_cache(ingest, cache_dir)
+        logger.info(f"✅ Ingest: parsed {len(ingest.df)} rows in {time.time() - start_time:.2f}s")
+
+    _memory_cache[source_hash] = ingest
+    return ingest
+
+
+def seed_daily_ingest(file_path, raw_df, leading_zeros_detector, sheet_name, header_bold, column_widths,
+                      helper_df=None, text_changes=None, cache_dir=INGEST_CACHE_DIR):
+    """
+    Registers a frame that was just written to file_path as that file's ingest, so later
+    stages reuse it instead of parsing the file that was produced from it.
+    """
+    df, string_columns, numeric_columns, typed_changes = type_daily_frame(raw_df, leading_zeros_detector, cache_dir)
+    ingest = DailyIngest(file_path, file_hash(file_path), sheet_name, df, string_columns, numeric_columns,
+                         header_bold, column_widths, helper_df, text_changes or typed_changes)
+    _memory_cache[ingest.source_hash] = ingest
+    if cache_dir:
+        _write_cache(ingest, cache_dir)
+    return ingest
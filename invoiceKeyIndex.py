@@ -0,0 +1,309 @@
+import os
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+import config
+from rowFingerprint import normalize_id_series, signed_hashes, unsigned_hashes, signed_checksum
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+KEY_INDEX_PATH = os.path.join(config.config.dailyfile_base, "invoice_key_index.sqlite")
+KEY_INDEX_VERSION = 3  # Bump when normalize_id_series or the schema changes (forces a full rebuild)
+
+# Identifier columns in the index; the field code is the position in this list
+KEY_FIELDS = ['InvoiceNum', 'ContractNum', 'InternalCode']
+SEARCH_FIELDS = ('InvoiceNum', 'ContractNum')  # What InvoiceSrchXS matched on
+
+FETCH_BATCH_SIZE = 20000
+REFRESH_LOOKBACK_DAYS = 7  # Indexed days re-checked before the newest one (late loads, replace_day re-runs)
+
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)""",
+    # One row per (normalized identifier, column, row); the primary key doubles as the lookup index
+    """CREATE TABLE IF NOT EXISTS id_keys (
+        key TEXT NOT NULL,
+        field INTEGER NOT NULL,
+        row_hash INTEGER NOT NULL,  -- signed_hashes(): SQLite has no unsigned 64-bit integer
+        fdate TEXT NOT NULL,
+        PRIMARY KEY (key, field, row_hash, fdate)
+    ) WITHOUT ROWID""",
+    """CREATE INDEX IF NOT EXISTS idx_id_keys_fdate ON id_keys (fdate)""",
+    # Watermark: the dailyfiledto row count and BIT_XOR(RowHash) (signed) of every indexed day
+    """CREATE TABLE IF NOT EXISTS indexed_days (
+        fdate TEXT PRIMARY KEY,
+        row_count INTEGER,
+        checksum INTEGER,
+        indexed_at TEXT
+    )""",
+    # Days left unindexed because some of their rows have no RowHash yet (re-checked on every refresh)
+    """CREATE TABLE IF NOT EXISTS pending_days (fdate TEXT PRIMARY KEY, missing INTEGER)""",
+]
+
+
+class IncompleteKeyIndex(RuntimeError):
+    """The index can't answer completely: some days have rows without a RowHash."""
+
+
+def _day_key(value):
+    """'YYYY-MM-DD' of a DATE(fdate) value, whether the driver returns a date or a string."""
+    return value.strftime("%Y-%m-%d") if hasattr(value, 'strftime') else str(value)[:10]
+
+
+def _next_day(day):
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class _BitXor:
+    """BIT_XOR aggregate for the SQLite stand-in of dailyfiledto."""
+
+    def __init__(self):
+        self.value = 0
+
+    def step(self, value):
+        if value is not None:
+            self.value ^= int(value)
+
+    def finalize(self):
+        return self.value
+
+
+class InvoiceKeyIndex:
+    """
+    Persisted inverted index from normalized InvoiceNum / ContractNum / InternalCode to the RowHash
+    and fdate of every dailyfiledto row carrying it. Refreshed per fdate: only days whose row count
+    or BIT_XOR(RowHash) checksum changed in dailyfiledto are re-read, and only the last
+    REFRESH_LOOKBACK_DAYS days (plus pending ones) are checked, so a daily refresh reads one day.
+    Days with rows lacking a RowHash stay pending, and lookups raise IncompleteKeyIndex until
+    XStoMySqlTransfer / dailyFileLoader backfill them.
+
+    Args:
+        index_path: SQLite file holding the index
+    """
+
+    def __init__(self, index_path=KEY_INDEX_PATH):
+        self.index_path = index_path
+        os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+        self.conn = sqlite3.connect(index_path, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self._check_version()
+
+    def close(self):
+        self.conn.close()
+
+    def _check_version(self):
+        row = self.conn.execute("SELECT value FROM meta WHERE name = 'version'").fetchone()
+        if row is not None and int(row[0]) == KEY_INDEX_VERSION:
+            return
+        if row is not None:
+            logger.info("🔄 Key index version changed, rebuilding from scratch")
+        self.conn.execute("DROP TABLE IF EXISTS id_keys")
+        self.conn.execute("DROP TABLE IF EXISTS indexed_days")
+        self.conn.execute("DROP TABLE IF EXISTS pending_days")
+        for statement in SCHEMA:
+            self.conn.execute(statement)
+        self.conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES ('version', ?)", (str(KEY_INDEX_VERSION),))
+        self.conn.commit()
+
+    # ---------------- Incremental refresh ----------------
+    def refresh(self, source_conn, table='dailyfiledto', placeholder='?', full=False):
+        """
+        Brings the index in line with dailyfiledto: re-indexes days that are new or whose row count
+        or RowHash checksum changed (a day replaced with as many rows) and drops days that no longer
+        exist. Only reads dailyfiledto, and only from REFRESH_LOOKBACK_DAYS before the newest
+        indexed day on (plus the pending days), so the check does not scan the whole history.
+
+        Args:
+            source_conn: DB-API connection to the database holding dailyfiledto (pyodbc, mysql.connector
+                or the sqlite3 stand-in)
+            placeholder: Parameter marker of source_conn ('?' for pyodbc/sqlite3, '%s' for mysql.connector)
+            full: Check every day (the default when the index is empty)
+
+        Returns:
+            Number of days re-indexed
+        """
+        start_time = time.time()
+        newest = self.conn.execute("SELECT MAX(fdate) FROM indexed_days").fetchone()[0]
+        pending = [day for (day,) in self.conn.execute("SELECT fdate FROM pending_days").fetchall()]
+        since = None
+        if not full and newest is not None:
+            since = (datetime.strptime(newest, "%Y-%m-%d") - timedelta(days=REFRESH_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+
+        # Half-open ranges on the bare column, so the fdate index serves them
+        ranges, params = [], []
+        if since is not None:
+            ranges.append(f"fdate >= {placeholder}")
+            params.append(f"{since} 00:00:00")
+            for day in pending:
+                if day < since:
+                    ranges.append(f"(fdate >= {placeholder} AND fdate < {placeholder})")
+                    params += [f"{day} 00:00:00", f"{_next_day(day)} 00:00:00"]
+        date_filter = f"({' OR '.join(ranges)})" if ranges else "fdate IS NOT NULL"
+
+        if isinstance(source_conn, sqlite3.Connection):
+            source_conn.create_aggregate("BIT_XOR", 1, _BitXor)
+        cursor = source_conn.cursor()
+        cursor.execute(f"SELECT DATE(fdate), COUNT(*), BIT_XOR(RowHash), "
+                       f"SUM(CASE WHEN RowHash IS NULL THEN 1 ELSE 0 END) "
+                       f"FROM {table} WHERE {date_filter} GROUP BY DATE(fdate)", params)
+        source_days, missing = {}, {}
+        for day, count, checksum, nulls in cursor.fetchall():
+            source_days[_day_key(day)] = (int(count), signed_checksum(checksum))
+            if nulls:
+                missing[_day_key(day)] = int(nulls)
+        cursor.close()
+
+        checked = "fdate >= ?" if since is not None else "1 = 1"
+        checked_params = (since,) if since is not None else ()
+        indexed_days = {day: (count, checksum) for day, count, checksum in self.conn.execute(
+            f"SELECT fdate, row_count, checksum FROM indexed_days WHERE {checked}", checked_params).fetchall()}
+        in_scope = set(indexed_days) | {day for day in pending if since is None or day < since}
+        stale = sorted(day for day, watermark in source_days.items()
+                       if day not in missing and indexed_days.get(day) != watermark)
+        removed = sorted(in_scope - set(source_days))
+
+        for day in removed:
+            self._forget_day(day)
+        for day, nulls in missing.items():
+            # Left out until its rows have a RowHash: a partial day would silently drop matches
+            self._forget_day(day)
+            self.conn.execute("INSERT INTO pending_days (fdate, missing) VALUES (?, ?)", (day, nulls))
+        self.conn.commit()
+        if missing:
+            logger.warning(f"🔑 Key index: {len(missing)} days have {sum(missing.values())} rows without a RowHash "
+                           f"and stay unindexed (run XStoMySqlTransfer or dailyFileLoader to backfill them)")
+
+        for day in stale:
+            self.reindex_day(source_conn, day, *source_days[day], table, placeholder)
+
+        if stale or removed:
+            logger.info(f"🗂️ Key index: re-indexed {len(stale)} days, dropped {len(removed)} "
+                        f"in {time.time() - start_time:.2f}s")
+        else:
+            logger.info(f"⚡ Key index up to date ({len(source_days)} days checked) "
+                        f"in {time.time() - start_time:.2f}s")
+        return len(stale)
+
+    def _forget_day(self, day):
+        self.conn.execute("DELETE FROM id_keys WHERE fdate = ?", (day,))
+        self.conn.execute("DELETE FROM indexed_days WHERE fdate = ?", (day,))
+        self.conn.execute("DELETE FROM pending_days WHERE fdate = ?", (day,))
+
+    def pending_days(self):
+        """{fdate: rows without a RowHash} of the days the index leaves out."""
+        return dict(self.conn.execute("SELECT fdate, missing FROM pending_days ORDER BY fdate").fetchall())
+
+    def _check_complete(self):
+        pending = self.pending_days()
+        if pending:
+            raise IncompleteKeyIndex(f"{len(pending)} days ({', '.join(list(pending)[:5])}"
+                                     f"{', ...' if len(pending) > 5 else ''}) have rows without a RowHash; "
+                                     f"backfill them before searching through the key index")
+
+    def reindex_day(self, source_conn, day, row_count, checksum, table='dailyfiledto', placeholder='?'):
+        """
+        Replaces the index entries of one fdate with the keys of its current dailyfiledto rows.
+        A day with rows lacking a RowHash (they can't be fetched by RowHash) is left pending instead.
+        """
+        is_sqlite = isinstance(source_conn, sqlite3.Connection)
+        day_start = f"{day} 00:00:00"
+        day_end = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d 00:00:00")
+        columns = KEY_FIELDS + ['RowHash']
+
+        cursor = source_conn.cursor()
+        cursor.execute(f"SELECT {', '.join(f'`{col}`' for col in columns)} FROM {table} "
+                       f"WHERE fdate >= {placeholder} AND fdate < {placeholder}", (day_start, day_end))
+        chunks = []
+        while True:
+            rows = cursor.fetchmany(FETCH_BATCH_SIZE)
+            if not rows:
+                break
+            chunks.append(pd.DataFrame.from_records([tuple(row) for row in rows], columns=columns))
+        cursor.close()
+        df = pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=columns)
+
+        missing = int(df['RowHash'].isna().sum())
+        if missing:
+            # Loaded after refresh() looked at the day; leave it pending for the next refresh
+            self._forget_day(day)
+            self.conn.execute("INSERT INTO pending_days (fdate, missing) VALUES (?, ?)", (day, missing))
+            self.conn.commit()
+            logger.warning(f"🔑 {day}: {missing} rows have no RowHash yet; day left unindexed")
+            return
+        stored = df['RowHash'].astype('int64' if is_sqlite else 'uint64')
+        signed = stored.to_numpy() if is_sqlite else signed_hashes(stored)
+
+        self.conn.execute("DELETE FROM id_keys WHERE fdate = ?", (day,))
+        for field_code, field in enumerate(KEY_FIELDS):
+            keys = normalize_id_series(df[field])
+            present = (keys != '').to_numpy()
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO id_keys (key, field, row_hash, fdate) VALUES (?, ?, ?, ?)",
+                ((key, field_code, int(row_hash), day) for key, row_hash in zip(keys[present], signed[present])))
+        self.conn.execute("DELETE FROM pending_days WHERE fdate = ?", (day,))
+        self.conn.execute(
+            "INSERT OR REPLACE INTO indexed_days (fdate, row_count, checksum, indexed_at) VALUES (?, ?, ?, ?)",
+            (day, row_count, checksum, datetime.now().isoformat(timespec='seconds')))
+        self.conn.commit()
+
+    # ---------------- Lookup ----------------
+    def lookup(self, values, fields=SEARCH_FIELDS):
+        """
+        RowHash values of the dailyfiledto rows whose fields contain any of the given identifiers.
+        One indexed join against a temporary table of the normalized values.
+
+        Returns:
+            Sorted list of RowHash values (unsigned, as stored in MySQL)
+        """
+        self._check_complete()
+        start_time = time.time()
+        keys = normalize_id_series(pd.Series(list(values), dtype=object))
+        keys = keys[keys != ''].unique()
+        field_codes = [KEY_FIELDS.index(field) for field in fields]
+
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM search_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO search_keys (key) VALUES (?)", ((key,) for key in keys))
+        rows = self.conn.execute(
+            f"SELECT DISTINCT k.row_hash FROM search_keys s JOIN id_keys k ON k.key = s.key "
+            f"WHERE k.field IN ({', '.join('?' * len(field_codes))})", field_codes).fetchall()
+        self.conn.execute("DELETE FROM search_keys")
+
+        row_hashes = sorted(int(h) for h in unsigned_hashes([row[0] for row in rows]))
+        logger.info(f"🔍 Key index: {len(keys)} identifiers -> {len(row_hashes)} rows "
+                    f"in {time.time() - start_time:.3f}s")
+        return row_hashes
+
+    def lookup_keys(self, keys, fields=SEARCH_FIELDS):
+        """
+        Per-identifier variant of lookup() for already normalized keys (normalize_id_series).
+
+        Returns:
+            {key: sorted list of RowHash values}, with an empty list for keys found nowhere
+        """
+        self._check_complete()
+        keys = [key for key in dict.fromkeys(keys) if key]
+        field_codes = [KEY_FIELDS.index(field) for field in fields]
+
+        self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_keys (key TEXT PRIMARY KEY)")
+        self.conn.execute("DELETE FROM search_keys")
+        self.conn.executemany("INSERT OR IGNORE INTO search_keys (key) VALUES (?)", ((key,) for key in keys))
+        rows = self.conn.execute(
+            f"SELECT DISTINCT k.key, k.row_hash FROM search_keys s JOIN id_keys k ON k.key = s.key "
+            f"WHERE k.field IN ({', '.join('?' * len(field_codes))})", field_codes).fetchall()
+        self.conn.execute("DELETE FROM search_keys")
+
+        matches = {key: [] for key in keys}
+        for key, row_hash in zip([row[0] for row in rows], unsigned_hashes([row[1] for row in rows])):
+            matches[key].append(int(row_hash))
+        for hashes in matches.values():
+            hashes.sort()
+        return matches
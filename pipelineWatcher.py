@@ -0,0 +1,272 @@
+import os
+import re
+import sys
+import json
+import time
+import argparse
+import logging
+import subprocess
+from datetime import datetime, timedelta
+
+import config
+from dailyIngest import is_restructured
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DAILY_FILE_BASE = config.config.dailyfile_base
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+POLL_SECONDS = 5
+STABLE_SECONDS = 10  # Size and mtime unchanged this long = the copy/sync has finished
+LOOKBACK_DAYS = 2  # Day folders checked besides today (late or weekend files)
+STATE_FILE = os.path.join(DAILY_FILE_BASE, "pipeline_state.json")
+
+# prep -> import -> recon, each run as its own process with AZM_RUN_DATE set
+PIPELINE_STEPS = [
+    ('prep', 'prepDailyFile7.py'),
+    ('import', 'dailyFileLoader.py'),
+    ('recon', 'OpenRecon.py'),
+]
+
+# ...\YYYY\Mon\DD\AllCustomersDailyFile_DD.xlsx
+DAILY_FILE_PATTERN = re.compile(
+    r'[\\/](?P<year>\d{4})[\\/](?P<month>[A-Za-z]{3})[\\/](?P<day>\d{1,2})[\\/]'
+    r'AllCustomersDailyFile_(?P<file_day>\d{2})\.xlsx$')
+
+
+def daily_file_path(run_date):
+    """Where the daily file of run_date lands (same layout prepDailyFile7 reads from)."""
+    return os.path.join(DAILY_FILE_BASE, run_date.strftime("%Y"), run_date.strftime("%b"),
+                        run_date.strftime("%d"), f"AllCustomersDailyFile_{run_date:%d}.xlsx")
+
+
+def run_date_from_path(path):
+    """Run date encoded in a daily file path, or None when the path is not a daily file."""
+    match = DAILY_FILE_PATTERN.search(path)
+    if not match or int(match['day']) != int(match['file_day']):
+        return None
+    try:
+        return datetime.strptime(f"{match['year']}-{match['month']}-{match['day']}", "%Y-%b-%d").date()
+    except ValueError:
+        return None
+
+
+def load_state(lookback_days=LOOKBACK_DAYS):
+    if not os.path.exists(STATE_FILE):
+        return seed_state(candidate_dates(lookback_days))
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read pipeline state {STATE_FILE} (starting empty): {e}")
+        return {}
+
+
+def seed_state(dates):
+    """
+    State for a first start (or a new machine): daily files prep already restructured are taken
+    as done, so the look-back days are not prepped and imported a second time.
+    """
+    state = {}
+    for run_date in dates:
+        path = daily_file_path(run_date)
+        try:
+            done = os.path.exists(path) and is_restructured(path)
+        except Exception as e:
+            logger.warning(f"Could not inspect {path} (left to the watcher): {e}")
+            done = False
+        if done:
+            state[run_date.strftime("%Y-%m-%d")] = {
+                'status': 'done',
+                'completed': [name for name, _ in PIPELINE_STEPS],
+                'failed_step': None,
+                'signature': file_signature(path),
+                'finished': None,
+            }
+            logger.info(f"🌱 {path} is already restructured; taken as done")
+    if state:
+        save_state(state)
+    return state
+
+
+def save_state(state):
+    tmp_path = STATE_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, STATE_FILE)
+
+
+def file_signature(path):
+    """[size, mtime_ns] of a file, as StabilityTracker.signature() reports it."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def is_readable(path):
+    """False while another process (sync client, Excel) still holds the file exclusively."""
+    try:
+        with open(path, 'rb'):
+            return True
+    except OSError:
+        return False
+
+
+class StabilityTracker:
+    """Remembers (size, mtime) per file and since when it has been unchanged."""
+
+    def __init__(self, stable_seconds=STABLE_SECONDS):
+        self.stable_seconds = stable_seconds
+        self.seen = {}  # {path: ((size, mtime_ns), first seen with that signature)}
+
+    def is_stable(self, path, now=None):
+        now = time.monotonic() if now is None else now
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.seen.pop(path, None)
+            return False
+        signature = (stat.st_size, stat.st_mtime_ns)
+        previous = self.seen.get(path)
+        if previous is None or previous[0] != signature:
+            self.seen[path] = (signature, now)
+            return False
+        return stat.st_size > 0 and now - previous[1] >= self.stable_seconds and is_readable(path)
+
+    def signature(self, path):
+        entry = self.seen.get(path)
+        return list(entry[0]) if entry else None
+
+
+def run_pipeline(run_date, steps=PIPELINE_STEPS, completed=(), on_step=None):
+    """
+    Runs the steps in order for run_date, stopping at the first one that exits non-zero.
+    Steps named in completed are skipped (resuming a failed run); on_step(name) is called after
+    each step that succeeds.
+
+    Returns:
+        (True, None) when every step succeeded, else (False, failed step name)
+    """
+    env = dict(os.environ, AZM_RUN_DATE=run_date.strftime("%Y-%m-%d"))
+    pipeline_start = time.time()
+    for name, script in steps:
+        if name in completed:
+            logger.info(f"⏭️ {run_date:%Y-%m-%d} {name}: already completed")
+            continue
+        logger.info(f"▶️ {run_date:%Y-%m-%d} {name}: {script}")
+        step_start = time.time()
+        result = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script)], cwd=SCRIPT_DIR, env=env)
+        if result.returncode != 0:
+            logger.error(f"❌ {name} failed (exit code {result.returncode}) after {time.time() - step_start:.1f}s")
+            return False, name
+        logger.info(f"✅ {name} completed in {time.time() - step_start:.1f}s")
+        if on_step is not None:
+            on_step(name)
+    logger.info(f"🎉 Pipeline for {run_date:%Y-%m-%d} completed in {time.time() - pipeline_start:.1f}s")
+    return True, None
+
+
+def candidate_dates(lookback_days=LOOKBACK_DAYS, today=None):
+    today = today or datetime.now().date()
+    return [today - timedelta(days=offset) for offset in range(lookback_days, -1, -1)]
+
+
+def poll_once(tracker, state, dates, steps=PIPELINE_STEPS):
+    """
+    Checks the daily file of every date once and runs the pipeline for each one that has become
+    stable. Done days are never re-run (prep rewrites the file); failed days are re-run once the
+    file changes again, from the failed step while the file is still the one prep rewrote. Prep is
+    never run on a file that is already restructured.
+
+    Returns:
+        Number of pipelines started
+    """
+    started = 0
+    for run_date in dates:
+        key = run_date.strftime("%Y-%m-%d")
+        entry = state.get(key)
+        if entry and entry.get('status') == 'done':
+            continue
+        path = daily_file_path(run_date)
+        if not tracker.is_stable(path):
+            continue
+        signature = tracker.signature(path)
+        if entry and entry.get('status') == 'failed' and entry.get('signature') == signature:
+            continue
+
+        completed = list(entry.get('completed', [])) if entry else []
+        try:
+            restructured = is_restructured(path)
+        except Exception as e:
+            logger.warning(f"Could not inspect {path} (treating it as a raw file): {e}")
+            restructured = False
+        if not restructured:
+            completed = []  # a new raw file: the whole chain again
+        elif 'prep' not in completed:
+            logger.info(f"{path} is already restructured; skipping prep")
+            completed.append('prep')
+
+        def record(status, failed_step=None):
+            # The signature after the last completed step: prep rewrites the file in place
+            state[key] = {
+                'status': status,
+                'completed': list(completed),
+                'failed_step': failed_step,
+                'signature': file_signature(path),
+                'finished': datetime.now().isoformat(timespec='seconds'),
+            }
+            save_state(state)
+
+        def step_done(name):
+            completed.append(name)
+            record('running')
+
+        logger.info(f"📥 Daily file ready: {path}")
+        success, failed_step = run_pipeline(run_date, steps, completed, step_done)
+        record('done' if success else 'failed', failed_step)
+        started += 1
+    return started
+
+
+def watch(poll_seconds=POLL_SECONDS, stable_seconds=STABLE_SECONDS, lookback_days=LOOKBACK_DAYS):
+    """
+    Polls the day folders (os.stat of a few known paths, no directory walks) and starts the
+    prep -> import -> recon chain as soon as a daily file has been stable for stable_seconds.
+    """
+    tracker = StabilityTracker(stable_seconds)
+    state = load_state(lookback_days)
+    logger.info(f"👀 Watching {DAILY_FILE_BASE} for daily files (poll {poll_seconds}s, stable {stable_seconds}s)")
+    try:
+        while True:
+            poll_once(tracker, state, candidate_dates(lookback_days), PIPELINE_STEPS)
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        logger.info("👋 Watcher stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Start the daily pipeline when the daily file lands")
+    parser.add_argument('--poll', type=float, default=POLL_SECONDS, help="Seconds between checks")
+    parser.add_argument('--stable', type=float, default=STABLE_SECONDS, help="Seconds the file must stay unchanged")
+    parser.add_argument('--lookback', type=int, default=LOOKBACK_DAYS, help="Earlier days to check besides today")
+    parser.add_argument('--run', metavar='PATH', help="Run the pipeline now for this daily file and exit")
+    args = parser.parse_args()
+
+    if args.run:
+        run_date = run_date_from_path(os.path.abspath(args.run))
+        if run_date is None:
+            logger.error(f"Not a daily file path (...\\YYYY\\Mon\\DD\\AllCustomersDailyFile_DD.xlsx): {args.run}")
+            return 1
+        success, _ = run_pipeline(run_date)
+        return 0 if success else 1
+
+    watch(args.poll, args.stable, args.lookback)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
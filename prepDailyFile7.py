@@ -3,21 +3,25 @@ import xlwings as xw
 from datetime import date, datetime
 import time
 import os
+import sys
 import numpy as np
 import mysql.connector
-from mysql.connector import Error
+from mysql.connector import Error, FieldType
 import concurrent.futures
 from threading import Lock
 import logging
 import traceback
-from openpyxl import load_workbook, Workbook
-from openpyxl.styles import Font, PatternFill, Border, Side, Alignment
-from openpyxl.utils.dataframe import dataframe_to_rows
 import tempfile
 from pathlib import Path
 import copy
-import re
 import config
+from dailyIngest import (load_daily_ingest, seed_daily_ingest, read_sheet_layout, column_letter, data_sheet_name,
+                         is_restructured, HELPER_SHEET_NAME)
+from xlsxStreamReader import read_sheet
+from customerLookup import load_customer_lookup, normalize_arabic_series
+from textSanitize import sanitize_frame
+from xlsxStreamWriter import SheetStyle, XlsxStreamWriter, write_frame_xlsx, date_columns_of
+from sharedDayData import SharedDayFrame
 
 m_day = config.config.curr_day
 m_month = config.config.curr_month
@@ -42,9 +46,18 @@ mysql_config = {
     "database": "azm"
 }
 
+# Columns written to each customer file by the database split (dailyfiledto layout)
+DB_SPLIT_COLUMNS = ['Cust', 'Index', 'BillerName', 'InvoiceNum', 'InvAmount', 'AmountPaid', 'PayDate', 'OpFee',
+                    'PostPaidShare', 'SubBillerName', 'SubBillerShare', 'DedFeeSubPost', 'InternalCode',
+                    'Comments', 'ContractNum', 'fdate']
+DB_SPLIT_BATCH_SIZE = 5000  # Rows per fetchmany() round trip
+
 # Global variables
 connection_pool = None
 pool_lock = Lock()
+_split_worker_state = None
+
+HELPER_COLUMNS = ['CustomerName', 'Index', 'ArabicName', 'HyperLink', 'TransType', 'BillerType']
 
 
 def get_mysql_connection_pool():
@@ -75,6 +88,9 @@ def modify_excel_file_final(daily_file_path, master_file_path):
     Modifies an Excel file by rearranging columns and adding data from a master file
     while preserving original formatting.
     """
+    if is_restructured(daily_file_path):
+        raise RuntimeError(f"{daily_file_path} is already restructured (Helper sheet, 'Cust' in A1); "
+                           f"not moving its columns again")
     app = None
     try:
         logger.info("PHASE 1: Starting column movements.")
@@ -121,8 +137,8 @@ def modify_excel_file_final(daily_file_path, master_file_path):
         daily_sheet.range('A1').value = 'Cust'
         daily_sheet.range('B1').value = 'Index'
 
-        # Write 'fdate' to Column U
-        today = date.today()
+        # Write 'fdate' to Column U (the run date: AZM_RUN_DATE when the watcher reprocesses an earlier day)
+        today = date(m_year, m_month, m_day)
         daily_sheet.range('U1').value = 'fdate'
         daily_sheet.range('U2:U' + str(last_row)).value = today
         logger.info("PHASE 1: Column movements completed.")
@@ -133,10 +149,8 @@ def modify_excel_file_final(daily_file_path, master_file_path):
         اسم_المفوتر_col = daily_sheet.range('C2:C' + str(last_row)).options(ndim=1).value
         اسم_المفوتر_df = pd.DataFrame(اسم_المفوتر_col, columns=['اسم المفوتر'])
 
-        master_df = pd.read_excel(master_file_path, usecols=['Arabic', 'Name', 'Index', 'Type', 'Transf Type'])
-        master_df.rename(columns={'Arabic': 'اسم المفوتر', 'Name': 'Cust', 'Index': 'Index'}, inplace=True)
-
-        merged_df = pd.merge(اسم_المفوتر_df, master_df, on='اسم المفوتر', how='left')
+        lookup = load_customer_lookup(master_file_path)
+        merged_df = lookup.map_names(اسم_المفوتر_df['اسم المفوتر'])
         daily_sheet.range('A2').value = merged_df[['Cust', 'Index']].values
 
         # PHASE 3: Convert amount columns to numeric format using Excel's TextToColumns (FAST!)
@@ -205,6 +219,107 @@ def modify_excel_file_final(daily_file_path, master_file_path):
         raise
 
 
+def coerce_amount_column(series):
+    """
+    Vectorized equivalent of Excel's TextToColumns (General, trailing minus) on one column:
+    numeric-looking text becomes a number, anything else is left as it was.
+    """
+    text = series.astype(str).str.strip().str.replace(',', '', regex=False)
+    text = text.str.replace(r'^(.*\d)-$', r'-\1', regex=True)  # Trailing minus: '100-' -> -100
+    numbers = pd.to_numeric(text.where(series.notna()), errors='coerce')
+    return numbers.where(numbers.notna(), series)
+
+
+def restructure_daily_file_headless(daily_file_path, master_file_path):
+    """
+    Headless version of modify_excel_file_final: the same column moves, fdate fill,
+    CustomerNamesLookUp merge and amount conversion done in pandas, written once with
+    the streaming writer. Runs without Excel.
+
+    Resulting layout (same as the Excel Cut/Insert sequence):
+        A Cust, B Index, C original A, D..S original C..R, T original B, U fdate
+
+    Returns:
+        DailyIngest of the rewritten file, or None if the file has no data rows
+    """
+    if is_restructured(daily_file_path):
+        raise RuntimeError(f"{daily_file_path} is already restructured (Helper sheet, 'Cust' in A1); "
+                           f"not moving its columns again")
+    logger.info("PHASE 1: Reading daily file.")
+    sheet_name = data_sheet_name(daily_file_path)
+    raw_df = read_sheet(daily_file_path, sheet_name, dtype=object)
+    sheet_name, raw_header_bold, raw_widths = read_sheet_layout(daily_file_path, len(raw_df.columns), sheet_name)
+
+    # Excel's A1.end('down'): the data block ends at the first blank biller name
+    first_blank = raw_df.iloc[:, 0].isna().to_numpy().nonzero()[0] if len(raw_df.columns) else []
+    last_data_row = int(first_blank[0]) if len(first_blank) else len(raw_df)
+    if last_data_row < 1:
+        logger.error("The daily file is empty or contains only headers.")
+        return None
+
+    raw_columns = raw_df.columns.tolist()
+    if len(raw_columns) > 18:
+        logger.warning(f"Daily file has {len(raw_columns)} columns; column S onwards is overwritten "
+                       f"by the move of column B, as in the Excel version.")
+
+    # Column movements: B -> S, A -> B, insert a new B
+    source_positions = [None, None, 0] + list(range(2, min(len(raw_columns), 18))) + [1]
+    df = pd.DataFrame(index=raw_df.index)
+    df['Cust'] = pd.Series(np.nan, index=raw_df.index, dtype=object)
+    df['Index'] = pd.Series(np.nan, index=raw_df.index, dtype=object)
+    for pos in source_positions[2:]:
+        df[raw_columns[pos]] = raw_df.iloc[:, pos]
+
+    # Write 'fdate' to Column U (the run date: AZM_RUN_DATE when the watcher reprocesses an earlier day)
+    today = pd.Timestamp(date(m_year, m_month, m_day))
+    df['fdate'] = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    df.iloc[:last_data_row, df.columns.get_loc('fdate')] = today
+
+    # Clean text once (control characters, NBSP, presentation forms, float tails on IDs)
+    df, text_changes = sanitize_frame(df)
+    logger.info("PHASE 1: Column movements completed.")
+
+    # PHASE 2: Lookup merge
+    logger.info("PHASE 2: Starting data processing.")
+    # Normalized-name index of CustomerNamesLookUp, rebuilt only when the master file changes
+    lookup = load_customer_lookup(master_file_path)
+    merged_df = lookup.map_names(df.iloc[:last_data_row, 2])
+    df.iloc[:last_data_row, 0] = merged_df['Cust'].to_numpy()
+    df.iloc[:last_data_row, 1] = merged_df['Index'].to_numpy()
+
+    # PHASE 3: Vectorized numeric conversion of E, F, H, I, K
+    logger.info("PHASE 3: Converting amount columns to numeric format...")
+    amount_positions = [pos for pos in (4, 5, 7, 8, 10) if pos < len(df.columns)]
+    amount_columns = [df.columns[pos] for pos in amount_positions]
+    for col in amount_columns:
+        df[col] = coerce_amount_column(df[col])
+
+    # Header font and widths follow the columns they came from
+    header_bold = {}
+    column_widths = {}
+    for new_idx, source_pos in enumerate(source_positions + [None], 1):
+        if source_pos is None:
+            continue
+        header_bold[new_idx] = raw_header_bold.get(source_pos + 1, False)
+        width = raw_widths.get(column_letter(source_pos + 1))
+        if width is not None:
+            column_widths[column_letter(new_idx)] = width
+
+    # Helper table: a by-product of the lookup above, no second read of the file
+    helper_df = build_helper_table(df, lookup)
+
+    # Helper goes first (where Excel used to insert it), the data sheet second, in one save
+    style = SheetStyle(df.columns, amount_columns=amount_columns, date_columns=['fdate'],
+                       column_widths=column_widths, header_bold=header_bold)
+    with XlsxStreamWriter(daily_file_path) as writer:
+        writer.write_frame(HELPER_SHEET_NAME, helper_df, SheetStyle(HELPER_COLUMNS, header_bold=False))
+        writer.write_frame(sheet_name, df, style)
+    logger.info(f"Daily file restructured headlessly: {len(df)} rows and {len(helper_df)} helper rows written.")
+
+    return seed_daily_ingest(daily_file_path, df, detect_leading_zeros_pattern, sheet_name,
+                             header_bold, column_widths, helper_df, text_changes)
+
+
 def detect_leading_zeros_pattern(series):
     """
     Detect if a pandas series likely contains values with leading zeros
@@ -213,94 +328,102 @@ def detect_leading_zeros_pattern(series):
     if series.dtype == 'object':  # String columns
         return True
 
-    # Check for numeric patterns that might have had leading zeros
-    sample_values = series.dropna().astype(str).head(100)  # Check first 100 non-null values
+    # Check for numeric patterns that might have had leading zeros (first 100 non-null values)
+    sample_values = series.dropna().head(100).astype(str)
+    if sample_values.empty:
+        return False
 
-    # Look for patterns that suggest leading zeros
-    patterns = [
-        r'^\d+$',  # Pure numeric strings
-        r'^\d{6,}$',  # Long numeric strings (likely IDs)
-        r'^0+\d+',  # Strings starting with zeros
-    ]
-
-    for pattern in patterns:
-        matches = sum(1 for val in sample_values if re.match(pattern, str(val)))
-        if matches > len(sample_values) * 0.3:  # If 30% match pattern
-            return True
+    # Whole-column string matches instead of a re.match per value:
+    # pure numeric strings (which covers long numeric IDs) or strings starting with zeros
+    threshold = len(sample_values) * 0.3  # If 30% match pattern
+    if sample_values.str.fullmatch(r'\d+').sum() > threshold:
+        return True
+    if sample_values.str.match(r'0+\d').sum() > threshold:
+        return True
 
     return False
 
 
-def smart_read_excel_with_string_preservation(file_path):
+def smart_read_excel_with_string_preservation(file_path, ingest=None):
     """
     Fast hybrid approach: Read with pandas for speed, but preserve string formatting
     where needed using intelligent detection. Numeric columns are already converted in main file.
+    The sheet is parsed once through the ingest cache and reused by every later stage.
     """
     logger.info("📊 Smart reading Excel with string preservation...")
 
-    # Step 1: Quick pandas read to get structure and detect patterns
-    temp_df = pd.read_excel(file_path, nrows=50)  # Read just 50 rows for pattern detection
-
-    # Step 2: Identify columns that likely need string preservation
-    string_columns = []
-    column_names = temp_df.columns.tolist()
-
-    # Position-based detection (D, M, T columns)
-    position_based_columns = []
-    if len(column_names) > 3:  # Column D
-        position_based_columns.append(column_names[3])
-    if len(column_names) > 12:  # Column M
-        position_based_columns.append(column_names[12])
-    if len(column_names) > 19:  # Column T
-        position_based_columns.append(column_names[19])
-
-    # Name-based detection
-    name_based_columns = ['InvoiceNum', 'InternalCode', 'ContractNum']
-
-    # Pattern-based detection
-    pattern_based_columns = []
-    for col in temp_df.columns:
-        if detect_leading_zeros_pattern(temp_df[col]):
-            pattern_based_columns.append(col)
-
-    # Combine all approaches for string columns
-    string_columns = list(set(position_based_columns + name_based_columns + pattern_based_columns))
-
-    # Step 3: Identify numeric amount columns (E, F, H, I, K) - these are already converted in main file
-    numeric_columns = []
-    if len(column_names) > 4:  # Column E
-        numeric_columns.append(column_names[4])
-    if len(column_names) > 5:  # Column F
-        numeric_columns.append(column_names[5])
-    if len(column_names) > 7:  # Column H
-        numeric_columns.append(column_names[7])
-    if len(column_names) > 8:  # Column I
-        numeric_columns.append(column_names[8])
-    if len(column_names) > 10:  # Column K
-        numeric_columns.append(column_names[10])
-
-    logger.info(f"🔤 Detected string columns: {string_columns}")
-    logger.info(f"🔢 Detected numeric columns (already converted in main file): {numeric_columns}")
-
-    # Step 4: Read full file with appropriate dtypes
-    dtype_dict = {}
-    for col in string_columns:
-        if col in column_names:
-            dtype_dict[col] = str  # Force as string to preserve leading zeros
-
-    # For numeric columns, let pandas read them naturally as they're already properly formatted
-    # in the main Excel file after our conversion
-
-    # Read the full file with string preservation
-    logger.info("📖 Reading full file with optimized dtypes...")
-    full_df = pd.read_excel(file_path, dtype=dtype_dict)
-
-    # No need to convert numeric columns here - they're already converted in the main file
-
-    return full_df, string_columns, numeric_columns
-
-
-def lightning_fast_formatted_split(daily_file_path, master_file_path):
+    if ingest is None:
+        ingest = load_daily_ingest(file_path, detect_leading_zeros_pattern)
+
+    return ingest.df, ingest.string_columns, ingest.numeric_columns
+
+
+def safe_customer_filename(customer_name):
+    """File name for a customer's split file: keeps letters, digits, space, '-', '_' and '.'."""
+    return "".join(c for c in str(customer_name) if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
+
+
+def _init_split_worker(handle, file_dir, style):
+    """Process pool initializer: attach to the day's shared frame once per worker."""
+    global _split_worker_state
+    _split_worker_state = (SharedDayFrame.attach_cached(handle), file_dir, style)
+
+
+def _split_worker_write(customer_name):
+    """Writes one customer's file inside a pool worker. Returns (customer, ok, rows or error)."""
+    day_frame, file_dir, style = _split_worker_state
+    return write_customer_split_file(day_frame, customer_name, file_dir, style)
+
+
+def write_customer_split_file(day_frame, customer_name, file_dir, style):
+    """Writes one customer's slice of the shared day frame. Returns (customer, ok, rows or error)."""
+    try:
+        customer_data = day_frame.customer_frame(customer_name)
+        output_file = os.path.join(file_dir, f"{safe_customer_filename(customer_name)}.xlsx")
+
+        # Stream rows with column-level formats (no per-cell style objects)
+        write_frame_xlsx(output_file, customer_data, style)
+        return customer_name, True, len(customer_data)
+    except Exception as e:
+        return customer_name, False, str(e)
+
+
+def split_customers_parallel(day_frame, customers, file_dir, style, max_workers=None):
+    """
+    Writes every customer's file from a SharedDayFrame across a process pool.
+    Workers attach to the shared block, so no rows are pickled. Progress is logged here in the
+    parent and failures are collected per customer.
+
+    Returns:
+        list of (customer, ok, rows or error), in customer order regardless of completion order
+    """
+    workers = max_workers or os.cpu_count() or 1
+    results = {}
+
+    if workers <= 1 or len(customers) <= 1:
+        for customer_name in customers:
+            results[customer_name] = write_customer_split_file(day_frame, customer_name, file_dir, style)
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_split_worker,
+                initargs=(day_frame.handle, file_dir, style)) as executor:
+            future_to_customer = {executor.submit(_split_worker_write, customer_name): customer_name
+                                  for customer_name in customers}
+            for future in concurrent.futures.as_completed(future_to_customer):
+                customer_name = future_to_customer[future]
+                try:
+                    results[customer_name] = future.result()
+                except Exception as e:
+                    results[customer_name] = (customer_name, False, str(e))
+
+                # Progress update every 50 files
+                if len(results) % 50 == 0:
+                    logger.info(f"🔄 Lightning progress: {len(results)}/{len(customers)} files completed...")
+
+    return [results[customer_name] for customer_name in customers]
+
+
+def lightning_fast_formatted_split(daily_file_path, master_file_path, ingest=None, max_workers=None):
     """
     LIGHTNING FAST version: Combines speed with formatting and string preservation
     Uses hybrid approach for optimal performance
@@ -310,112 +433,38 @@ def lightning_fast_formatted_split(daily_file_path, master_file_path):
 
     try:
         # Step 1: Smart read with string preservation and numeric conversion (FAST)
-        full_df, string_columns, numeric_columns = smart_read_excel_with_string_preservation(daily_file_path)
+        if ingest is None:
+            ingest = load_daily_ingest(daily_file_path, detect_leading_zeros_pattern)
+        full_df, string_columns, numeric_columns = smart_read_excel_with_string_preservation(daily_file_path, ingest)
 
         if full_df.empty:
             logger.warning("Daily file is empty!")
             return 0, 0, 0
 
-        # Step 2: Quick formatting template extraction (FAST)
+        # Step 2: Column-level styles defined once from the ingest pass (no second workbook load)
         logger.info("🎨 Extracting formatting template...")
-        template_wb = load_workbook(daily_file_path)
-        template_ws = template_wb.active
-
-        # Get formatting for first data row only (much faster than all rows)
-        header_formats = {}
-        data_formats = {}
-
-        max_cols = min(template_ws.max_column, len(full_df.columns))
-
-        for col_idx in range(1, max_cols + 1):
-            col_name = full_df.columns[col_idx - 1] if col_idx <= len(full_df.columns) else None
-
-            # Header formatting
-            header_cell = template_ws.cell(row=1, column=col_idx)
-            header_formats[col_idx] = {
-                'font': Font(bold=True) if header_cell.font and header_cell.font.bold else Font(),
-                'number_format': '@' if col_name in string_columns else 'General'
-            }
-
-            # Data formatting (simplified)
-            if template_ws.max_row >= 2:
-                data_formats[col_idx] = {
-                    'number_format': (
-                        '@' if col_name in string_columns else
-                        '#,##0.00' if col_name in numeric_columns else
-                        'General'
-                    )
-                }
-            else:
-                data_formats[col_idx] = header_formats[col_idx]
-
-        # Get column widths (fast)
-        column_widths = {}
-        for col_letter, dimension in template_ws.column_dimensions.items():
-            column_widths[col_letter] = dimension.width if dimension.width else 13.0
-
-        template_wb.close()
+        style = SheetStyle(full_df.columns, string_columns=string_columns, amount_columns=numeric_columns,
+                           date_columns=date_columns_of(full_df), column_widths=ingest.column_widths,
+                           header_bold=ingest.header_bold)
 
-        # Step 3: Lightning fast customer processing
-        unique_customers = full_df['Cust'].dropna().unique()
-        logger.info(f"👥 Processing {len(unique_customers)} customers...")
+        # Step 3: Sort once by Cust, slice partitions with searchsorted and write them in parallel
         logger.info(f"🔤 String columns: {string_columns}")
         logger.info(f"🔢 Numeric columns: {numeric_columns}")
 
         file_dir = os.path.dirname(daily_file_path)
-        successful_files = 0
-        failed_files = 0
-
-        # Group data once for efficiency
-        customer_groups = full_df.groupby('Cust')
 
-        for customer_name in unique_customers:
-            try:
-                customer_data = customer_groups.get_group(customer_name)
+        with SharedDayFrame.publish(full_df, key_column='Cust') as day_frame:
+            unique_customers = day_frame.keys()
+            logger.info(f"👥 Processing {len(unique_customers)} customers "
+                        f"with {max_workers or os.cpu_count()} workers...")
 
-                if customer_data.empty:
-                    continue
+            results = split_customers_parallel(day_frame, unique_customers, file_dir, style, max_workers)
 
-                # Create safe filename
-                safe_filename = "".join(
-                    c for c in str(customer_name) if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
-                output_file = os.path.join(file_dir, f"{safe_filename}.xlsx")
-
-                # Ultra-fast workbook creation
-                wb = Workbook()
-                ws = wb.active
-
-                # Bulk write data (SUPER FAST)
-                rows_data = dataframe_to_rows(customer_data, index=False, header=True)
-                for r_idx, row in enumerate(rows_data, 1):
-                    for c_idx, value in enumerate(row, 1):
-                        cell = ws.cell(row=r_idx, column=c_idx, value=value)
-
-                        # Apply essential formatting only
-                        if r_idx == 1 and c_idx in header_formats:  # Header
-                            cell.font = header_formats[c_idx]['font']
-                            cell.number_format = header_formats[c_idx]['number_format']
-                        elif r_idx > 1 and c_idx in data_formats:  # Data
-                            cell.number_format = data_formats[c_idx]['number_format']
-
-                # Quick column width application
-                for col_idx, col_name in enumerate(customer_data.columns, 1):
-                    col_letter = ws.cell(row=1, column=col_idx).column_letter
-                    ws.column_dimensions[col_letter].width = column_widths.get(col_letter, 13.0)
-
-                # Save and close
-                wb.save(output_file)
-                wb.close()
-
-                successful_files += 1
-
-                # Progress update every 50 files
-                if successful_files % 50 == 0:
-                    logger.info(f"🔄 Lightning progress: {successful_files}/{len(unique_customers)} files completed...")
-
-            except Exception as e:
-                logger.error(f"❌ Error for {customer_name}: {e}")
-                failed_files += 1
+        successful_files = sum(1 for _, ok, _ in results if ok)
+        failed_files = len(results) - successful_files
+        for customer_name, ok, message in results:
+            if not ok:
+                logger.error(f"❌ Error for {customer_name}: {message}")
 
         # Performance summary
         end_time = time.time()
@@ -434,81 +483,123 @@ def lightning_fast_formatted_split(daily_file_path, master_file_path):
         return 0, 0, 0
 
 
-def ultra_fast_database_split_with_formatting():
+def _close_split_writer(writer, customer_name, rows_written):
+    """Finishes one streamed customer file. Returns True when the file was written."""
+    try:
+        writer.close()
+        logger.debug(f"✅ {customer_name}: {rows_written} rows")
+        return True
+    except Exception as e:
+        logger.error(f"❌ Error for {customer_name}: {e}")
+        writer.abort()
+        return False
+
+
+def ultra_fast_database_split_with_formatting(start_date=None, end_date=None, output_dir=None,
+                                              batch_size=DB_SPLIT_BATCH_SIZE):
     """
-    Alternative: Ultra-fast database approach with minimal formatting
+    Alternative: Ultra-fast database approach with minimal formatting.
+    Rows are streamed from an unbuffered cursor ordered by Cust, and each customer's file is
+    flushed as soon as Cust changes, so memory stays bounded whatever the date range.
+
+    Args:
+        start_date / end_date: fdate range to split (both default to the run date; set both for backfills)
+        output_dir: Folder for the customer files (defaults to the working directory)
+        batch_size: Rows fetched per round trip
     """
     start_time = time.time()
     logger.info("🚀 Starting ultra-fast database split...")
 
+    start_date = start_date or date(m_year, m_month, m_day)
+    end_date = end_date or start_date
+    output_dir = output_dir or os.getcwd()
+
+    conn = None
     try:
-        today = date.today()
         pool = get_mysql_connection_pool()
         if not pool:
             logger.error("Database connection pool not available.")
             return 0, 0, 0
 
         conn = pool.get_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Single query to get all data
-        query_all_data = "SELECT * FROM dailyfiledto WHERE fdate = %s AND `Cust` IS NOT NULL ORDER BY `Cust`"
-        cursor.execute(query_all_data, (today,))
-        all_data = cursor.fetchall()
-        conn.close()
-
-        if not all_data:
-            logger.warning("No data found for today's date")
-            return 0, 0, 0
-
-        # Convert to DataFrame
-        df_all = pd.DataFrame(all_data)
-
-        # Identify string columns
-        string_columns = []
-        for col in ['InvoiceNum', 'InternalCode', 'ContractNum']:
-            if col in df_all.columns:
-                string_columns.append(col)
-
-        # Group by customer
-        customer_groups = df_all.groupby('Cust')
-
-        logger.info(f"👥 Processing {len(customer_groups)} customers from database...")
+        cursor = conn.cursor(buffered=False)
+
+        # Only the split columns, already in customer order
+        column_list = ', '.join(f"`{col}`" for col in DB_SPLIT_COLUMNS)
+        query_all_data = (f"SELECT {column_list} FROM dailyfiledto "
+                          f"WHERE fdate BETWEEN %s AND %s AND `Cust` IS NOT NULL ORDER BY `Cust`, `fdate`")
+        cursor.execute(query_all_data, (start_date, end_date))
+
+        # One style for every customer file, from the result set's column types
+        date_types = {FieldType.DATE, FieldType.NEWDATE, FieldType.DATETIME, FieldType.TIMESTAMP}
+        date_columns = [col[0] for col in cursor.description if col[1] in date_types]
+        string_columns = [col for col in ('InvoiceNum', 'InternalCode', 'ContractNum') if col in DB_SPLIT_COLUMNS]
+        style = SheetStyle(cursor.column_names, string_columns=string_columns, date_columns=date_columns,
+                           header_bold=True)
+        cust_pos = list(cursor.column_names).index('Cust')
 
         successful_files = 0
         failed_files = 0
+        current_customer = None
+        writer = ws = None
+        next_row = rows_written = 0
+        skip_customer = False
+
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                break
 
-        for customer_name, customer_data in customer_groups:
-            try:
-                safe_filename = "".join(
-                    c for c in str(customer_name) if c.isalnum() or c in (' ', '-', '_', '.')).rstrip()
-                output_file = os.path.join(os.getcwd(), f"{safe_filename}.xlsx")
-
-                # Super fast Excel creation
-                wb = Workbook()
-                ws = wb.active
-
-                # Bulk write
-                for r_idx, row in enumerate(dataframe_to_rows(customer_data, index=False, header=True), 1):
-                    for c_idx, value in enumerate(row, 1):
-                        cell = ws.cell(row=r_idx, column=c_idx, value=value)
-
-                        # String format for specific columns
-                        if r_idx > 1 and c_idx <= len(customer_data.columns):
-                            col_name = customer_data.columns[c_idx - 1]
-                            if col_name in string_columns:
-                                cell.number_format = '@'
-                        elif r_idx == 1:
-                            cell.font = Font(bold=True)
-
-                wb.save(output_file)
-                wb.close()
+            for row in batch:
+                customer_name = row[cust_pos]
+                if customer_name != current_customer:
+                    # Cust changed: flush the finished customer before starting the next one
+                    if writer is not None:
+                        if _close_split_writer(writer, current_customer, rows_written):
+                            successful_files += 1
+                        else:
+                            failed_files += 1
+                    current_customer = customer_name
+                    writer = None
+                    rows_written = 0
+                    skip_customer = False
+                    try:
+                        output_file = os.path.join(output_dir, f"{safe_customer_filename(customer_name)}.xlsx")
+                        writer = XlsxStreamWriter(output_file)
+                        ws, next_row = writer.add_sheet('Sheet1', style)
+                    except Exception as e:
+                        logger.error(f"❌ Error for {customer_name}: {e}")
+                        if writer is not None:
+                            writer.abort()
+                            writer = None
+                        failed_files += 1
+                        skip_customer = True
+
+                if skip_customer:
+                    continue
+                try:
+                    ws.write_row(next_row, 0, row)
+                    next_row += 1
+                    rows_written += 1
+                except Exception as e:
+                    logger.error(f"❌ Error for {customer_name}: {e}")
+                    writer.abort()
+                    writer = None
+                    failed_files += 1
+                    skip_customer = True
+
+        if writer is not None:
+            if _close_split_writer(writer, current_customer, rows_written):
                 successful_files += 1
-
-            except Exception as e:
-                logger.error(f"❌ Error for {customer_name}: {e}")
+            else:
                 failed_files += 1
 
+        cursor.close()
+
+        if successful_files + failed_files == 0:
+            logger.warning(f"No data found for {start_date} - {end_date}")
+            return 0, 0, 0
+
         end_time = time.time()
         total_time = end_time - start_time
 
@@ -521,39 +612,101 @@ def ultra_fast_database_split_with_formatting():
         logger.error(f"💥 Fatal error in database split: {e}")
         return 0, 0, 0
 
+    finally:
+        if conn is not None:
+            try:
+                conn.close()
+            except Error as e:
+                logger.warning(f"Could not return the split connection to the pool: {e}")
+
+
+def build_helper_table(daily_df, lookup):
+    """
+    One Helper row per biller in the daily data: its Cust/Index from the daily rows and its
+    BillerType/TransType from CustomerNamesLookUp, sorted by Index.
+
+    Args:
+        daily_df: Restructured daily data (Cust, Index, اسم المفوتر, ...)
+        lookup: CustomerLookup from load_customer_lookup()
+    """
+    billers = daily_df[['Cust', 'Index', 'اسم المفوتر']].dropna(subset=['اسم المفوتر'])
+    # Spelling variants of one biller map to the same Cust: one row per Cust (per normalized name
+    # while unmapped), keeping the first Index
+    biller_key = billers['Cust'].where(billers['Cust'].notna(), normalize_arabic_series(billers['اسم المفوتر']))
+    helper_df = (billers.assign(_key=biller_key)
+                 .sort_values(by='Index', kind='stable')
+                 .drop_duplicates(subset=['_key'])
+                 .drop(columns='_key')
+                 .reset_index(drop=True))
+    types = lookup.map_names(helper_df['اسم المفوتر'])
+    helper_df['BillerType'] = types['BillerType']
+    helper_df['TransType'] = types['TransType']
+
+    final_helper_df = pd.DataFrame()
+    final_helper_df['CustomerName'] = helper_df['Cust']
+    final_helper_df['Index'] = helper_df['Index']
+    final_helper_df['ArabicName'] = helper_df['اسم المفوتر']
+    final_helper_df['HyperLink'] = ''
+    final_helper_df['TransType'] = helper_df['TransType']
+    final_helper_df['BillerType'] = helper_df['BillerType']
+
+    return final_helper_df.sort_values(by='Index').reset_index(drop=True)
+
+
+def report_unmapped_billers(daily_df, lookup):
+    """
+    Logs every biller with no CustomerNamesLookUp entry together with the closest master names,
+    so a new biller can be added without searching the lookup file by hand.
+
+    Returns:
+        {unmapped name: [(score, master Arabic name, Cust, Index), ...]}
+    """
+    unmapped = lookup.unmapped(daily_df['اسم المفوتر'])
+    if not unmapped:
+        logger.info("✅ Every biller is mapped in CustomerNamesLookUp")
+        return {}
+
+    suggestions = lookup.suggest(unmapped)
+    logger.warning(f"⚠️ {len(unmapped)} biller(s) not found in CustomerNamesLookUp:")
+    for name in unmapped:
+        candidates = suggestions.get(name) or []
+        if candidates:
+            listed = "; ".join(f"{arabic} → {cust} (#{index}, {score:.2f})" for score, arabic, cust, index in candidates)
+            logger.warning(f"   • {name}: did you mean {listed}")
+        else:
+            logger.warning(f"   • {name}: no similar names")
+    return suggestions
+
+
+def report_duplicate_rows(ingest):
+    """Logs rows of the day that repeat another row exactly (same RowHash). Returns their count."""
+    data_rows = ingest.df['اسم المفوتر'].notna()
+    hashes = ingest.row_hashes[data_rows]
+    repeated = hashes.duplicated(keep='first')
+    if not repeated.any():
+        logger.info("✅ No duplicate rows in the daily file")
+        return 0
 
-def add_helper_sheet_fast(daily_file_path, master_file_path):
-    """Fast version of adding Helper sheet"""
+    repeated_rows = ingest.df.loc[repeated[repeated].index]
+    logger.warning(f"⚠️ {int(repeated.sum())} row(s) repeat another row of the day exactly:")
+    for (customer_name, biller), group in repeated_rows.groupby(['Cust', 'اسم المفوتر'], dropna=False):
+        logger.warning(f"   • {customer_name} / {biller}: {len(group)}")
+    return int(repeated.sum())
+
+
+def add_helper_sheet_fast(daily_file_path, master_file_path, ingest=None):
+    """
+    Adds the Helper sheet through Excel. Only needed after modify_excel_file_final;
+    restructure_daily_file_headless writes the Helper sheet in the same save.
+    """
     try:
         logger.info("📋 Adding Helper sheet...")
 
-        full_data = pd.read_excel(daily_file_path)
-        master_df = pd.read_excel(master_file_path, usecols=['Arabic', 'Name', 'Index', 'Type', 'Transf Type'])
-        master_df.rename(columns={
-            'Arabic': 'اسم المفوتر',
-            'Name': 'Cust',
-            'Index': 'Index',
-            'Type': 'BillerType',
-            'Transf Type': 'TransType'
-        }, inplace=True)
-
-        helper_df = pd.merge(
-            full_data.drop_duplicates(subset=['اسم المفوتر']),
-            master_df,
-            on=['اسم المفوتر'],
-            how='left',
-            suffixes=('', '_master')
-        )
-
-        final_helper_df = pd.DataFrame()
-        final_helper_df['CustomerName'] = helper_df['Cust']
-        final_helper_df['Index'] = helper_df['Index']
-        final_helper_df['ArabicName'] = helper_df['اسم المفوتر']
-        final_helper_df['HyperLink'] = ''
-        final_helper_df['TransType'] = helper_df['TransType']
-        final_helper_df['BillerType'] = helper_df['BillerType']
-
-        final_helper_df.sort_values(by='Index', inplace=True)
+        if ingest is None:
+            ingest = load_daily_ingest(daily_file_path, detect_leading_zeros_pattern)
+        final_helper_df = ingest.helper_df
+        if final_helper_df is None:
+            final_helper_df = build_helper_table(ingest.df, load_customer_lookup(master_file_path))
 
         # Add to Excel using xlwings
         app = None
@@ -569,12 +722,12 @@ def add_helper_sheet_fast(daily_file_path, master_file_path):
 
         helper_sheet = None
         for sheet in daily_wb.sheets:
-            if sheet.name == 'Helper':
+            if sheet.name == HELPER_SHEET_NAME:
                 helper_sheet = sheet
                 break
 
         if helper_sheet is None:
-            helper_sheet = daily_wb.sheets.add(name='Helper')
+            helper_sheet = daily_wb.sheets.add(name=HELPER_SHEET_NAME)
         else:
             helper_sheet.clear()
 
@@ -598,35 +751,39 @@ if __name__ == "__main__":
     try:
         overall_start = time.time()
 
-        # Step 1: Modify the Excel file
+        # Step 1: Modify the Excel file and write the Helper sheet (headless, no Excel needed)
         logger.info("🔧 Step 1: Modifying Excel file structure...")
         modify_start = time.time()
-        modify_excel_file_final(daily_file, master_file)
+        ingest = restructure_daily_file_headless(daily_file, master_file)
         modify_time = time.time() - modify_start
+        if ingest is None:
+            raise Exception("Daily file has no data rows")
         logger.info(f"✅ File modification completed in {modify_time:.2f} seconds")
 
+        # Alternative: Excel-driven restructure, then parse the modified file once and add the Helper sheet
+        # modify_excel_file_final(daily_file, master_file)
+        # ingest = load_daily_ingest(daily_file, detect_leading_zeros_pattern)
+        # add_helper_sheet_fast(daily_file, master_file, ingest)
+
         # Step 2: Choose LIGHTNING FAST method
         logger.info("⚡ Step 2: Lightning fast file splitting...")
 
         # METHOD 1: Lightning fast with formatting + string preservation (RECOMMENDED)
-        success, failed, split_time = lightning_fast_formatted_split(daily_file, master_file)
+        success, failed, split_time = lightning_fast_formatted_split(daily_file, master_file, ingest)
 
         # METHOD 2: Ultra-fast database method (Alternative - even faster but requires database)
         # success, failed, split_time = ultra_fast_database_split_with_formatting()
 
-        # Step 3: Add Helper sheet
-        logger.info("📋 Step 3: Adding Helper sheet...")
-        helper_start = time.time()
-        add_helper_sheet_fast(daily_file, master_file)
-        helper_time = time.time() - helper_start
+        # Step 3: Suggest lookup entries for unmapped billers and flag repeated rows
+        report_unmapped_billers(ingest.df, load_customer_lookup(master_file))
+        report_duplicate_rows(ingest)
 
         # Final summary
         total_time = time.time() - overall_start
         logger.info(f"\n⚡ LIGHTNING FAST PROCESSING COMPLETED!")
         logger.info(f"📊 Summary:")
-        logger.info(f"   • File modification: {modify_time:.2f}s")
+        logger.info(f"   • File modification + Helper sheet: {modify_time:.2f}s")
         logger.info(f"   • Lightning file splitting: {split_time:.2f}s ({success} files)")
-        logger.info(f"   • Helper sheet: {helper_time:.2f}s")
         logger.info(f"   • TOTAL TIME: {total_time:.2f}s")
         logger.info(f"⚡ Average per customer file: {split_time / max(success, 1):.3f}s")
         logger.info(f"🔤 String formatting preserved for columns D, M, T!")
@@ -642,4 +799,5 @@ if __name__ == "__main__":
 
     except Exception as e:
         logger.error(f"💥 Fatal error: {e}")
-        logger.error(traceback.format_exc())
\ No newline at end of file
+        logger.error(traceback.format_exc())
+        sys.exit(1)  # lets the pipeline watcher stop the chain here
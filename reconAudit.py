@@ -0,0 +1,399 @@
+import os
+import re
+import time
+import zipfile
+import logging
+import posixpath
+import traceback
+import xml.etree.ElementTree as ET
+from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+import mysql.connector
+
+import config
+from xlsxStreamReader import read_sheet
+
+m_day = config.config.curr_day
+m_month = config.config.curr_month
+m_year = config.config.curr_year
+date = datetime(m_year, m_month, m_day)
+trans_date = date.strftime("%Y/%m/%d")
+
+path_year = date.strftime("%Y")
+path_month_full = date.strftime("%B")
+path_month_abbr = date.strftime("%b")
+path_day = date.strftime("%d")
+
+INVOICE_BASE = config.config.invoice_base
+BILLER_REPORT_BASE = config.config.biller_base
+DAILY_FILE_BASE = config.config.dailyfile_base
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+mysql_config = {
+    "host": "localhost",
+    "user": "root",
+    "password": "root",
+    "database": "azm"
+}
+
+# Same column layouts OpenRecon writes after the serial-number column of each ListObject
+SINGLE_BILLER_COLUMNS = ['InvoiceNum', 'InvAmount', 'AmountPaid', 'PayDate', 'OpFee', 'PostPaidShare',
+                         'InternalCode']
+MULTI_BILLER_COLUMNS = ['InvoiceNum', 'InvAmount', 'AmountPaid', 'PayDate', 'OpFee', 'PostPaidShare',
+                        'SubBillerShare', 'SubBillerName', 'InternalCode']
+SINGLE_BILLER_TYPES = ['Single Biller', 'Single Biller with Adv Wallet']
+
+AMOUNT_COLUMNS = ['InvAmount', 'AmountPaid', 'OpFee', 'PostPaidShare', 'SubBillerShare']
+
+# Same banking tolerance compareDBTab uses for totals
+AMOUNT_TOLERANCE = 0.005
+
+REPORT_FILE_PATH_TEMPLATE = os.path.join(INVOICE_BASE, f"Recon Audit Report {path_day}-{path_month_abbr}_{{timestamp}}.xlsx")
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+CELL_REF_REGEX = re.compile(r'^([A-Z]+)(\d+)$')
+
+
+# --------------------------------------------------------------------------------------
+# --- Table XML reading (no Excel, no openpyxl object model) ---
+# --------------------------------------------------------------------------------------
+
+def split_cell_ref(ref):
+    """Converts 'C12' into (row=12, col=3), both 1-indexed."""
+    match = CELL_REF_REGEX.match(ref)
+    if not match:
+        raise ValueError(f"Invalid cell reference: {ref}")
+    letters, row = match.groups()
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - 64)
+    return int(row), col
+
+
+def resolve_part_path(base_part, target):
+    """Resolves a relationship target relative to the part that owns the .rels file."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base_part), target))
+
+
+def read_relationships(zf, part_path):
+    """Returns {rId: target part path} for the given part, or {} if it has no .rels."""
+    rels_path = posixpath.join(posixpath.dirname(part_path), '_rels', posixpath.basename(part_path) + '.rels')
+    if rels_path not in zf.namelist():
+        return {}
+    root = ET.fromstring(zf.read(rels_path))
+    return {
+        rel.get('Id'): resolve_part_path(part_path, rel.get('Target'))
+        for rel in root.iter(f"{NS_PKG_REL}Relationship")
+    }
+
+
+def find_sheet_part(zf, sheet_name):
+    """Returns the worksheet part path for a sheet name, or None if the sheet does not exist."""
+    workbook_part = 'xl/workbook.xml'
+    rels = read_relationships(zf, workbook_part)
+    root = ET.fromstring(zf.read(workbook_part))
+    for sheet in root.iter(f"{NS_MAIN}sheet"):
+        if sheet.get('name') == sheet_name:
+            return rels.get(sheet.get(f"{NS_REL}id"))
+    return None
+
+
+def find_first_table(zf, sheet_part):
+    """
+    Reads the first table part of a worksheet (same order as ListObjects(1)).
+
+    Returns:
+        dict with name, ref, header_rows and totals_rows, or None if the sheet has no table.
+    """
+    rels = read_relationships(zf, sheet_part)
+    for _, elem in ET.iterparse(zf.open(sheet_part), events=('end',)):
+        if elem.tag == f"{NS_MAIN}tablePart":
+            table_part = rels.get(elem.get(f"{NS_REL}id"))
+            table = ET.fromstring(zf.read(table_part))
+            return {
+                'name': table.get('displayName') or table.get('name'),
+                'ref': table.get('ref'),
+                'header_rows': int(table.get('headerRowCount', '1')),
+                'totals_rows': int(table.get('totalsRowCount', '0')),
+            }
+        elif elem.tag == f"{NS_MAIN}sheetData":
+            elem.clear()  # Free cell data early, table parts come after it
+    return None
+
+
+def read_table_body(zf, sheet_part, table, value_columns):
+    """
+    Streams the worksheet XML and collects the raw cell values of the table's data body.
+
+    Args:
+        zf: Open ZipFile of the workbook
+        sheet_part: Worksheet part path
+        table: dict returned by find_first_table
+        value_columns: 1-indexed offsets inside the table to collect
+
+    Returns:
+        {offset: {row_number: (cell_type, raw_value)}}
+    """
+    first_ref, last_ref = table['ref'].split(':')
+    first_row, first_col = split_cell_ref(first_ref)
+    last_row, _ = split_cell_ref(last_ref)
+
+    body_start = first_row + table['header_rows']
+    body_end = last_row - table['totals_rows']
+    wanted_cols = {first_col + offset - 1: offset for offset in value_columns}
+
+    values = {offset: {} for offset in value_columns}
+    if body_end < body_start:
+        return values
+
+    for _, elem in ET.iterparse(zf.open(sheet_part), events=('end',)):
+        if elem.tag != f"{NS_MAIN}row":
+            continue
+        row_num = int(elem.get('r'))
+        if row_num > body_end:
+            break
+        if row_num >= body_start:
+            for cell in elem.iter(f"{NS_MAIN}c"):
+                _, col = split_cell_ref(cell.get('r'))
+                if col not in wanted_cols:
+                    continue
+                cell_type = cell.get('t', 'n')
+                if cell_type == 'inlineStr':
+                    text = ''.join(t.text or '' for t in cell.iter(f"{NS_MAIN}t"))
+                else:
+                    v = cell.find(f"{NS_MAIN}v")
+                    text = v.text if v is not None else None
+                if text not in (None, ''):
+                    values[wanted_cols[col]][row_num] = (cell_type, text)
+        elem.clear()
+
+    return values
+
+
+def summarize_table(workbook_path, sheet_name, columns):
+    """
+    Recomputes the row count and amount totals of the first ListObject on a sheet.
+
+    Returns:
+        (summary dict or None, issue message or None)
+    """
+    if not os.path.exists(workbook_path):
+        return None, "Workbook not found"
+
+    try:
+        with zipfile.ZipFile(workbook_path) as zf:
+            sheet_part = find_sheet_part(zf, sheet_name)
+            if sheet_part is None:
+                return None, f"Sheet '{sheet_name}' not found"
+
+            table = find_first_table(zf, sheet_part)
+            if table is None:
+                return None, f"No table on sheet '{sheet_name}'"
+
+            # Offset 1 is the serial number column, data starts at offset 2
+            offsets = {col: idx + 2 for idx, col in enumerate(columns)}
+            body = read_table_body(zf, sheet_part, table, list(offsets.values()))
+    except zipfile.BadZipFile:
+        return None, "Not a valid xlsx file"
+
+    rows_with_data = set()
+    for cells in body.values():
+        rows_with_data.update(row for row, (_, raw) in cells.items() if raw != '#N/A')
+
+    summary = {'Rows': len(rows_with_data), 'Table': table['name']}
+    for col in AMOUNT_COLUMNS:
+        if col not in offsets:
+            continue
+        total = 0.0
+        for cell_type, raw in body[offsets[col]].values():
+            if cell_type == 'n':
+                total += float(raw)
+        summary[col] = total
+
+    return summary, None
+
+
+# --------------------------------------------------------------------------------------
+# --- Per-customer audit (runs in worker processes) ---
+# --------------------------------------------------------------------------------------
+
+def audit_customer(customer_name, biller_type, db_totals):
+    """
+    Audits the recon sheet and biller report of one customer against its dailyfiledto totals.
+
+    Returns:
+        list of exception dicts (empty when everything matches)
+    """
+    columns = SINGLE_BILLER_COLUMNS if biller_type in SINGLE_BILLER_TYPES else MULTI_BILLER_COLUMNS
+
+    recon_path = os.path.join(
+        INVOICE_BASE, customer_name, path_year, path_month_abbr,
+        f"{customer_name} - {path_month_full} Internal Reconciliation Summary.xlsx")
+    report_path = os.path.join(
+        BILLER_REPORT_BASE, customer_name, path_year, path_month_abbr,
+        f"{customer_name} Report {path_day}-{path_month_full}.xlsx")
+
+    targets = [
+        ('Recon', recon_path, f"{path_day}-{path_month_abbr}"),
+        ('BillerReport', report_path, f"{customer_name} Report"),
+    ]
+
+    exceptions = []
+    for workbook_kind, workbook_path, sheet_name in targets:
+        base = {'Customer': customer_name, 'BillerType': biller_type,
+                'Workbook': workbook_kind, 'File': workbook_path}
+        try:
+            summary, issue = summarize_table(workbook_path, sheet_name, columns)
+        except Exception as e:
+            summary, issue = None, f"Could not read workbook: {e}"
+
+        if issue:
+            # Customers with no rows today legitimately have no output
+            if db_totals['Rows'] > 0 or issue != "Workbook not found":
+                exceptions.append({**base, 'Check': 'Structure', 'Expected': '', 'Found': '', 'Detail': issue})
+            continue
+
+        if summary['Rows'] != db_totals['Rows']:
+            exceptions.append({**base, 'Check': 'Rows', 'Expected': db_totals['Rows'],
+                               'Found': summary['Rows'], 'Detail': f"Table {summary['Table']}"})
+
+        for col in AMOUNT_COLUMNS:
+            if col not in summary:
+                continue
+            expected = db_totals.get(col, 0.0)
+            found = summary[col]
+            if not np.isclose(expected, found, atol=AMOUNT_TOLERANCE):
+                exceptions.append({**base, 'Check': col, 'Expected': round(expected, 2),
+                                   'Found': round(found, 2), 'Detail': f"Difference {found - expected:.2f}"})
+
+    return exceptions
+
+
+# --------------------------------------------------------------------------------------
+# --- Inputs ---
+# --------------------------------------------------------------------------------------
+
+def fetch_daily_totals(fdate):
+    """Fetches row count and amount totals per customer from dailyfiledto for one day."""
+    sum_cols = ', '.join(f"COALESCE(SUM(`{col}`), 0)" for col in AMOUNT_COLUMNS)
+    query = f"""
+        SELECT Cust, COUNT(*), {sum_cols}
+        FROM dailyfiledto
+        WHERE fdate = %s AND Cust IS NOT NULL
+        GROUP BY Cust
+    """
+    conn = mysql.connector.connect(**mysql_config)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query, (fdate,))
+        totals = {}
+        for row in cursor.fetchall():
+            totals[row[0]] = {'Rows': int(row[1]),
+                              **{col: float(val) for col, val in zip(AMOUNT_COLUMNS, row[2:])}}
+        cursor.close()
+        return totals
+    finally:
+        conn.close()
+
+
+def load_customer_list(customers_file):
+    """Reads CustomerName/BillerType from the Helper sheet of the daily file."""
+    df = read_sheet(customers_file, sheet_name='Helper', usecols=['CustomerName', 'BillerType'])
+    return df.dropna(subset=['CustomerName'])
+
+
+# --------------------------------------------------------------------------------------
+# --- Main audit ---
+# --------------------------------------------------------------------------------------
+
+def audit_recon_outputs(customers_file, max_workers=None, report_path_template=REPORT_FILE_PATH_TEMPLATE):
+    """
+    Audits every recon sheet and biller report written for the day in parallel
+    and writes a single exceptions report.
+
+    Returns:
+        (exceptions DataFrame, report path or None)
+    """
+    start_time = time.time()
+
+    customers_df = load_customer_list(customers_file)
+    logger.info(f"Auditing {len(customers_df)} customers for {trans_date}")
+
+    db_totals = fetch_daily_totals(trans_date)
+    empty_totals = {'Rows': 0, **{col: 0.0 for col in AMOUNT_COLUMNS}}
+
+    exceptions = []
+    audited = set()
+    with ProcessPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        future_to_customer = {}
+        for row in customers_df.itertuples(index=False):
+            customer_name = str(row.CustomerName)
+            audited.add(customer_name)
+            future = executor.submit(audit_customer, customer_name, row.BillerType,
+                                     db_totals.get(customer_name, empty_totals))
+            future_to_customer[future] = customer_name
+
+        for future in as_completed(future_to_customer):
+            customer_name = future_to_customer[future]
+            try:
+                exceptions.extend(future.result())
+            except Exception as exc:
+                exceptions.append({'Customer': customer_name, 'Check': 'Audit', 'Detail': str(exc)})
+
+    # Customers with rows in dailyfiledto but missing from the Helper list never got a recon
+    for customer_name, totals in db_totals.items():
+        if customer_name not in audited:
+            exceptions.append({'Customer': customer_name, 'Workbook': 'Helper', 'Check': 'Customer',
+                               'Expected': totals['Rows'], 'Found': 0,
+                               'Detail': 'Customer has rows but is not in Helper sheet'})
+
+    report_columns = ['Customer', 'BillerType', 'Workbook', 'Check', 'Expected', 'Found', 'Detail', 'File']
+    exceptions_df = pd.DataFrame(exceptions, columns=report_columns)
+    exceptions_df.sort_values(by=['Customer', 'Workbook', 'Check'], inplace=True, kind='stable')
+
+    total_time = time.time() - start_time
+    logger.info(f"Audit finished in {total_time:.2f} seconds: {len(exceptions_df)} exceptions")
+
+    output_path = None
+    if report_path_template:
+        output_path = report_path_template.format(timestamp=datetime.now().strftime('%Y%m%d_%H%M%S'))
+        try:
+            os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+            with pd.ExcelWriter(output_path, engine='openpyxl') as writer:
+                summary_df = pd.DataFrame({
+                    'Description': ['Audit Status', 'Recon Date', 'Customers Audited',
+                                    'Customers With Exceptions', 'Total Exceptions', 'Audit Time (s)'],
+                    'Count': ['Success' if exceptions_df.empty else 'Exceptions Found', trans_date,
+                              len(audited), exceptions_df['Customer'].nunique(), len(exceptions_df),
+                              round(total_time, 2)]
+                })
+                summary_df.to_excel(writer, sheet_name='Summary', index=False)
+                exceptions_df.to_excel(writer, sheet_name='Exceptions', index=False)
+            logger.info(f"Exceptions report saved to: {output_path}")
+        except Exception as e:
+            logger.error(f"Error writing exceptions report: {e}")
+            output_path = None
+
+    return exceptions_df, output_path
+
+
+if __name__ == "__main__":
+    file_name = config.config.dailyfile_name
+    customers_file = os.path.join(DAILY_FILE_BASE, path_year, path_month_abbr, path_day, file_name)
+
+    try:
+        audit_recon_outputs(customers_file)
+    except Exception as e:
+        logger.error(f"Fatal error during audit: {e}")
+        logger.error(traceback.format_exc())
@@ -0,0 +1,214 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Fixed 16-byte key so the same row hashes to the same RowHash on every machine and every run
+FINGERPRINT_KEY = 'AzmReconRowHash1'
+
+# Fields that identify a transaction, by dailyfiledto name. Cust/Index (from the lookup) and
+# fdate (the import day) are left out so a re-import of the same row on another day matches.
+TEXT_FIELDS = ['BillerName', 'InvoiceNum', 'SubBillerName', 'InternalCode', 'ContractNum']
+ID_FIELDS = ['InvoiceNum', 'InternalCode', 'ContractNum']
+DATE_FIELDS = ['PayDate']
+AMOUNT_FIELDS = ['InvAmount', 'AmountPaid', 'OpFee', 'PostPaidShare', 'SubBillerShare']
+FINGERPRINT_FIELDS = TEXT_FIELDS + DATE_FIELDS + AMOUNT_FIELDS
+
+# Daily file (Excel) headers of the same fields
+EXCEL_FIELD_NAMES = {
+    'اسم المفوتر': 'BillerName',
+    'رقم الفاتورة/الدفعة': 'InvoiceNum',
+    'المفوتر الفرعي': 'SubBillerName',
+    'الكود الداخلي': 'InternalCode',
+    'رقم العقد': 'ContractNum',
+    'تاريخ الدفع': 'PayDate',
+    'قيمة الفاتورة': 'InvAmount',
+    'المبلغ المدفوع': 'AmountPaid',
+    'رسوم العمليات': 'OpFee',
+    'حصة المفوتر': 'PostPaidShare',
+    'حصة المفوتر الفرعي': 'SubBillerShare',
+}
+
+
+def _text_key(series, is_id=False):
+    """Text form used for hashing: '' for blanks, trimmed, single spaces, case-folded."""
+    text = series.astype(object).where(series.notna(), '').astype(str)
+    text = text.str.strip().str.replace(r'\s+', ' ', regex=True).str.casefold()
+    if is_id:
+        text = text.str.replace(r'^(\d+)\.0+$', r'\1', regex=True)
+    return text
+
+
+def normalize_id_series(series):
+    """Matching key of identifier values (InvoiceNum, ContractNum, InternalCode), as hashed in RowHash."""
+    return _text_key(series, is_id=True)
+
+
+def _date_key(series):
+    """Dates as 'YYYY-MM-DD HH:MM' whether they arrive as text or as datetimes; other text as is."""
+    parsed = pd.to_datetime(series, errors='coerce', format='mixed')
+    text = _text_key(series)
+    return text.where(parsed.isna(), parsed.dt.strftime('%Y-%m-%d %H:%M'))
+
+
+def _amount_key(series):
+    """Amounts rounded to cents, blanks as 0."""
+    if series.dtype == object:
+        series = series.astype(str).str.replace(',', '', regex=False)
+    return pd.to_numeric(series, errors='coerce').fillna(0.0).round(2).astype(np.float64)
+
+
+def fingerprint_frame(df):
+    """
+    The normalized key fields of a frame (dailyfiledto or daily-file headers) ready for hashing.
+    Missing fields hash as blank/zero so both layouts agree.
+    """
+    renamed = df.rename(columns=EXCEL_FIELD_NAMES)
+    keys = pd.DataFrame(index=df.index)
+    for field in FINGERPRINT_FIELDS:
+        column = renamed[field] if field in renamed.columns else pd.Series(np.nan, index=df.index, dtype=object)
+        if field in AMOUNT_FIELDS:
+            keys[field] = _amount_key(column)
+        elif field in DATE_FIELDS:
+            keys[field] = _date_key(column)
+        else:
+            keys[field] = _text_key(column, is_id=field in ID_FIELDS)
+    return keys
+
+
+def row_fingerprints(df):
+    """Returns the RowHash (uint64) of every row, computed for the whole frame at once."""
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=np.uint64, name='RowHash')
+    hashes = pd.util.hash_pandas_object(fingerprint_frame(df), index=False, hash_key=FINGERPRINT_KEY)
+    return hashes.rename('RowHash')
+
+
+def signed_hashes(hashes):
+    """RowHash values as signed 64-bit ints, for stores without unsigned 64-bit integers (SQLite)."""
+    return pd.Series(hashes).astype(np.uint64).to_numpy().view(np.int64)
+
+
+def unsigned_hashes(values):
+    """Inverse of signed_hashes()."""
+    return np.asarray(values, dtype=np.int64).view(np.uint64)
+
+
+def signed_checksum(value):
+    """BIT_XOR(RowHash) of a day as a signed 64-bit int (MySQL returns it unsigned, SQLite signed)."""
+    value = int(value or 0)
+    return value - (1 << 64) if value >= (1 << 63) else value
+
+
+def fetch_known_hashes(conn, table, hashes, placeholder='%s', batch_size=1000, hash_column='RowHash', signed=False):
+    """
+    Returns the subset of hashes already stored in table, with batched IN (...) lookups on the
+    RowHash index. Works with any DB-API connection (placeholder '%s' for MySQL, '?' for SQLite;
+    signed=True when the table stores signed_hashes()).
+    """
+    cursor = conn.cursor()
+    unique_hashes = pd.unique(pd.Series(hashes).astype(np.uint64))
+    lookup_values = [int(h) for h in (signed_hashes(unique_hashes) if signed else unique_hashes)]
+    known = set()
+    for start in range(0, len(lookup_values), batch_size):
+        batch = lookup_values[start:start + batch_size]
+        placeholders = ', '.join([placeholder] * len(batch))
+        cursor.execute(f"SELECT DISTINCT {hash_column} FROM {table} WHERE {hash_column} IN ({placeholders})", batch)
+        found = [row[0] for row in cursor.fetchall()]
+        known.update(int(h) for h in (unsigned_hashes(found) if signed else found))
+    cursor.close()
+    return known
+
+
+def ensure_hash_column(conn, table, hash_column='RowHash'):
+    """
+    MySQL migration: gives a table created before RowHash existed the column and its index.
+    Returns True when the column was added.
+    """
+    cursor = conn.cursor()
+    cursor.execute(
+        "SELECT COUNT(*) FROM information_schema.COLUMNS "
+        "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND COLUMN_NAME = %s",
+        (table, hash_column))
+    added = cursor.fetchone()[0] == 0
+    if added:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {hash_column} BIGINT UNSIGNED, "
+                       f"ADD KEY idx_rowhash ({hash_column})")
+        conn.commit()
+        logger.info(f"Added {hash_column} column to '{table}'")
+    cursor.close()
+    return added
+
+
+def backfill_hashes(conn, table, connect_reader, hash_column='RowHash', fetch_size=20000):
+    """
+    MySQL migration: gives rows imported before RowHash existed their RowHash, once. The rows are
+    read on a second connection (connect_reader()) and hashed in batches, the distinct
+    (fields, RowHash) pairs go into a temporary table, and a single UPDATE ... JOIN writes them
+    back: one pass over the table instead of one scan per row.
+
+    Returns:
+        Number of rows updated
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE {hash_column} IS NULL")
+    missing = cursor.fetchone()[0]
+    if not missing:
+        cursor.close()
+        return 0
+
+    logger.info(f"Backfilling {hash_column} for {missing} older rows of '{table}'...")
+    fields_str = ', '.join(f'`{field}`' for field in FINGERPRINT_FIELDS)
+    cursor.execute(f"CREATE TEMPORARY TABLE rowhash_backfill SELECT {fields_str}, {hash_column} FROM {table} LIMIT 0")
+    cursor.execute("ALTER TABLE rowhash_backfill ADD KEY idx_backfill (InvoiceNum(64), InvAmount)")
+    insert_query = (f"INSERT INTO rowhash_backfill ({fields_str}, {hash_column}) "
+                    f"VALUES ({', '.join(['%s'] * (len(FINGERPRINT_FIELDS) + 1))})")
+
+    reader = connect_reader()
+    try:
+        read_cursor = reader.cursor()
+        read_cursor.execute(f"SELECT {fields_str} FROM {table} WHERE {hash_column} IS NULL")
+        while True:
+            rows = read_cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            df = pd.DataFrame.from_records([tuple(row) for row in rows], columns=FINGERPRINT_FIELDS).drop_duplicates()
+            hashes = row_fingerprints(df)
+            values = df.astype(object).where(df.notna(), None)
+            cursor.executemany(insert_query, [tuple(row) + (int(row_hash),) for row, row_hash
+                                              in zip(values.itertuples(index=False, name=None), hashes)])
+        read_cursor.close()
+    finally:
+        reader.close()
+
+    # Identical rows share a hash, so matching every fingerprint field is enough to target them
+    conditions = ' AND '.join(f"d.`{field}` <=> b.`{field}`" for field in FINGERPRINT_FIELDS)
+    cursor.execute(f"UPDATE {table} d JOIN rowhash_backfill b ON {conditions} "
+                   f"SET d.{hash_column} = b.{hash_column} WHERE d.{hash_column} IS NULL")
+    updated = cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE rowhash_backfill")
+    conn.commit()
+    cursor.close()
+    logger.info(f"Backfilled {hash_column} for {updated} rows of '{table}'")
+    return updated
+
+
+def flag_duplicates(hashes, known_hashes=()):
+    """
+    Hash-set duplicate check.
+
+    Args:
+        hashes: RowHash series of the rows being imported
+        known_hashes: RowHash values already stored (earlier imports)
+
+    Returns:
+        (repeated within these rows mask, already imported mask) - the first occurrence
+        within the rows is not flagged as repeated
+    """
+    within = hashes.duplicated(keep='first')
+    already = hashes.isin(np.fromiter((int(h) for h in known_hashes), dtype=np.uint64))
+    return within, already
@@ -0,0 +1,110 @@
+import asyncio
+import queue
+import threading
+import logging
+
+import aiomysql
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+STREAM_FETCH_SIZE = 2000  # Rows per fetchmany() from the unbuffered cursor
+STREAM_QUEUE_CHUNKS = 32  # Chunks waiting for the writer; producers block when it is full
+STREAM_PUT_POLL = 0.5  # Seconds a blocked producer waits before checking whether the writer stopped
+
+
+class RowStreamWriter(threading.Thread):
+    """
+    Single consumer of a bounded chunk queue: async producers put() row chunks as they arrive from
+    MySQL and this thread writes them to the sink, so loading overlaps querying and at most
+    max_chunks chunks are held in memory. The sink (e.g. sqliteStaging.StagingWriter) is opened,
+    written and closed on this thread.
+    """
+
+    def __init__(self, sink, max_chunks: int = STREAM_QUEUE_CHUNKS):
+        super().__init__(name="RowStreamWriter", daemon=True)
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=max_chunks)
+        self.rows_written = 0
+        self.error = None
+        self.stopped = threading.Event()  # set once the writer has taken the end-of-stream marker
+
+    def run(self):
+        try:
+            self.sink.open()
+        except Exception as e:
+            self.error = e
+            logger.error(f"Row stream writer could not open its sink: {e}")
+
+        while True:
+            item = self.queue.get()
+            if item is None:
+                self.stopped.set()
+                break
+            if self.error is not None:
+                continue  # keep draining so producers never block on a dead writer
+            rows, first_rowid = item
+            try:
+                self.sink.write(rows, first_rowid)
+                self.rows_written += len(rows)
+            except Exception as e:
+                self.error = e
+                logger.error(f"Row stream writer failed after {self.rows_written} rows: {e}")
+
+        try:
+            self.sink.close(success=self.error is None)
+        except Exception as e:
+            self.error = self.error or e
+            logger.error(f"Row stream writer could not close its sink: {e}")
+
+    async def put(self, rows, first_rowid=None):
+        """
+        Hands a chunk to the writer from the event loop; waits (off the loop) while the queue is full.
+        Chunks put after the writer stopped are dropped, so a producer outliving finish() (e.g. a
+        cancelled query whose put thread is still waiting) never blocks forever.
+        """
+        if self.stopped.is_set():
+            return
+        try:
+            self.queue.put_nowait((rows, first_rowid))
+        except queue.Full:
+            await asyncio.to_thread(self._put_blocking, (rows, first_rowid))
+
+    def _put_blocking(self, item):
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=STREAM_PUT_POLL)
+                return
+            except queue.Full:
+                continue
+
+    def finish(self):
+        """Signals the end of the stream, waits for the writer and re-raises its error, if any."""
+        self.queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.rows_written
+
+
+async def stream_query(pool, query: str, params, writer: RowStreamWriter,
+                       fetch_size: int = STREAM_FETCH_SIZE) -> int:
+    """
+    Runs query on an unbuffered (server-side) cursor and passes the rows to writer in chunks of
+    fetch_size. Returns the number of rows streamed.
+    """
+    streamed = 0
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(fetch_size)
+                if not rows:
+                    break
+                await writer.put(rows)
+                streamed += len(rows)
+    return streamed
@@ -0,0 +1,166 @@
+import asyncio
+import math
+import time
+import logging
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+TILE_TARGET_ROWS = 50000  # Estimated rows per tile query
+TILE_MAX_NAMES = 1000  # Names per IN (...) list
+ESTIMATE_BATCH_NAMES = 1000  # Names per COUNT(*) estimate query
+
+# lo <= fdate < hi, or lo <= fdate <= hi when hi_inclusive (the BETWEEN end of the search range)
+SearchTile = namedtuple('SearchTile', ['index', 'names', 'lo', 'hi', 'hi_inclusive', 'estimate'])
+
+
+def _parse(value):
+    return value if isinstance(value, datetime) else datetime.strptime(str(value)[:10], "%Y-%m-%d")
+
+
+def _fmt(value):
+    return value.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def month_ranges(start_date, end_date):
+    """
+    Calendar-month pieces of [start_date, end_date] (BETWEEN semantics):
+    [(month key YYYYMM, lo, hi, hi_inclusive), ...]
+    """
+    start, end = _parse(start_date), _parse(end_date)
+    ranges = []
+    lo = start
+    while lo <= end:
+        next_month = (lo.replace(day=1) + timedelta(days=32)).replace(day=1)
+        if next_month > end:
+            ranges.append((lo.year * 100 + lo.month, lo, end, True))
+            break
+        ranges.append((lo.year * 100 + lo.month, lo, next_month, False))
+        lo = next_month
+    return ranges
+
+
+def split_range(lo, hi, hi_inclusive, parts):
+    """Splits one month range into `parts` day-aligned sub-ranges (fewer if the month is shorter)."""
+    span_days = max(1, (hi - lo).days + (1 if hi_inclusive else 0))
+    parts = max(1, min(parts, span_days))
+    step = math.ceil(span_days / parts)
+    pieces = []
+    piece_lo = lo
+    while True:
+        piece_hi = piece_lo + timedelta(days=step)
+        if piece_hi >= hi:
+            pieces.append((piece_lo, hi, hi_inclusive))
+            return pieces
+        pieces.append((piece_lo, piece_hi, False))
+        piece_lo = piece_hi
+
+
+def name_key(name):
+    """Biller name as MySQL compares it in Cust IN (...): trimmed and case-insensitive."""
+    return str(name).strip().casefold()
+
+
+async def estimate_counts(pool, names, start_date, end_date, table='DailyFileDTO', key_column='Cust',
+                          batch_names=ESTIMATE_BATCH_NAMES):
+    """
+    Rows per (name, month) in the range, from GROUP BY COUNT(*) queries run concurrently on the pool.
+
+    Returns:
+        {(normalized name, YYYYMM): row count}
+    """
+    async def estimate_batch(batch):
+        placeholders = ",".join(["%s"] * len(batch))
+        query = f"""
+            SELECT {key_column}, YEAR(fdate) * 100 + MONTH(fdate), COUNT(*)
+            FROM {table}
+            WHERE {key_column} IN ({placeholders}) AND fdate BETWEEN %s AND %s
+            GROUP BY {key_column}, YEAR(fdate) * 100 + MONTH(fdate)
+        """
+        async with pool.acquire() as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(query, list(batch) + [start_date, end_date])
+                return await cur.fetchall()
+
+    batches = [names[i:i + batch_names] for i in range(0, len(names), batch_names)]
+    counts = {}
+    for rows in await asyncio.gather(*(estimate_batch(batch) for batch in batches)):
+        for name, month_key, count in rows:
+            key = (name_key(name), int(month_key))
+            counts[key] = counts.get(key, 0) + int(count)
+    return counts
+
+
+def plan_tiles(names, start_date, end_date, counts, target_rows=TILE_TARGET_ROWS, max_names=TILE_MAX_NAMES):
+    """
+    Packs (name batch x month) tiles of about target_rows estimated rows, month by month in name order.
+    A name whose month alone exceeds target_rows gets the month split into day ranges. Names with no
+    estimated rows at all share tiles over the whole range (they are still queried, in case the estimate
+    missed them through collation differences).
+
+    Returns:
+        [SearchTile, ...] in merge order
+    """
+    months = month_ranges(start_date, end_date)
+    known = {name_key for name_key, _ in counts}
+    tiles = []
+
+    def add_tile(tile_names, lo, hi, hi_inclusive, estimate):
+        tiles.append(SearchTile(len(tiles), list(tile_names), _fmt(lo), _fmt(hi), hi_inclusive, estimate))
+
+    for month_key, lo, hi, hi_inclusive in months:
+        batch, batch_rows = [], 0
+        for name in names:
+            rows = counts.get((name_key(name), month_key), 0)
+            if rows == 0:
+                continue
+            if rows > target_rows:
+                parts = math.ceil(rows / target_rows)
+                for piece_lo, piece_hi, piece_inclusive in split_range(lo, hi, hi_inclusive, parts):
+                    add_tile([name], piece_lo, piece_hi, piece_inclusive, rows // parts)
+                continue
+            if batch and (batch_rows + rows > target_rows or len(batch) >= max_names):
+                add_tile(batch, lo, hi, hi_inclusive, batch_rows)
+                batch, batch_rows = [], 0
+            batch.append(name)
+            batch_rows += rows
+        if batch:
+            add_tile(batch, lo, hi, hi_inclusive, batch_rows)
+
+    unestimated = [name for name in names if name_key(name) not in known]
+    if unestimated and months:
+        start, end = _parse(start_date), _parse(end_date)
+        for i in range(0, len(unestimated), max_names):
+            add_tile(unestimated[i:i + max_names], start, end, True, 0)
+
+    return tiles
+
+
+async def plan_search(pool, names, start_date, end_date, target_rows=TILE_TARGET_ROWS, max_names=TILE_MAX_NAMES):
+    """Estimates the row counts and returns the tile plan for a (names, date range) search."""
+    plan_start = time.time()
+    counts = await estimate_counts(pool, names, start_date, end_date)
+    tiles = plan_tiles(names, start_date, end_date, counts, target_rows, max_names)
+    logger.info(f"🧩 Search plan: {len(tiles)} tiles over {len(month_ranges(start_date, end_date))} months, "
+                f"~{sum(counts.values())} rows estimated ({time.time() - plan_start:.2f}s)")
+    return tiles
+
+
+def batch_tiles(names, batch_size):
+    """Plan without a date range: one tile per name batch, as the searches did before tiling."""
+    return [SearchTile(i, names[start:start + batch_size], None, None, False, 0)
+            for i, start in enumerate(range(0, len(names), batch_size))]
+
+
+def tile_filter(tile):
+    """SQL date filter and parameters of a tile ('' when the tile has no date range)."""
+    if tile.lo is None:
+        return "", []
+    upper = "<=" if tile.hi_inclusive else "<"
+    return f" AND fdate >= %s AND fdate {upper} %s", [tile.lo, tile.hi]
@@ -0,0 +1,635 @@
+import asyncio
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+import logging
+from collections import deque
+
+import pandas as pd
+
+import config
+from concurrencyController import AdaptiveLimiter
+from rowFingerprint import normalize_id_series
+from rowStream import stream_query
+from searchPlanner import plan_search, batch_tiles, tile_filter, name_key
+from sqliteMirror import source_day_watermarks, day_bound
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_PATH = os.path.join(config.config.dailyfile_base, "search_cache.sqlite")
+CACHE_MAX_BYTES = 512 * 1024 * 1024  # Pickled result size kept before least recently used keys go
+CACHE_ENTRY_MAX_BYTES = 64 * 1024 * 1024  # Keys whose pickled result grows past this are not cached
+CACHE_CHUNK_ROWS = 5000  # Rows per stored (and streamed) chunk
+SEARCH_QUEUE_CHUNKS = 16  # Chunks waiting for a search's reader; the fetches feeding it wait beyond that
+KEY_BATCH_SIZE = 500  # Names per tile without a date range / RowHash values per invoice query
+KEY_ROWID_SHIFT = 32  # stage_search(): staged rowids per key
+
+KEY_TYPES = ('biller', 'invoice')
+
+SEARCH_COLUMNS = """Cust, `Index`, BillerName, InvoiceNum, InvAmount, AmountPaid,
+                   PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
+                   DedFeeSubPost, InternalCode, Comments, ContractNum, fdate"""
+
+CACHE_SCHEMA = [
+    # One entry per (key type, normalized key, date range); '' stands for "no range"
+    """CREATE TABLE IF NOT EXISTS entries (
+        entry_id INTEGER PRIMARY KEY,
+        key_type TEXT NOT NULL,
+        key TEXT NOT NULL,
+        start_day TEXT NOT NULL,
+        end_day TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        size INTEGER NOT NULL,
+        last_used REAL NOT NULL,
+        UNIQUE (key_type, key, start_day, end_day)
+    )""",
+    """CREATE INDEX IF NOT EXISTS idx_entries_last_used ON entries (last_used)""",
+    """CREATE TABLE IF NOT EXISTS entry_chunks (
+        entry_id INTEGER NOT NULL,
+        seq INTEGER NOT NULL,
+        data BLOB NOT NULL,
+        PRIMARY KEY (entry_id, seq)
+    ) WITHOUT ROWID""",
+    # Watermark: DailyFileDTO row count and BIT_XOR(RowHash) of every day the cached entries were read from
+    """CREATE TABLE IF NOT EXISTS cache_days (fdate TEXT PRIMARY KEY, row_count INTEGER NOT NULL, checksum INTEGER)""",
+]
+
+
+def _day(value):
+    """'YYYY-MM-DD' of a range bound, '' without one."""
+    return day_bound(value)[:10] if value else ""
+
+
+def normalize_keys(key_type, keys):
+    """Normalized, de-duplicated keys in request order (what the cache and the coalescing match on)."""
+    if key_type == 'biller':
+        normalized = [name_key(key) for key in keys if key is not None]
+    else:
+        normalized = normalize_id_series(pd.Series(list(keys), dtype=object)).tolist()
+    return [key for key in dict.fromkeys(normalized) if key]
+
+
+# ---------------- Result cache ----------------
+class SearchCache:
+    """
+    Persisted per-key search results, bounded to max_bytes with least-recently-used eviction and
+    invalidated per fdate: when a day's DailyFileDTO row count or RowHash checksum changes, every
+    entry whose range covers that day is dropped.
+
+    Entries are written chunk by chunk while their key is fetched (as a draft under a negative
+    entry_id, renamed when the key completes) and read back chunk by chunk, so neither side holds
+    a whole result. The methods block; SearchService runs them through asyncio.to_thread().
+    """
+
+    def __init__(self, cache_path: str = SEARCH_CACHE_PATH, max_bytes: int = CACHE_MAX_BYTES,
+                 max_entry_bytes: int = CACHE_ENTRY_MAX_BYTES):
+        self.cache_path = cache_path
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(cache_path, timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        for statement in CACHE_SCHEMA:
+            self.conn.execute(statement)
+        # Caches watermarked on row counts alone get the checksum column; their entries are dropped once
+        if 'checksum' not in {row[1] for row in self.conn.execute("PRAGMA table_info(cache_days)")}:
+            self.conn.execute("ALTER TABLE cache_days ADD COLUMN checksum INTEGER")
+        # Drafts a killed run left behind
+        self.conn.execute("DELETE FROM entry_chunks WHERE entry_id < 0")
+        self.conn.commit()
+        self.total_size = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
+
+    def lookup(self, key_type, keys, start_day, end_day):
+        """{key: entry_id} of the cached keys; marks them used."""
+        with self.lock:
+            found = {}
+            for key in keys:
+                row = self.conn.execute(
+                    "SELECT entry_id FROM entries WHERE key_type = ? AND key = ? AND start_day = ? AND end_day = ?",
+                    (key_type, key, start_day, end_day)).fetchone()
+                if row is not None:
+                    found[key] = row[0]
+            if found:
+                now = time.time()
+                self.conn.executemany("UPDATE entries SET last_used = ? WHERE entry_id = ?",
+                                      ((now, entry_id) for entry_id in found.values()))
+                self.conn.commit()
+            return found
+
+    def iter_chunks(self, entry_id):
+        """
+        Row chunks of an entry, unpickled one at a time. Reads one snapshot on a connection of its
+        own, so an eviction can't cut the entry short. Raises KeyError when the entry is gone.
+        """
+        conn = sqlite3.connect(self.cache_path, timeout=30, check_same_thread=False)
+        try:
+            conn.execute("BEGIN")
+            if conn.execute("SELECT 1 FROM entries WHERE entry_id = ?", (entry_id,)).fetchone() is None:
+                raise KeyError(entry_id)
+            for (data,) in conn.execute("SELECT data FROM entry_chunks WHERE entry_id = ? ORDER BY seq",
+                                        (entry_id,)):
+                yield pickle.loads(data)
+        finally:
+            conn.close()
+
+    @staticmethod
+    def new_draft():
+        return -random.getrandbits(62) - 1
+
+    def append_chunk(self, draft_id, seq, rows):
+        """Stores one chunk of a draft entry. Returns its pickled size."""
+        blob = pickle.dumps(rows, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.conn.execute("INSERT INTO entry_chunks (entry_id, seq, data) VALUES (?, ?, ?)",
+                              (draft_id, seq, blob))
+            self.conn.commit()
+        return len(blob)
+
+    def discard_draft(self, draft_id):
+        with self.lock:
+            self.conn.execute("DELETE FROM entry_chunks WHERE entry_id = ?", (draft_id,))
+            self.conn.commit()
+
+    def commit_draft(self, draft_id, key_type, key, start_day, end_day, chunks, row_count, size):
+        """Publishes a complete draft as the entry of its key, replacing an older one."""
+        with self.lock:
+            self._delete("key_type = ? AND key = ? AND start_day = ? AND end_day = ?",
+                         (key_type, key, start_day, end_day))
+            cur = self.conn.execute(
+                "INSERT INTO entries (key_type, key, start_day, end_day, row_count, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key_type, key, start_day, end_day, row_count, size, time.time()))
+            moved = self.conn.execute("UPDATE entry_chunks SET entry_id = ? WHERE entry_id = ?",
+                                      (cur.lastrowid, draft_id)).rowcount
+            if moved != chunks:
+                # Another process opening the cache cleared the draft: don't publish a partial entry
+                self.conn.execute("DELETE FROM entry_chunks WHERE entry_id = ?", (cur.lastrowid,))
+                self.conn.execute("DELETE FROM entries WHERE entry_id = ?", (cur.lastrowid,))
+            else:
+                self.total_size += size
+                self.evict()
+            self.conn.commit()
+
+    def evict(self):
+        with self.lock:
+            if self.total_size <= self.max_bytes:
+                return
+            evicted = 0
+            for (entry_id,) in self.conn.execute("SELECT entry_id FROM entries ORDER BY last_used").fetchall():
+                if self.total_size <= self.max_bytes:
+                    break
+                evicted += self._delete("entry_id = ?", (entry_id,))
+            logger.info(f"🧹 Search cache: evicted {evicted} least recently used entries")
+
+    def _delete(self, condition, params):
+        """Deletes the matching entries and their chunks. Returns the number of entries deleted."""
+        self.total_size -= self.conn.execute(
+            f"SELECT COALESCE(SUM(size), 0) FROM entries WHERE {condition}", params).fetchone()[0]
+        self.conn.execute(
+            f"DELETE FROM entry_chunks WHERE entry_id IN (SELECT entry_id FROM entries WHERE {condition})", params)
+        return self.conn.execute(f"DELETE FROM entries WHERE {condition}", params).rowcount
+
+    def check_days(self, day_watermarks, start_day, end_day):
+        """
+        Compares the current per-day (row count, checksum) watermarks of a range with the recorded
+        ones and drops the entries covering any changed, new or removed day. Returns the number of
+        entries dropped.
+        """
+        with self.lock:
+            day_filter, params = ("WHERE fdate BETWEEN ? AND ?", (start_day, end_day)) if start_day else ("", ())
+            recorded = {day: (count, checksum) for day, count, checksum in self.conn.execute(
+                f"SELECT fdate, row_count, checksum FROM cache_days {day_filter}", params).fetchall()}
+            changed = sorted(day for day in set(day_watermarks) | set(recorded)
+                             if day_watermarks.get(day) != recorded.get(day))
+
+            dropped = 0
+            for day in changed:
+                dropped += self._delete("(start_day = '' OR start_day <= ?) AND (end_day = '' OR end_day >= ?)",
+                                        (day, day))
+                if day in day_watermarks:
+                    self.conn.execute("INSERT OR REPLACE INTO cache_days (fdate, row_count, checksum) VALUES (?, ?, ?)",
+                                      (day, *day_watermarks[day]))
+                else:
+                    self.conn.execute("DELETE FROM cache_days WHERE fdate = ?", (day,))
+            self.conn.commit()
+        if dropped:
+            logger.info(f"🔄 Search cache: {len(changed)} days changed, dropped {dropped} entries")
+        return dropped
+
+
+# ---------------- Streaming ----------------
+_END = object()  # a key's last message
+_MISSED = object()  # a cached key was evicted before it could be read
+
+
+class _ChunkQueue:
+    """
+    Bounded queue of (key, chunk | _END | _MISSED | exception) messages for one search. Once
+    closed, puts return at once, so a fetch never waits on a search nobody reads anymore.
+    """
+
+    def __init__(self, max_chunks: int = SEARCH_QUEUE_CHUNKS):
+        self.items = deque()
+        self.max_chunks = max_chunks
+        self.closed = False
+        self.cond = asyncio.Condition()
+
+    async def put(self, item):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.closed or len(self.items) < self.max_chunks)
+            if not self.closed:
+                self.items.append(item)
+                self.cond.notify_all()
+
+    async def get(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.items)
+            item = self.items.popleft()
+            self.cond.notify_all()
+            return item
+
+    async def close(self):
+        async with self.cond:
+            self.closed = True
+            self.items.clear()
+            self.cond.notify_all()
+
+
+class _KeyFeed:
+    """Passes the chunks of one key's running fetch to every search reading that key."""
+
+    def __init__(self):
+        self.readers = []
+        self.sealed = False  # set with the first message: a search joining later would miss chunks
+
+    def join(self, reader) -> bool:
+        if self.sealed:
+            return False
+        self.readers.append(reader)
+        return True
+
+    def leave(self, reader):
+        if reader in self.readers:
+            self.readers.remove(reader)
+
+    async def send(self, item):
+        self.sealed = True
+        for reader in list(self.readers):
+            await reader.put(item)
+
+
+class _KeyResult:
+    """A claimed key while it is fetched: its chunks go to the feed and into a cache draft."""
+
+    def __init__(self, entry, feed, cache):
+        self.entry = entry
+        self.feed = feed
+        self.cache = cache
+        self.draft = cache.new_draft() if cache is not None else None
+        self.chunks = self.rows = self.size = 0
+        self.done = False
+
+    async def add(self, rows):
+        # Tiles of one key add concurrently: take the chunk's place before waiting on the cache
+        seq = self.chunks
+        self.chunks += 1
+        self.rows += len(rows)
+        draft = self.draft
+        if draft is not None:
+            size = await asyncio.to_thread(self.cache.append_chunk, draft, seq, rows)
+            if self.draft != draft:
+                await asyncio.to_thread(self.cache.discard_draft, draft)  # dropped meanwhile
+            else:
+                self.size += size
+                if self.size > self.cache.max_entry_bytes:
+                    await self.drop_draft()
+        await self.feed.send((self.entry[1], rows))
+
+    async def drop_draft(self):
+        """Stops caching this key."""
+        if self.draft is not None:
+            draft, self.draft = self.draft, None
+            await asyncio.to_thread(self.cache.discard_draft, draft)
+
+    async def finish(self):
+        self.done = True
+        if self.draft is not None:
+            draft, self.draft = self.draft, None
+            await asyncio.to_thread(self.cache.commit_draft, draft, *self.entry, self.chunks, self.rows, self.size)
+        await self.feed.send((self.entry[1], _END))
+
+    async def fail(self, error):
+        self.done = True
+        await self.drop_draft()
+        await self.feed.send((self.entry[1], error))
+
+
+# ---------------- Service ----------------
+class SearchService:
+    """
+    One search API over DailyFileDTO for every key type:
+
+        async for rows in service.search('biller', names, start_date, end_date):
+            ...
+
+    Chunks stream as they arrive: cached keys are read back from the cache, the missing ones are
+    fetched together (biller names as planned tiles, invoice numbers through the key index and
+    RowHash) and passed on, and written to the cache, while the queries run. A key another search in
+    this process is fetching (and has not yet passed anything on) is read from that fetch instead of
+    queried again, so overlapping concurrent requests share their MySQL work. Chunks of different
+    keys interleave; a search that is not read holds back the fetches it shares.
+
+    Args:
+        pool: aiomysql pool
+        cache: SearchCache, or None to always query MySQL
+        key_index: Refreshed InvoiceKeyIndex, required for 'invoice' searches
+        limiter: AdaptiveLimiter shared with the caller (default: one capped at the pool size)
+        key_batch_size: Names per query without a date range / RowHash values per invoice query
+    """
+
+    def __init__(self, pool, cache=None, key_index=None, limiter=None, key_batch_size: int = KEY_BATCH_SIZE):
+        self.pool = pool
+        self.key_batch_size = key_batch_size
+        self.cache = cache
+        self.key_index = key_index
+        self.limiter = limiter or AdaptiveLimiter(pool.maxsize, name="Search service")
+        self.inflight = {}  # (key_type, key, start_day, end_day) -> _KeyFeed of the key's running fetch
+        self._fetches = set()  # running fetch tasks (the loop only keeps weak references)
+        self._validate_lock = asyncio.Lock()
+
+    async def search(self, key_type, keys, start_date=None, end_date=None):
+        """Streams the rows of the keys' matches in chunks, as cached entries are read and fetches arrive."""
+        chunks = self.search_by_key(key_type, keys, start_date, end_date)
+        try:
+            async for _, rows in chunks:
+                yield rows
+        finally:
+            await chunks.aclose()
+
+    async def search_by_key(self, key_type, keys, start_date=None, end_date=None):
+        """search(), yielding (normalized key, rows) so callers can tell the keys' chunks apart."""
+        if key_type not in KEY_TYPES:
+            raise ValueError(f"Unknown key type {key_type!r}; expected one of {', '.join(KEY_TYPES)}")
+        if key_type == 'invoice' and self.key_index is None:
+            raise ValueError("Invoice searches need a key_index")
+        start_day, end_day = (_day(start_date), _day(end_date)) if start_date and end_date else ("", "")
+        keys = normalize_keys(key_type, keys)
+        span = (start_date, end_date, start_day, end_day)
+
+        cached = {}
+        if self.cache is not None:
+            async with self._validate_lock:
+                day_watermarks = await source_day_watermarks(self.pool, start_date, end_date)
+                await asyncio.to_thread(self.cache.check_days, day_watermarks, start_day, end_day)
+            cached = await asyncio.to_thread(self.cache.lookup, key_type, keys, start_day, end_day)
+
+        reader = _ChunkQueue()
+        feeds, claimed = [], {}
+        for key in keys:
+            if key not in cached:
+                feed, claims = self._join(key_type, key, start_day, end_day, reader)
+                feeds.append(feed)
+                if claims:
+                    claimed[key] = feed
+
+        logger.info(f"🔎 {key_type} search: {len(keys)} keys, {len(cached)} cached, "
+                    f"{len(keys) - len(cached) - len(claimed)} shared with running searches, {len(claimed)} to query")
+        if claimed:
+            self._start_fetch(key_type, claimed, *span)
+        cache_reads = asyncio.create_task(self._read_cached(cached, reader)) if cached else None
+
+        # A row carrying several searched identifiers is in several invoice keys; pass it on once
+        first_key = {} if key_type == 'invoice' else None
+        keys_left = len(keys)
+        try:
+            while keys_left:
+                key, item = await reader.get()
+                if item is _END:
+                    keys_left -= 1
+                elif item is _MISSED:
+                    feed, claims = self._join(key_type, key, start_day, end_day, reader)
+                    feeds.append(feed)
+                    if claims:
+                        self._start_fetch(key_type, {key: feed}, *span)
+                elif isinstance(item, BaseException):
+                    raise item
+                elif first_key is None:
+                    yield key, item
+                else:
+                    fresh = [row for row in item if first_key.setdefault(row, key) == key]
+                    if fresh:
+                        yield key, fresh
+        finally:
+            await reader.close()
+            for feed in feeds:
+                feed.leave(reader)
+            if cache_reads is not None:
+                cache_reads.cancel()
+                await asyncio.gather(cache_reads, return_exceptions=True)
+
+    async def search_all(self, key_type, keys, start_date=None, end_date=None):
+        """Collects a search into one list of rows."""
+        rows = []
+        async for chunk in self.search(key_type, keys, start_date, end_date):
+            rows.extend(chunk)
+        return rows
+
+    def _join(self, key_type, key, start_day, end_day, reader):
+        """Reads a key from its running fetch, or claims it. Returns (feed, claimed)."""
+        entry = (key_type, key, start_day, end_day)
+        feed = self.inflight.get(entry)
+        if feed is not None and feed.join(reader):
+            return feed, False
+        feed = self.inflight[entry] = _KeyFeed()
+        feed.join(reader)
+        return feed, True
+
+    def _release(self, result):
+        if self.inflight.get(result.entry) is result.feed:
+            del self.inflight[result.entry]
+
+    async def _read_cached(self, cached, reader):
+        for key, entry_id in cached.items():
+            chunks = self.cache.iter_chunks(entry_id)
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(next, chunks, _END)
+                    await reader.put((key, chunk))
+                    if chunk is _END:
+                        break
+            except KeyError:
+                await reader.put((key, _MISSED))
+
+    # ---------------- Fetching ----------------
+    def _start_fetch(self, key_type, feeds, start_date, end_date, start_day, end_day):
+        # Runs on its own: requests sharing these keys still get them if this one stops reading
+        fetch = asyncio.create_task(self._fetch(key_type, feeds, start_date, end_date, start_day, end_day))
+        self._fetches.add(fetch)
+        fetch.add_done_callback(self._fetches.discard)
+        fetch.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _fetch(self, key_type, feeds, start_date, end_date, start_day, end_day):
+        """Queries the claimed keys, passing their chunks on as they arrive."""
+        results = {key: _KeyResult((key_type, key, start_day, end_day), feed, self.cache)
+                   for key, feed in feeds.items()}
+        try:
+            if key_type == 'biller':
+                await self._fetch_billers(list(results), start_date, end_date, results)
+            else:
+                await self._fetch_invoices(list(results), start_date, end_date, results)
+        except BaseException as e:
+            for result in results.values():
+                if not result.done:
+                    self._release(result)
+                    await result.fail(e)
+            raise
+
+    async def _complete(self, result):
+        self._release(result)
+        await result.finish()
+
+    async def _fetch_billers(self, names, start_date, end_date, results):
+        if start_date and end_date:
+            tiles = await plan_search(self.pool, names, start_date, end_date)
+        else:
+            tiles = batch_tiles(names, self.key_batch_size)
+
+        # A name completes when all of its tiles have
+        tiles_left = {name: 0 for name in names}
+        for tile in tiles:
+            for name in tile.names:
+                tiles_left[name] += 1
+
+        async def run_tile(tile):
+            # Collation can match a name our key does not: those rows go with the tile's first name
+            sink = _KeyBuckets(lambda row: [name_key(row[0])], {name: results[name] for name in tile.names},
+                               fallback=tile.names[0])
+            date_filter, date_params = tile_filter(tile)
+            query = f"""
+                SELECT {SEARCH_COLUMNS}
+                FROM DailyFileDTO
+                WHERE Cust IN ({",".join(["%s"] * len(tile.names))}) {date_filter}
+            """
+            try:
+                found = await self.limiter.run(stream_query(self.pool, query, list(tile.names) + date_params, sink))
+                await sink.flush()
+            except Exception as e:
+                logger.error(f"MySQL tile {tile.index + 1} error: {e}")
+                raise
+            logger.info(f"Tile {tile.index + 1}: Found {found} records.")
+            if sink.unmatched_rows:
+                # Don't cache any name of the tile
+                logger.warning(f"Tile {tile.index + 1}: {sink.unmatched_rows} rows matched no normalized name")
+                for name in tile.names:
+                    await results[name].drop_draft()
+            for name in tile.names:
+                tiles_left[name] -= 1
+                if tiles_left[name] == 0:
+                    await self._complete(results[name])
+
+        await _gather_all(run_tile(tile) for tile in tiles)
+
+    async def _fetch_invoices(self, keys, start_date, end_date, results):
+        matches = self.key_index.lookup_keys(keys)
+        keys_by_hash = {}
+        for key, hashes in matches.items():
+            for row_hash in hashes:
+                keys_by_hash.setdefault(row_hash, []).append(key)
+
+        date_filter, date_params = "", []
+        if start_date and end_date:
+            date_filter, date_params = " AND fdate BETWEEN %s AND %s", [day_bound(start_date), day_bound(end_date)]
+        hashes = sorted(keys_by_hash)
+
+        async def run_batch(batch):
+            sink = _KeyBuckets(lambda row: keys_by_hash.get(int(row[-1]), []), results, strip_last=True)
+            query = f"""
+                SELECT {SEARCH_COLUMNS}, RowHash
+                FROM DailyFileDTO
+                WHERE RowHash IN ({",".join(["%s"] * len(batch))}){date_filter}
+            """
+            await self.limiter.run(stream_query(self.pool, query, list(batch) + date_params, sink))
+            await sink.flush()
+
+        await _gather_all(run_batch(hashes[i:i + self.key_batch_size])
+                          for i in range(0, len(hashes), self.key_batch_size))
+        for key in keys:
+            await self._complete(results[key])
+
+
+class _KeyBuckets:
+    """
+    stream_query() sink that sorts the streamed rows per key and passes them to the keys'
+    _KeyResult in chunks of CACHE_CHUNK_ROWS. Rows of no key go to fallback (dropped without one)
+    and are counted in unmatched_rows.
+    """
+
+    def __init__(self, keys_of_row, results, strip_last=False, fallback=None):
+        self.keys_of_row = keys_of_row
+        self.results = results
+        self.buckets = {key: [] for key in results}
+        self.strip_last = strip_last
+        self.fallback = fallback
+        self.unmatched_rows = 0
+
+    async def put(self, rows, first_rowid=None):
+        for row in rows:
+            value = tuple(row[:-1]) if self.strip_last else tuple(row)
+            keys = [key for key in self.keys_of_row(row) if key in self.buckets]
+            if not keys:
+                self.unmatched_rows += 1
+                keys = [self.fallback] if self.fallback is not None else []
+            for key in keys:
+                bucket = self.buckets[key]
+                bucket.append(value)
+                if len(bucket) >= CACHE_CHUNK_ROWS:
+                    self.buckets[key] = []
+                    await self.results[key].add(bucket)
+
+    async def flush(self):
+        for key, bucket in self.buckets.items():
+            if bucket:
+                self.buckets[key] = []
+                await self.results[key].add(bucket)
+
+
+async def _gather_all(coros):
+    """gather() that cancels, and waits for, the remaining coroutines when one fails."""
+    tasks = [asyncio.ensure_future(coro) for coro in coros]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def stage_search(service, key_type, keys, writer, start_date=None, end_date=None):
+    """
+    Streams a search into a rowStream.RowStreamWriter. Key i's rows are staged at rowids from
+    i << KEY_ROWID_SHIFT, so a plain table scan returns them grouped by key in request order
+    however the keys' chunks interleaved. Returns the number of rows passed on.
+    """
+    position = {key: i for i, key in enumerate(normalize_keys(key_type, keys))}
+    next_rowid = {}
+    staged = 0
+    async for key, chunk in service.search_by_key(key_type, keys, start_date, end_date):
+        rowid = next_rowid.get(key, position[key] << KEY_ROWID_SHIFT)
+        await writer.put(chunk, rowid)
+        next_rowid[key] = rowid + len(chunk)
+        staged += len(chunk)
+    return staged
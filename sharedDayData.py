@@ -0,0 +1,313 @@
+import logging
+from datetime import date
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Column layouts used by OpenRecon.fetch_all_biller_data (Cust excluded)
+SINGLE_BILLER_COLUMNS = ['InvoiceNum', 'InvAmount', 'AmountPaid', 'PayDate', 'OpFee', 'PostPaidShare',
+                         'InternalCode']
+MULTI_BILLER_COLUMNS = ['InvoiceNum', 'InvAmount', 'AmountPaid', 'PayDate', 'OpFee', 'PostPaidShare',
+                        'SubBillerShare', 'SubBillerName', 'InternalCode']
+AMOUNT_COLUMNS = ['InvAmount', 'AmountPaid', 'OpFee', 'PostPaidShare', 'SubBillerShare']
+
+# Every array inside the block starts on an 8-byte boundary
+ALIGNMENT = 8
+
+# Cell type tags for mixed object columns
+TAG_NULL, TAG_FLOAT, TAG_INT, TAG_TEXT, TAG_DATETIME, TAG_BOOL = range(6)
+
+# Per-process cache of attached frames, so pool workers attach once and reuse it for every task
+_attached_frames = {}
+
+
+def _aligned(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _encode_column(series):
+    """
+    Splits a column into the flat arrays stored in shared memory.
+
+    Returns:
+        (kind, dtype string, {part name: numpy array})
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.to_numpy(dtype='datetime64[ns]')
+        return 'datetime', 'datetime64[ns]', {'values': values.view('int64')}
+
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy(dtype='float64' if series.isna().any() else None)
+        return 'numeric', values.dtype.str, {'values': np.ascontiguousarray(values)}
+
+    null_mask = series.isna().to_numpy()
+    values = series.to_numpy(dtype=object)
+
+    if pd.api.types.infer_dtype(series, skipna=True) in ('string', 'empty'):
+        # Strings: one UTF-8 blob plus an offsets array (Arrow-style), nulls kept in a mask
+        offsets, blob = _encode_strings(values, null_mask)
+        return 'string', 'object', {'offsets': offsets, 'blob': blob, 'nulls': null_mask.astype(np.uint8)}
+
+    # Mixed object column (e.g. amounts with leftover text): a type tag per cell, numbers in
+    # float/int arrays, text in the blob, so every cell comes back with its original type
+    tags = np.full(len(values), TAG_NULL, dtype=np.uint8)
+    floats = np.zeros(len(values), dtype=np.float64)
+    ints = np.zeros(len(values), dtype=np.int64)
+    text_mask = np.zeros(len(values), dtype=bool)
+    for i, value in enumerate(values):
+        if null_mask[i]:
+            continue
+        if isinstance(value, (bool, np.bool_)):
+            tags[i], ints[i] = TAG_BOOL, int(value)
+        elif isinstance(value, (int, np.integer)):
+            tags[i], ints[i] = TAG_INT, int(value)
+        elif isinstance(value, (float, np.floating)):
+            tags[i], floats[i] = TAG_FLOAT, float(value)
+        elif isinstance(value, (date, np.datetime64)):
+            tags[i], ints[i] = TAG_DATETIME, pd.Timestamp(value).value
+        else:
+            tags[i] = TAG_TEXT
+            text_mask[i] = True
+    offsets, blob = _encode_strings(values, ~text_mask)
+    return 'mixed', 'object', {'tags': tags, 'floats': floats, 'ints': ints, 'offsets': offsets, 'blob': blob}
+
+
+def _encode_strings(values, skip_mask):
+    """UTF-8 blob and offsets for values; entries where skip_mask is set are stored empty."""
+    encoded = [b'' if skip else str(value).encode('utf-8') for value, skip in zip(values, skip_mask)]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum(np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded)), out=offsets[1:])
+    blob = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return offsets, blob
+
+
+class SharedDayFrame:
+    """
+    A day's dataset placed once in shared memory as columnar arrays, sorted by a key
+    column, with a per-key offset table so worker processes can attach to their slice
+    without the rows being pickled.
+
+    The owner process creates it with publish() and must call unlink() when all workers
+    are done. Workers receive the small, picklable handle and call attach().
+    """
+
+    def __init__(self, shm, handle, owner):
+        self._shm = shm
+        self.handle = handle
+        self._owner = owner
+        self.key_column = handle['key_column']
+        self.offsets = handle['offsets']
+        self.columns = [col['name'] for col in handle['columns']]
+        self._arrays = {}
+
+        buf = shm.buf
+        for col in handle['columns']:
+            parts = {}
+            for part_name, (start, dtype, length) in col['parts'].items():
+                parts[part_name] = np.ndarray((length,), dtype=np.dtype(dtype), buffer=buf, offset=start)
+            self._arrays[col['name']] = (col['kind'], col['dtype'], parts)
+
+    # ---------------- Creation / attachment ----------------
+    @classmethod
+    def publish(cls, df, key_column='Cust', metadata=None):
+        """
+        Copies a DataFrame into a single shared memory block, sorted by key_column.
+
+        Args:
+            df: DataFrame holding the whole day
+            key_column: Column used to build the offset table (customer)
+            metadata: Optional picklable dict carried in the handle (e.g. biller types)
+
+        Returns:
+            SharedDayFrame owned by the calling process
+        """
+        # Sort once, then find every key's partition boundaries with searchsorted
+        df = df[df[key_column].notna()]
+        keys = df[key_column].astype(str).to_numpy(dtype=object)
+        order = np.argsort(keys, kind='stable')
+        df = df.iloc[order].reset_index(drop=True)
+        keys = keys[order]
+        unique_keys = pd.unique(keys)
+        starts = np.searchsorted(keys, unique_keys, side='left')
+        stops = np.searchsorted(keys, unique_keys, side='right')
+        offsets = {key: (int(start), int(stop)) for key, start, stop in zip(unique_keys, starts, stops)}
+
+        encoded_columns = [(name, *_encode_column(df[name])) for name in df.columns]
+
+        total_size = 0
+        for _, _, _, parts in encoded_columns:
+            for array in parts.values():
+                total_size += _aligned(array.nbytes)
+
+        shm = shared_memory.SharedMemory(create=True, size=max(total_size, ALIGNMENT))
+
+        columns_layout = []
+        position = 0
+        for name, kind, dtype, parts in encoded_columns:
+            parts_layout = {}
+            for part_name, array in parts.items():
+                target = np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf, offset=position)
+                target[:] = array
+                parts_layout[part_name] = (position, array.dtype.str, len(array))
+                position += _aligned(array.nbytes)
+            columns_layout.append({'name': name, 'kind': kind, 'dtype': dtype, 'parts': parts_layout})
+
+        handle = {
+            'shm_name': shm.name,
+            'key_column': key_column,
+            'rows': len(df),
+            'offsets': offsets,
+            'columns': columns_layout,
+            'metadata': metadata or {},
+        }
+        logger.info(f"Published {len(df)} rows / {len(offsets)} keys to shared memory "
+                    f"'{shm.name}' ({total_size / 1048576:.1f} MB)")
+        return cls(shm, handle, owner=True)
+
+    @classmethod
+    def attach(cls, handle):
+        """Attaches to a frame published by another process (no data is copied)."""
+        # Pool workers share the owner's resource tracker, so attaching here does not
+        # schedule a second unlink. Only the owner unlinks the block.
+        shm = shared_memory.SharedMemory(name=handle['shm_name'])
+        return cls(shm, handle, owner=False)
+
+    @classmethod
+    def attach_cached(cls, handle):
+        """attach() once per process and reuse the view for later tasks."""
+        frame = _attached_frames.get(handle['shm_name'])
+        if frame is None:
+            frame = cls.attach(handle)
+            _attached_frames[handle['shm_name']] = frame
+        return frame
+
+    # ---------------- Access ----------------
+    def keys(self):
+        return list(self.offsets.keys())
+
+    def column_slice(self, name, start, stop):
+        """
+        Returns one column for rows [start, stop).
+        Numeric and datetime columns are zero-copy views; strings are decoded for the slice only.
+        """
+        kind, dtype, parts = self._arrays[name]
+        if kind == 'numeric':
+            return parts['values'][start:stop]
+        if kind == 'datetime':
+            return parts['values'][start:stop].view('datetime64[ns]')
+
+        offsets = parts['offsets']
+        blob = parts['blob']
+        values = np.empty(stop - start, dtype=object)
+
+        if kind == 'string':
+            nulls = parts['nulls']
+            for i, row in enumerate(range(start, stop)):
+                if nulls[row]:
+                    values[i] = None
+                else:
+                    values[i] = blob[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+            return values
+
+        tags, floats, ints = parts['tags'], parts['floats'], parts['ints']
+        for i, row in enumerate(range(start, stop)):
+            tag = tags[row]
+            if tag == TAG_FLOAT:
+                values[i] = float(floats[row])
+            elif tag == TAG_INT:
+                values[i] = int(ints[row])
+            elif tag == TAG_TEXT:
+                values[i] = blob[offsets[row]:offsets[row + 1]].tobytes().decode('utf-8')
+            elif tag == TAG_DATETIME:
+                values[i] = pd.Timestamp(int(ints[row]))
+            elif tag == TAG_BOOL:
+                values[i] = bool(ints[row])
+            else:
+                values[i] = None
+        return values
+
+    def customer_arrays(self, key, columns=None):
+        """Returns {column: array} for one key, or None if the key is not in the frame."""
+        bounds = self.offsets.get(str(key))
+        if bounds is None:
+            return None
+        start, stop = bounds
+        return {name: self.column_slice(name, start, stop) for name in (columns or self.columns)}
+
+    def customer_frame(self, key, columns=None):
+        """Returns one key's rows as a DataFrame (numeric columns still backed by shared memory)."""
+        arrays = self.customer_arrays(key, columns)
+        if arrays is None:
+            return pd.DataFrame(columns=columns or self.columns)
+        return pd.DataFrame(arrays, copy=False)
+
+    def customer_rows(self, key):
+        """
+        Rebuilds the list-of-lists rows that OpenRecon.fetch_all_biller_data produced for a customer
+        published with frame_from_biller_data().
+        """
+        biller_type = self.handle['metadata'].get('types', {}).get(str(key))
+        layout = SINGLE_BILLER_COLUMNS if biller_type == 'Single Biller' else MULTI_BILLER_COLUMNS
+        frame = self.customer_frame(key, layout)
+        return frame.astype(object).where(frame.notna(), '').values.tolist()
+
+    # ---------------- Cleanup ----------------
+    def close(self):
+        self._arrays = {}
+        _attached_frames.pop(self.handle['shm_name'], None)
+        self._shm.close()
+
+    def unlink(self):
+        """Closes and releases the block. Only the publishing process should call this."""
+        self.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._owner:
+            self.unlink()
+        else:
+            self.close()
+
+
+def frame_from_biller_data(all_biller_data):
+    """
+    Flattens the {customer: {'data': rows, 'type': ...}} dict from OpenRecon.fetch_all_biller_data
+    into one frame with a Cust column, ready for SharedDayFrame.publish().
+
+    Returns:
+        (DataFrame, metadata dict with each customer's layout type)
+    """
+    frames = []
+    types = {}
+    for customer_name, entry in all_biller_data.items():
+        layout = SINGLE_BILLER_COLUMNS if entry['type'] == 'Single Biller' else MULTI_BILLER_COLUMNS
+        types[str(customer_name)] = entry['type']
+        if not entry['data']:
+            continue
+        frame = pd.DataFrame(entry['data'], columns=layout)
+        frame.insert(0, 'Cust', str(customer_name))
+        frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=['Cust'] + MULTI_BILLER_COLUMNS), {'types': types}
+
+    df = pd.concat(frames, ignore_index=True)
+    for col in AMOUNT_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col].replace('', np.nan), errors='coerce')
+    return df, {'types': types}
+
+
+def publish_biller_data(all_biller_data):
+    """Publishes the output of OpenRecon.fetch_all_biller_data to shared memory."""
+    df, metadata = frame_from_biller_data(all_biller_data)
+    return SharedDayFrame.publish(df, key_column='Cust', metadata=metadata)
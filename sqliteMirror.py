@@ -0,0 +1,229 @@
+import asyncio
+import os
+import sqlite3
+import time
+import logging
+from datetime import datetime, timedelta
+
+import config
+from rowStream import RowStreamWriter, stream_query
+from concurrencyController import AdaptiveLimiter
+from sqliteStaging import StagingWriter, DAILYFILE_COLUMNS, create_table_sql, has_other_types
+from rowFingerprint import signed_checksum
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+MIRROR_PATH = os.path.join(config.config.dailyfile_base, "dailyfiledto_mirror.sqlite")
+MIRROR_TABLE = "dailyfiledto"
+SOURCE_TABLE = "DailyFileDTO"
+SYNC_CONCURRENCY = 8  # Most days fetched at once when the caller passes no limiter
+
+MIRROR_COLUMNS = [name for name, _ in DAILYFILE_COLUMNS]
+
+# Per-day partition watermark: the row count and BIT_XOR(RowHash) mirrored for each fdate and when
+MIRROR_DAYS_SQL = """
+CREATE TABLE IF NOT EXISTS mirror_days (
+    fdate TEXT PRIMARY KEY,
+    row_count INTEGER,
+    checksum INTEGER,
+    synced_at TEXT
+)
+"""
+
+
+def day_bound(value):
+    """'YYYY-MM-DD 00:00:00' of a date/datetime/'YYYY-MM-DD' value, the form fdate is stored in."""
+    if hasattr(value, 'strftime'):
+        return value.strftime("%Y-%m-%d 00:00:00")
+    return f"{str(value)[:10]} 00:00:00"
+
+
+async def source_day_watermarks(pool, start_date=None, end_date=None, table: str = SOURCE_TABLE):
+    """
+    {'YYYY-MM-DD': (row count, BIT_XOR(RowHash))} of every fdate in [start_date, end_date] (every
+    day without a range). The checksum catches a day replaced with as many rows.
+    """
+    date_filter, params = "", ()
+    if start_date and end_date:
+        date_filter, params = "WHERE fdate BETWEEN %s AND %s", (start_date, end_date)
+    query = f"SELECT DATE(fdate), COUNT(*), BIT_XOR(RowHash) FROM {table} {date_filter} GROUP BY DATE(fdate)"
+    async with pool.acquire() as conn:
+        async with conn.cursor() as cur:
+            await cur.execute(query, params)
+            rows = await cur.fetchall()
+    return {day_bound(day)[:10]: (int(count), signed_checksum(checksum))
+            for day, count, checksum in rows if day is not None}
+
+
+def _next_day(day):
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+
+class SQLiteMirror:
+    """
+    Persistent SQLite copy of DailyFileDTO, partitioned by fdate. sync() compares the per-day row
+    count and RowHash checksum in MySQL with the mirrored ones and only transfers days that are new
+    or changed, so a search re-run the next morning fetches a single day. Searches then run against
+    the mirror.
+    """
+
+    def __init__(self, mirror_path: str = MIRROR_PATH):
+        self.mirror_path = mirror_path
+        os.makedirs(os.path.dirname(os.path.abspath(mirror_path)), exist_ok=True)
+        conn = self.connect()
+        try:
+            if has_other_types(conn, MIRROR_TABLE):
+                # Stored with older column types ([Index] INTEGER, DedFeeSubPost REAL): mirror again
+                logger.info("🔄 Mirror: column types changed, dropping the mirror for a full re-sync")
+                conn.execute(f"DROP TABLE {MIRROR_TABLE}")
+                conn.execute("DROP TABLE IF EXISTS mirror_days")
+            conn.execute(create_table_sql(MIRROR_TABLE))
+            conn.execute(MIRROR_DAYS_SQL)
+            # Mirrors synced on row counts alone get the checksum column; their days re-sync once
+            if 'checksum' not in {row[1] for row in conn.execute("PRAGMA table_info(mirror_days)")}:
+                conn.execute("ALTER TABLE mirror_days ADD COLUMN checksum INTEGER")
+            conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{MIRROR_TABLE}_fdate ON {MIRROR_TABLE} (fdate)")
+            conn.commit()
+        finally:
+            conn.close()
+
+    def connect(self):
+        return sqlite3.connect(self.mirror_path, timeout=30)
+
+    def watermark(self):
+        """Latest mirrored fdate ('YYYY-MM-DD'), or None for an empty mirror."""
+        conn = self.connect()
+        try:
+            return conn.execute("SELECT MAX(fdate) FROM mirror_days").fetchone()[0]
+        finally:
+            conn.close()
+
+    async def sync(self, pool, start_date, end_date, concurrency: int = SYNC_CONCURRENCY,
+                   limiter: AdaptiveLimiter = None):
+        """
+        Brings the mirror up to date for [start_date, end_date]. Day fetches go through limiter (the
+        caller's, so the search and the sync share what they learned about MySQL load), or a new
+        AdaptiveLimiter capped at concurrency.
+
+        Returns:
+            (days transferred, rows transferred)
+        """
+        sync_start = time.time()
+        source_days = await source_day_watermarks(pool, start_date, end_date)
+
+        conn = self.connect()
+        try:
+            mirrored = {day: (count, checksum) for day, count, checksum in conn.execute(
+                "SELECT fdate, row_count, checksum FROM mirror_days WHERE fdate BETWEEN ? AND ?",
+                (day_bound(start_date)[:10], day_bound(end_date)[:10])).fetchall()}
+            stale = sorted(day for day, watermark in source_days.items() if mirrored.get(day) != watermark)
+            removed = sorted(set(mirrored) - set(source_days))
+
+            # Stale days are emptied (and forgotten) before the transfer; an interrupted sync re-fetches them
+            for day in stale + removed:
+                conn.execute(f"DELETE FROM {MIRROR_TABLE} WHERE fdate >= ? AND fdate < ?",
+                             (day_bound(day), day_bound(_next_day(day))))
+                conn.execute("DELETE FROM mirror_days WHERE fdate = ?", (day,))
+            conn.commit()
+        finally:
+            conn.close()
+
+        watermark = max(mirrored) if mirrored else None
+        if not stale:
+            logger.info(f"⚡ Mirror up to date for {start_date} → {end_date} "
+                        f"({len(source_days)} days, watermark {watermark})")
+            return 0, 0
+
+        logger.info(f"🔄 Mirror: transferring {len(stale)} of {len(source_days)} days "
+                    f"(watermark {watermark}, {len(removed)} days removed)")
+
+        # The mirror outlives the run, so it loads with the crash-safe profile
+        writer = RowStreamWriter(StagingWriter(self.mirror_path, MIRROR_TABLE, profile='safe', clear=False))
+        writer.start()
+        if limiter is None:
+            limiter = AdaptiveLimiter(concurrency, name="Mirror sync")
+        query = f"""
+            SELECT Cust, `Index`, BillerName, InvoiceNum, InvAmount, AmountPaid,
+                   PayDate, OpFee, PostPaidShare, SubBillerName, SubBillerShare,
+                   DedFeeSubPost, InternalCode, Comments, ContractNum, fdate
+            FROM {SOURCE_TABLE}
+            WHERE fdate >= %s AND fdate < %s
+        """
+
+        async def fetch_day(day):
+            return await limiter.run(stream_query(pool, query, (day_bound(day), day_bound(_next_day(day))), writer))
+
+        tasks = [asyncio.ensure_future(fetch_day(day)) for day in stale]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # A failed day stops the others, so none is left holding a pool connection (and
+            # pool.wait_closed() waiting on it) once the writer below has stopped
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        finally:
+            rows = await asyncio.to_thread(writer.finish)
+            logger.info(limiter.summary())
+
+        self._record_days({day: source_days[day][1] for day in stale})
+        logger.info(f"✅ Mirror: {rows} rows over {len(stale)} days in {time.time() - sync_start:.2f}s")
+        return len(stale), rows
+
+    def _record_days(self, checksums):
+        """
+        Stores the mirrored row count of each day, with the source checksum it was fetched at, as its
+        watermark entry. checksums: {day: BIT_XOR(RowHash) read before the transfer}.
+        """
+        conn = self.connect()
+        try:
+            synced_at = datetime.now().isoformat(timespec='seconds')
+            for day, checksum in checksums.items():
+                count = conn.execute(f"SELECT COUNT(*) FROM {MIRROR_TABLE} WHERE fdate >= ? AND fdate < ?",
+                                     (day_bound(day), day_bound(_next_day(day)))).fetchone()[0]
+                conn.execute("INSERT OR REPLACE INTO mirror_days (fdate, row_count, checksum, synced_at) "
+                             "VALUES (?, ?, ?, ?)", (day, count, checksum, synced_at))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # ---------------- Local queries ----------------
+    def attach(self, conn, alias: str = "mirror"):
+        """Attaches the mirror to another SQLite connection (e.g. a staging file) as `alias`."""
+        conn.execute(f"ATTACH DATABASE ? AS {alias}", (self.mirror_path,))
+
+    @staticmethod
+    def load_search_names(conn, names):
+        """Temp table of trimmed names, compared case-insensitively like the MySQL collation does."""
+        conn.execute("CREATE TEMP TABLE IF NOT EXISTS search_names (name TEXT COLLATE NOCASE PRIMARY KEY)")
+        conn.execute("DELETE FROM search_names")
+        conn.executemany("INSERT OR IGNORE INTO search_names (name) VALUES (?)",
+                         ((str(name).strip(),) for name in names if name is not None))
+
+    def copy_matches(self, conn, staging_table: str, names, start_date=None, end_date=None):
+        """
+        Inserts into staging_table, on the staging connection conn, the mirrored rows whose Cust is one
+        of names, within the date range. Returns the number of rows copied.
+        """
+        self.attach(conn)
+        self.load_search_names(conn, names)
+        column_list = ", ".join(MIRROR_COLUMNS)
+        date_filter, params = "", []
+        if start_date and end_date:
+            date_filter = " AND m.fdate BETWEEN ? AND ?"
+            params = [day_bound(start_date), day_bound(end_date)]
+        cur = conn.execute(f"""
+            INSERT INTO {staging_table} ({column_list})
+            SELECT {", ".join(f"m.{col}" for col in MIRROR_COLUMNS)}
+            FROM mirror.{MIRROR_TABLE} m
+            JOIN search_names s ON s.name = TRIM(m.Cust)
+            WHERE 1 = 1{date_filter}
+            ORDER BY m.fdate, m.rowid
+        """, params)
+        return cur.rowcount
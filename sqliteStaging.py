@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import time
+import logging
+
+# ---------------- Logging ----------------
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger(__name__)
+
+# The 16 DailyFileDTO columns as the staging tables (and the mirror) store them
+DAILYFILE_COLUMNS = [
+    ("Cust", "TEXT"),
+    ("[Index]", "REAL"),
+    ("BillerName", "TEXT"),
+    ("InvoiceNum", "TEXT"),
+    ("InvAmount", "REAL"),
+    ("AmountPaid", "REAL"),
+    ("PayDate", "TEXT"),
+    ("OpFee", "REAL"),
+    ("PostPaidShare", "REAL"),
+    ("SubBillerName", "TEXT"),
+    ("SubBillerShare", "REAL"),
+    ("DedFeeSubPost", "TEXT"),
+    ("InternalCode", "TEXT"),
+    ("Comments", "TEXT"),
+    ("ContractNum", "TEXT"),
+    ("fdate", "TEXT"),
+]
+
+# bulk: throwaway staging tables reloaded every run - one transaction, rollback journal in memory
+#       (ROLLBACK still works, unlike journal_mode=OFF), no fsyncs, big page cache.
+# safe: files that must survive a crash (the mirror) - WAL, normal syncs, periodic commits.
+PROFILES = {
+    'bulk': {
+        'pragmas': ["journal_mode=MEMORY", "synchronous=OFF", "cache_size=-262144", "temp_store=MEMORY"],
+        'commit_every': None,
+    },
+    'safe': {
+        'pragmas': ["journal_mode=WAL", "synchronous=NORMAL", "cache_size=-65536"],
+        'commit_every': 50000,
+    },
+}
+
+
+def create_table_sql(table, columns=DAILYFILE_COLUMNS):
+    column_defs = ",\n    ".join(f"{name} {sql_type}" for name, sql_type in columns)
+    return f"CREATE TABLE IF NOT EXISTS {table} (\n    {column_defs}\n)"
+
+
+def has_other_types(conn, table, columns=DAILYFILE_COLUMNS):
+    """True when table exists with other column types than columns (created by an older version)."""
+    declared = [(name, sql_type.upper()) for _, name, sql_type, *_ in conn.execute(f"PRAGMA table_info({table})")]
+    return bool(declared) and declared != [(name.strip("[]"), sql_type.upper()) for name, sql_type in columns]
+
+
+class StagingWriter:
+    """
+    Loads rows into one SQLite table with a load profile (see PROFILES) and reports rows/s.
+    Used directly or as the sink of rowStream.RowStreamWriter; open(), write() and close() must run
+    on the same thread.
+
+    Args:
+        sqlite_path: SQLite file
+        table: Target table (created if missing)
+        columns: [(name, SQL type), ...]
+        profile: 'bulk' or 'safe'
+        clear: Empty the table on open
+        drop_tables: Derived tables (e.g. a token index) that go stale when the table is reloaded
+        indexes: CREATE INDEX statements run after the load (cheaper than maintaining them per row)
+        after_load: Callable(conn) run after a successful load, before the final commit
+    """
+
+    def __init__(self, sqlite_path: str, table: str, columns=DAILYFILE_COLUMNS, profile: str = 'bulk',
+                 clear: bool = True, drop_tables=(), indexes=(), after_load=None):
+        self.sqlite_path = sqlite_path
+        self.table = table
+        self.columns = columns
+        self.profile = profile
+        self.settings = PROFILES[profile]
+        self.clear = clear
+        self.drop_tables = drop_tables
+        self.indexes = indexes
+        self.after_load = after_load
+
+        column_list = ", ".join(name for name, _ in columns)
+        placeholders = ", ".join(["?"] * len(columns))
+        self.insert_sql = f"INSERT INTO {table} ({column_list}) VALUES ({placeholders})"
+        # Explicit rowids put rows streamed out of order back in plan order for a plain table scan
+        self.rowid_insert_sql = f"INSERT INTO {table} (rowid, {column_list}) VALUES (?, {placeholders})"
+
+        self.conn = None
+        self.rows_written = 0
+        self.pending = 0
+        self.started_at = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.sqlite_path)), exist_ok=True)
+        self.started_at = time.time()
+        self.rows_written = 0
+        self.pending = 0
+        self.conn = sqlite3.connect(self.sqlite_path, timeout=30)
+        for pragma in self.settings['pragmas']:
+            self.conn.execute(f"PRAGMA {pragma}")
+        if self.clear and has_other_types(self.conn, self.table, self.columns):
+            # Reloaded anyway: recreate it so the values get the current column affinities
+            self.conn.execute(f"DROP TABLE {self.table}")
+        self.conn.execute(create_table_sql(self.table, self.columns))
+        for table in self.drop_tables:
+            self.conn.execute(f"DROP TABLE IF EXISTS {table}")
+        if self.clear:
+            self.conn.execute(f"DELETE FROM {self.table}")
+            logger.info(f"Cleared SQLite table {self.table} before inserting new records.")
+        self.conn.commit()
+        return self
+
+    def write(self, rows, first_rowid=None):
+        if first_rowid is None:
+            self.conn.executemany(self.insert_sql, rows)
+        else:
+            self.conn.executemany(self.rowid_insert_sql,
+                                  ((first_rowid + offset,) + tuple(row) for offset, row in enumerate(rows)))
+        self.add_loaded(len(rows))
+
+    def add_loaded(self, count):
+        """Counts rows inserted through self.conn directly (e.g. INSERT ... SELECT)."""
+        self.rows_written += count
+        self.pending += count
+        commit_every = self.settings['commit_every']
+        if commit_every and self.pending >= commit_every:
+            self.conn.commit()
+            self.pending = 0
+
+    def close(self, success: bool = True):
+        if self.conn is None:
+            return
+        try:
+            if success:
+                for statement in self.indexes:
+                    self.conn.execute(statement)
+                if self.after_load is not None:
+                    self.after_load(self.conn)
+                self.conn.commit()
+                elapsed = time.time() - self.started_at
+                logger.info(f"SQLite {self.table}: {self.rows_written} rows in {elapsed:.2f}s "
+                            f"({self.rows_written / max(elapsed, 1e-9):.0f} rows/s, {self.profile} profile)")
+            else:
+                self.conn.rollback()
+        finally:
+            self.conn.close()
+            self.conn = None
+
+    def write_all(self, rows, batch_size: int = 50000):
+        """Opens, loads every row and closes in one call."""
+        self.open()
+        try:
+            for start in range(0, len(rows), batch_size):
+                self.write(rows[start:start + batch_size])
+        except Exception:
+            self.close(success=False)
+            raise
+        self.close()
+        return self.rows_written
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(success=exc_type is None)
+        return False
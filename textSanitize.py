@@ -0,0 +1,78 @@
+import logging
+
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# C0 controls (tab/newline/CR are handled as spaces), DEL, zero-width and bidi control marks, BOM
+CONTROL_PATTERN = r'[\x00-\x08\x0B\x0C\x0E-\x1F\x7F\u200B-\u200F\u202A-\u202E\u2060\u2066-\u2069\uFEFF]'
+LINE_BREAK_PATTERN = r'[\t\n\r]+'
+# Non-breaking, figure and narrow spaces become plain spaces
+SPACE_PATTERN = r'[\xA0\u2007\u202F]'
+# '0012345.0' -> '0012345': IDs that went through a float on the way in
+FLOAT_ID_PATTERN = r'^(\d+)\.0+$'
+
+# Identifier columns, by their Excel and dailyfiledto names (D, M and T in the daily layout)
+DEFAULT_ID_COLUMNS = ('رقم الفاتورة/الدفعة', 'الكود الداخلي', 'رقم العقد',
+                      'InvoiceNum', 'InternalCode', 'ContractNum')
+
+
+def sanitize_series(series, is_id=False):
+    """
+    Cleans the text values of one column; numbers, dates and NaN are left untouched.
+    Text is NFKC-normalized (this also maps Arabic presentation forms back to the base letters),
+    control characters are dropped, line breaks and NBSP become spaces and the ends are trimmed.
+    Identifier columns additionally lose a float tail ('123.0' -> '123'), keeping leading zeros.
+
+    Returns:
+        (clean series, number of values changed)
+    """
+    is_text = series.map(type) == str
+    if not is_text.any():
+        return series, 0
+
+    original = series[is_text].astype(object)
+    text = original.str.normalize('NFKC')
+    text = text.str.replace(CONTROL_PATTERN, '', regex=True)
+    text = text.str.replace(LINE_BREAK_PATTERN, ' ', regex=True)
+    text = text.str.replace(SPACE_PATTERN, ' ', regex=True)
+    text = text.str.strip()
+    if is_id:
+        text = text.str.replace(FLOAT_ID_PATTERN, r'\1', regex=True)
+
+    changed = text != original
+    changed_count = int(changed.sum())
+    if not changed_count:
+        return series, 0
+
+    clean = series.astype(object).copy()
+    clean[text.index[changed.to_numpy()]] = text[changed]
+    if pd.api.types.is_string_dtype(series) and not pd.api.types.is_object_dtype(series):
+        clean = clean.astype(series.dtype)
+    return clean, changed_count
+
+
+def sanitize_frame(df, columns=None, id_columns=DEFAULT_ID_COLUMNS):
+    """
+    Runs sanitize_series over every text column (or the given columns) of a frame.
+
+    Returns:
+        (clean DataFrame, {column: number of values changed}) - only columns with changes are listed
+    """
+    id_columns = set(id_columns)
+    clean_df = df.copy()
+    changes = {}
+    for col in (columns if columns is not None else df.columns):
+        if pd.api.types.is_numeric_dtype(df[col]) or pd.api.types.is_datetime64_any_dtype(df[col]):
+            continue
+        clean, changed_count = sanitize_series(df[col], is_id=col in id_columns)
+        if changed_count:
+            clean_df[col] = clean
+            changes[col] = changed_count
+
+    if changes:
+        logger.info(f"🧹 Text sanitation changed {sum(changes.values())} values: "
+                    + ", ".join(f"{col}={count}" for col, count in changes.items()))
+    return clean_df, changes
@@ -0,0 +1,454 @@
+import os
+import re
+import sys
+import time
+import logging
+import zipfile
+import posixpath
+from datetime import datetime, timedelta
+import xml.etree.ElementTree as ET
+
+import numpy as np
+import pandas as pd
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+NS_MAIN = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+NS_REL = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+NS_PKG_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+TAG_ROW = f"{NS_MAIN}row"
+TAG_CELL = f"{NS_MAIN}c"
+TAG_VALUE = f"{NS_MAIN}v"
+TAG_INLINE = f"{NS_MAIN}is"
+TAG_TEXT = f"{NS_MAIN}t"
+TAG_PHONETIC = f"{NS_MAIN}rPh"
+
+CELL_REF_REGEX = re.compile(r'^([A-Z]+)(\d*)$')
+
+# Built-in number formats Excel shows as dates/times
+BUILTIN_DATE_FORMATS = set(range(14, 23)) | set(range(27, 37)) | set(range(45, 48)) | \
+    set(range(50, 59)) | set(range(71, 82))
+
+# Parts of a custom format code that never mean a date: [Red], [$-409], "text", \x, _x, *x
+FORMAT_NOISE_REGEX = re.compile(r'\[[^\]]*\]|"[^"]*"|\\.|_.|\*.')
+DATE_TOKEN_REGEX = re.compile(r'[dmyhs]', re.IGNORECASE)
+
+EXCEL_EPOCH_1900 = datetime(1899, 12, 30)
+EXCEL_EPOCH_1904 = datetime(1904, 1, 1)
+
+# The strings pandas.read_excel turns into NaN by default
+DEFAULT_NA_VALUES = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null',
+])
+
+
+def column_index(letters):
+    """Converts a column letter to its 0-indexed position (A -> 0, AA -> 26)."""
+    col = 0
+    for ch in letters:
+        col = col * 26 + (ord(ch) - 64)
+    return col - 1
+
+
+# --------------------------------------------------------------------------------------
+# --- Workbook parts ---
+# --------------------------------------------------------------------------------------
+
+def _part_path(target):
+    """Resolves a relationship target from xl/workbook.xml to a zip member name."""
+    if target.startswith('/'):
+        return target.lstrip('/')
+    return posixpath.normpath(posixpath.join('xl', target))
+
+
+def sheet_part(zf, sheet_name=None):
+    """
+    Returns (sheet name, worksheet part path) for a sheet of an open xlsx zip.
+
+    Args:
+        sheet_name: Sheet name, 0-based sheet position, or None for the first sheet
+    """
+    rels_root = ET.fromstring(zf.read('xl/_rels/workbook.xml.rels'))
+    rels = {rel.get('Id'): rel.get('Target') for rel in rels_root.iter(f"{NS_PKG_REL}Relationship")}
+    sheets = list(ET.fromstring(zf.read('xl/workbook.xml')).iter(f"{NS_MAIN}sheet"))
+
+    if sheet_name is None:
+        sheet_name = 0
+    if isinstance(sheet_name, int):
+        if sheet_name >= len(sheets):
+            raise ValueError(f"Worksheet index {sheet_name} is invalid, {len(sheets)} worksheets found")
+        sheet = sheets[sheet_name]
+    else:
+        sheet = next((s for s in sheets if s.get('name') == sheet_name), None)
+        if sheet is None:
+            raise ValueError(f"Worksheet named '{sheet_name}' not found")
+
+    return sheet.get('name'), _part_path(rels[sheet.get(f"{NS_REL}id")])
+
+
+def sheet_names(file_path):
+    """Sheet names of a workbook in tab order."""
+    with zipfile.ZipFile(file_path) as zf:
+        return [sheet.get('name') for sheet in ET.fromstring(zf.read('xl/workbook.xml')).iter(f"{NS_MAIN}sheet")]
+
+
+def _uses_1904_dates(zf):
+    root = ET.fromstring(zf.read('xl/workbook.xml'))
+    props = root.find(f"{NS_MAIN}workbookPr")
+    return props is not None and props.get('date1904', '0').lower() in ('1', 'true')
+
+
+def read_shared_strings(zf):
+    """Reads the shared string table once (rich text runs joined, phonetic hints skipped)."""
+    if 'xl/sharedStrings.xml' not in zf.namelist():
+        return []
+    strings = []
+    for _, elem in ET.iterparse(zf.open('xl/sharedStrings.xml'), events=('end',)):
+        if elem.tag == f"{NS_MAIN}si":
+            strings.append(_element_text(elem))
+            elem.clear()
+    return strings
+
+
+def _element_text(elem):
+    """Text of an <si>/<is> element: its <t> plus every rich text run, without <rPh> hints."""
+    text = elem.find(TAG_TEXT)
+    if text is not None:
+        return text.text or ''
+    parts = []
+    for run in elem:
+        if run.tag == TAG_PHONETIC:
+            continue
+        for t in run.iter(TAG_TEXT):
+            parts.append(t.text or '')
+    return ''.join(parts)
+
+
+def is_date_format(format_code):
+    """True when a custom number format code displays a date or time."""
+    if not format_code or format_code.lower() == 'general':
+        return False
+    return bool(DATE_TOKEN_REGEX.search(FORMAT_NOISE_REGEX.sub('', format_code)))
+
+
+def read_date_styles(zf):
+    """Returns the set of cellXfs indexes whose number format is a date or time."""
+    if 'xl/styles.xml' not in zf.namelist():
+        return set()
+    root = ET.fromstring(zf.read('xl/styles.xml'))
+
+    date_formats = set(BUILTIN_DATE_FORMATS)
+    num_fmts = root.find(f"{NS_MAIN}numFmts")
+    if num_fmts is not None:
+        for fmt in num_fmts.findall(f"{NS_MAIN}numFmt"):
+            fmt_id = int(fmt.get('numFmtId'))
+            if is_date_format(fmt.get('formatCode')):
+                date_formats.add(fmt_id)
+            else:
+                date_formats.discard(fmt_id)
+
+    date_styles = set()
+    cell_xfs = root.find(f"{NS_MAIN}cellXfs")
+    if cell_xfs is not None:
+        for xf_id, xf in enumerate(cell_xfs.findall(f"{NS_MAIN}xf")):
+            if int(xf.get('numFmtId', '0')) in date_formats:
+                date_styles.add(xf_id)
+    return date_styles
+
+
+def excel_serial_to_datetime(serial, epoch=EXCEL_EPOCH_1900):
+    """Converts an Excel date serial to datetime (time of day for serials below 1), like openpyxl."""
+    if epoch is EXCEL_EPOCH_1900 and 0 < serial < 60:
+        serial += 1  # Excel counts the non-existent 1900-02-29
+    value = epoch + timedelta(milliseconds=round(serial * 86400000))
+    if 0 <= serial < 1:
+        return value.time()
+    return value
+
+
+# --------------------------------------------------------------------------------------
+# --- Row streaming ---
+# --------------------------------------------------------------------------------------
+
+class SheetStream:
+    """
+    Streams the rows of one worksheet straight from the xlsx zip with iterparse. Shared strings
+    and date styles are resolved once when the stream is opened; every row is then yielded as a
+    list of plain Python values (str, int, float, bool, datetime) with '' for blank cells, which is
+    what pandas.read_excel sees from openpyxl.
+
+    Usage:
+        with SheetStream(path, 'DailyFileDTO') as stream:
+            for row in stream.rows():
+                ...
+    """
+
+    def __init__(self, file_path, sheet_name=None):
+        self.file_path = file_path
+        self._zf = zipfile.ZipFile(file_path)
+        try:
+            self.sheet_name, self._part = sheet_part(self._zf, sheet_name)
+            self._shared_strings = read_shared_strings(self._zf)
+            self._date_styles = read_date_styles(self._zf)
+            self._epoch = EXCEL_EPOCH_1904 if _uses_1904_dates(self._zf) else EXCEL_EPOCH_1900
+        except Exception:
+            self._zf.close()
+            raise
+
+    def _cell_value(self, cell):
+        cell_type = cell.get('t', 'n')
+        if cell_type == 'inlineStr':
+            inline = cell.find(TAG_INLINE)
+            return _element_text(inline) if inline is not None else ''
+
+        value = cell.findtext(TAG_VALUE)
+        if value is None:
+            return ''
+        if cell_type == 's':
+            return self._shared_strings[int(value)]
+        if cell_type in ('str', 'e'):
+            return value
+        if cell_type == 'b':
+            return value == '1'
+        if cell_type == 'd':
+            return datetime.fromisoformat(value)
+
+        number = float(value)
+        if self._date_styles and int(cell.get('s', '0')) in self._date_styles:
+            return excel_serial_to_datetime(number, self._epoch)
+        as_int = int(number)
+        return as_int if as_int == number else number
+
+    def rows(self):
+        """
+        Yields every row from the first to the last one stored, with rows Excel skipped
+        (entirely blank) yielded as []. Rows are only as long as their last stored cell.
+        """
+        expected_row = 1
+        for _, elem in ET.iterparse(self._zf.open(self._part), events=('end',)):
+            if elem.tag != TAG_ROW:
+                continue
+
+            row_number = int(elem.get('r', expected_row))
+            while expected_row < row_number:
+                yield []
+                expected_row += 1
+
+            values = []
+            for cell in elem.iter(TAG_CELL):
+                ref = cell.get('r')
+                if ref:
+                    col_idx = column_index(CELL_REF_REGEX.match(ref).group(1))
+                    if col_idx > len(values):
+                        values.extend([''] * (col_idx - len(values)))
+                values.append(self._cell_value(cell))
+
+            # Trailing cells that only carry a style are not data
+            while values and values[-1] == '':
+                values.pop()
+
+            elem.clear()
+            expected_row = row_number + 1
+            yield values
+
+    def close(self):
+        self._zf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+# --------------------------------------------------------------------------------------
+# --- Column reads ---
+# --------------------------------------------------------------------------------------
+
+def _header_names(header_row, width):
+    """Header labels as pandas names them: blanks become 'Unnamed: N', repeats get '.1', '.2'."""
+    names = []
+    seen = {}
+    for col_idx in range(width):
+        value = header_row[col_idx] if col_idx < len(header_row) else ''
+        name = f"Unnamed: {col_idx}" if value == '' else value
+        if name in seen:
+            seen[name] += 1
+            candidate = f"{name}.{seen[name]}"
+            while candidate in seen:
+                seen[name] += 1
+                candidate = f"{name}.{seen[name]}"
+            seen[candidate] = 0
+            name = candidate
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _is_blank(value, na_values):
+    return value is None or (isinstance(value, str) and value in na_values) or value == ''
+
+
+def _typed_column(values, col_dtype):
+    """Builds one column from the streamed values with the requested (or inferred) dtype."""
+    if col_dtype is object:
+        return pd.Series(values, dtype=object)
+    if col_dtype is str:
+        series = pd.Series(values, dtype=object)
+        mask = series.notna()
+        series[mask] = series[mask].astype(str)
+        return series.infer_objects()
+    if col_dtype is not None:
+        return pd.Series(values, dtype=col_dtype)
+
+    series = pd.Series(values).infer_objects()
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return series
+    if (series == '').any():
+        return series  # Blanks kept as '' (keep_default_na=False) keep the column as text
+    # Like read_excel's parser: a text column whose every value is numeric becomes numeric
+    # (this is where leading zeros are lost; pass dtype=str/object to keep them)
+    try:
+        return pd.to_numeric(series)
+    except (ValueError, TypeError):
+        return series
+
+
+def read_sheet_columns(file_path, sheet_name=None, usecols=None, dtype=None, stop_at_blank=None,
+                       nrows=None, keep_default_na=True):
+    """
+    Streams one sheet into typed column arrays. The first row is the header.
+
+    Args:
+        file_path: Path to the .xlsx file
+        sheet_name: Sheet name, 0-based position, or None for the first sheet
+        usecols: Column names or 0-based positions to keep (sheet order is kept, as in read_excel)
+        dtype: One type for every column, or {column name: type}; str keeps blanks as NaN
+        stop_at_blank: Column name; reading stops at the first data row where it is blank
+        nrows: Maximum number of data rows to read
+        keep_default_na: Turn pandas' default NA strings (and blank cells) into NaN;
+            False keeps them as read, blank cells as ''
+
+    Returns:
+        (sheet name, {column name: pandas Series}) in sheet column order
+    """
+    na_values = DEFAULT_NA_VALUES if keep_default_na else frozenset()
+
+    with SheetStream(file_path, sheet_name) as stream:
+        row_iter = stream.rows()
+        header_row = next(row_iter, [])
+
+        data_rows = []
+        width = len(header_row)
+        key_pos = None
+        for row in row_iter:
+            if key_pos is None and stop_at_blank is not None:
+                names = _header_names(header_row, max(width, len(row)))
+                if stop_at_blank not in names:
+                    raise KeyError(f"Key column '{stop_at_blank}' not found in sheet '{stream.sheet_name}'")
+                key_pos = names.index(stop_at_blank)
+            if key_pos is not None and (key_pos >= len(row) or _is_blank(row[key_pos], na_values)):
+                break
+            if nrows is not None and len(data_rows) >= nrows:
+                break
+            data_rows.append(row)
+            width = max(width, len(row))
+
+        # Trailing blank rows are not data (read_excel drops them too)
+        while data_rows and not any(value != '' for value in data_rows[-1]):
+            data_rows.pop()
+
+        if key_pos is None and stop_at_blank is not None and stop_at_blank not in _header_names(header_row, width):
+            raise KeyError(f"Key column '{stop_at_blank}' not found in sheet '{stream.sheet_name}'")
+
+        names = _header_names(header_row, width)
+        sheet_label = stream.sheet_name
+
+    if usecols is None:
+        positions = list(range(width))
+    else:
+        wanted = set(usecols)
+        positions = [pos for pos, name in enumerate(names) if name in wanted or pos in wanted]
+        missing = [col for col in usecols if not isinstance(col, int) and col not in names]
+        if missing:
+            raise ValueError(f"Usecols do not match columns, columns expected but not found: {missing}")
+
+    columns = {}
+    for pos in positions:
+        values = []
+        for row in data_rows:
+            value = row[pos] if pos < len(row) else ''
+            if isinstance(value, str) and value in na_values:
+                value = np.nan
+            values.append(value)
+        col_dtype = dtype.get(names[pos]) if isinstance(dtype, dict) else dtype
+        columns[names[pos]] = _typed_column(values, col_dtype)
+
+    return sheet_label, columns
+
+
+def read_sheet(file_path, sheet_name=None, usecols=None, dtype=None, stop_at_blank=None, nrows=None,
+               keep_default_na=True):
+    """
+    Drop-in for pd.read_excel(file_path, sheet_name=..., usecols=..., dtype=..., nrows=...,
+    keep_default_na=...) on .xlsx files, without building an openpyxl workbook in memory.
+    See read_sheet_columns() for the arguments.
+    """
+    _, columns = read_sheet_columns(file_path, sheet_name, usecols=usecols, dtype=dtype,
+                                    stop_at_blank=stop_at_blank, nrows=nrows, keep_default_na=keep_default_na)
+    if not columns:
+        return pd.DataFrame()
+    return pd.DataFrame(columns)
+
+
+# --------------------------------------------------------------------------------------
+# --- Benchmark ---
+# --------------------------------------------------------------------------------------
+
+def benchmark(file_path, sheet_name=None, dtype=object, repeat=3):
+    """Times read_sheet against pd.read_excel on the same sheet and checks they agree."""
+    sheet_arg = 0 if sheet_name is None else sheet_name
+    timings = {}
+    frames = {}
+    for label, reader in (('pd.read_excel', lambda: pd.read_excel(file_path, sheet_name=sheet_arg, dtype=dtype)),
+                          ('read_sheet', lambda: read_sheet(file_path, sheet_name, dtype=dtype))):
+        best = None
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            frames[label] = reader()
+            elapsed = time.perf_counter() - start_time
+            best = elapsed if best is None else min(best, elapsed)
+        timings[label] = best
+
+    expected, actual = frames['pd.read_excel'], frames['read_sheet']
+    same_shape = expected.shape == actual.shape and list(expected.columns) == list(actual.columns)
+    same_values = same_shape and expected.astype(str).equals(actual.astype(str))
+
+    size_mb = os.path.getsize(file_path) / (1024 * 1024)
+    logger.info(f"📊 Benchmark on {os.path.basename(file_path)} ({size_mb:.1f} MB, {len(actual)} rows), "
+                f"best of {repeat}:")
+    for label, elapsed in timings.items():
+        logger.info(f"   • {label}: {elapsed:.2f}s")
+    logger.info(f"🚀 Speed-up: {timings['pd.read_excel'] / max(timings['read_sheet'], 1e-9):.1f}x")
+    if same_values:
+        logger.info("✅ Both readers returned the same data")
+    else:
+        logger.warning(f"⚠️ Readers differ: read_excel {expected.shape} vs read_sheet {actual.shape}")
+    return timings, same_values
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        benchmark(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        import config
+        daily_file = os.path.join(config.config.dailyfile_base, str(config.config.curr_year),
+                                  datetime(config.config.curr_year, config.config.curr_month,
+                                           config.config.curr_day).strftime("%b"),
+                                  f"{config.config.curr_day:02d}", config.config.dailyfile_name)
+        benchmark(daily_file)
@@ -0,0 +1,192 @@
+import os
+import logging
+from datetime import date, datetime
+
+import pandas as pd
+import xlsxwriter
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_COLUMN_WIDTH = 13.0
+
+TEXT_FORMAT = '@'
+AMOUNT_FORMAT = '#,##0.00'
+DATE_FORMAT = 14  # Built-in short date, shown in the machine's locale like a date typed into Excel
+
+# constant_memory streams every row straight to disk; the other options stop XlsxWriter
+# from turning text that looks like a formula or URL into one
+WORKBOOK_OPTIONS = {
+    'constant_memory': True,
+    'strings_to_formulas': False,
+    'strings_to_urls': False,
+    'strings_to_numbers': False,
+}
+
+
+def _column_letter(col_idx):
+    """Converts a 1-indexed column number to its letter (1 -> A, 27 -> AA)."""
+    letters = ''
+    while col_idx > 0:
+        col_idx, remainder = divmod(col_idx - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return letters
+
+
+class SheetStyle:
+    """
+    Column-level formatting for one sheet layout, defined once and reused for every file
+    written with it. Nothing is allocated per cell: the number format of each column and the
+    header font are attached to the column and header row.
+
+    Args:
+        columns: Column names in sheet order
+        string_columns: Columns written with the '@' text format
+        amount_columns: Columns written with '#,##0.00'
+        date_columns: Columns written with the short date format
+        column_widths: {column letter: width}, missing letters get DEFAULT_COLUMN_WIDTH
+        header_bold: True/False for every header cell, or {col_idx: bool} (1-indexed)
+    """
+
+    def __init__(self, columns, string_columns=(), amount_columns=(), date_columns=(),
+                 column_widths=None, header_bold=True):
+        self.columns = list(columns)
+        string_columns = set(string_columns)
+        amount_columns = set(amount_columns)
+        date_columns = set(date_columns)
+        column_widths = column_widths or {}
+
+        self.number_formats = []
+        self.widths = []
+        self.header_bold = []
+        for col_idx, col_name in enumerate(self.columns, 1):
+            if col_name in string_columns:
+                self.number_formats.append(TEXT_FORMAT)
+            elif col_name in amount_columns:
+                self.number_formats.append(AMOUNT_FORMAT)
+            elif col_name in date_columns:
+                self.number_formats.append(DATE_FORMAT)
+            else:
+                self.number_formats.append(None)
+
+            self.widths.append(column_widths.get(_column_letter(col_idx), DEFAULT_COLUMN_WIDTH))
+
+            if isinstance(header_bold, dict):
+                self.header_bold.append(bool(header_bold.get(col_idx)))
+            else:
+                self.header_bold.append(bool(header_bold))
+
+
+def date_columns_of(df):
+    """
+    Columns that hold dates: datetime64 columns, and object columns whose first value is a
+    date (e.g. dates read from a mixed column). They need a date format to not show as numbers.
+    """
+    date_columns = []
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            date_columns.append(col)
+        elif series.dtype == object:
+            valid = series.notna().to_numpy()
+            if valid.any() and isinstance(series.iloc[valid.argmax()], (datetime, date)):
+                date_columns.append(col)
+    return date_columns
+
+
+def frame_rows(df):
+    """
+    Yields the rows of a DataFrame as lists of plain Python values, with NaN/NaT as None
+    (blank cells). Conversion happens once per column, not per cell.
+    """
+    if df.empty:
+        return
+    values = df.astype(object).where(df.notna(), None).to_numpy()
+    for row in values:
+        yield row.tolist()
+
+
+class XlsxStreamWriter:
+    """
+    Streams rows into an .xlsx file with XlsxWriter in constant-memory mode.
+    The file is written next to the target and moved into place on close, so a failed
+    run never leaves a half-written workbook behind.
+
+    Usage:
+        with XlsxStreamWriter(path) as writer:
+            writer.write_frame('Sheet1', df, style)
+    """
+
+    def __init__(self, output_path):
+        self.output_path = output_path
+        self.temp_path = f"{output_path}.tmp"
+        self.workbook = xlsxwriter.Workbook(self.temp_path, WORKBOOK_OPTIONS)
+        self._formats = {}
+
+    def _format(self, bold=False, num_format=None):
+        """Returns one shared Format per (bold, num_format) combination."""
+        key = (bold, num_format)
+        if key not in self._formats:
+            properties = {}
+            if bold:
+                properties['bold'] = True
+            if num_format is not None:
+                properties['num_format'] = num_format
+            self._formats[key] = self.workbook.add_format(properties) if properties else None
+        return self._formats[key]
+
+    def add_sheet(self, sheet_name, style):
+        """
+        Adds a worksheet with the style's column formats and widths applied, and writes the header.
+
+        Returns:
+            (worksheet, next row index)
+        """
+        ws = self.workbook.add_worksheet(sheet_name)
+        for col_idx, (num_format, width) in enumerate(zip(style.number_formats, style.widths)):
+            ws.set_column(col_idx, col_idx, width, self._format(num_format=num_format))
+        for col_idx, (col_name, bold) in enumerate(zip(style.columns, style.header_bold)):
+            header_format = self._format(bold=True) if bold else None
+            ws.write_string(0, col_idx, str(col_name), header_format)
+        return ws, 1
+
+    def write_rows(self, ws, rows, start_row=1):
+        """Writes an iterable of row lists starting at start_row. Returns the next free row index."""
+        row_idx = start_row
+        for row in rows:
+            ws.write_row(row_idx, 0, row)
+            row_idx += 1
+        return row_idx
+
+    def write_frame(self, sheet_name, df, style):
+        """Writes a whole DataFrame to a new sheet. Returns the number of data rows written."""
+        ws, next_row = self.add_sheet(sheet_name, style)
+        return self.write_rows(ws, frame_rows(df), next_row) - next_row
+
+    def close(self):
+        self.workbook.close()
+        os.replace(self.temp_path, self.output_path)
+
+    def abort(self):
+        try:
+            self.workbook.close()
+        except Exception:
+            pass
+        if os.path.exists(self.temp_path):
+            os.remove(self.temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def write_frame_xlsx(output_path, df, style, sheet_name='Sheet1'):
+    """Writes one DataFrame to a single-sheet workbook. Returns the number of data rows written."""
+    with XlsxStreamWriter(output_path) as writer:
+        return writer.write_frame(sheet_name, df, style)